@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2020 FreeIPA Contributors see COPYING for license
+#
+"""Benchmark of the ipa-backup compression modes
+
+Archives directories with tar and compresses the stream with each available
+compressor, as ipa-backup does, e.g.
+
+    # PYTHONPATH=. contrib/backup-compression-benchmark.py /var/lib/dirsrv
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from ipaplatform.paths import paths
+from ipaserver.install.ipa_backup import compress_command, run_pipeline
+
+
+def modes(levels, threads):
+    result = []
+    for level in levels or [None]:
+        suffix = '' if level is None else ' -{}'.format(level)
+        # single threaded gzip, as used by previous versions
+        gzip = [paths.GZIP, '-c']
+        if level is not None:
+            gzip.append('-{}'.format(level))
+        result.append(('gzip' + suffix, gzip))
+        if os.path.exists(paths.PIGZ):
+            result.append(('pigz' + suffix,
+                           compress_command('gzip', level, threads)))
+        if os.path.exists(paths.ZSTD):
+            result.append(('zstd' + suffix,
+                           compress_command('zstd', level, threads)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+', metavar='PATH',
+                        help='files and directories to archive')
+    parser.add_argument('--level', type=int, action='append',
+                        help='compression levels (default: compressor '
+                             'default)')
+    parser.add_argument('--threads', type=int,
+                        help='compression threads (default: one per CPU)')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='ipa-backup-benchmark')
+    try:
+        output = os.path.join(tmpdir, 'archive')
+        tar = ['tar', '--xattrs', '--selinux', '-cf', '-'] + args.paths
+
+        start = time.time()
+        run_pipeline([tar], output)
+        elapsed = time.time() - start
+        size = os.path.getsize(output)
+        print('{:<12} {:>10.1f} MiB {:>8.2f} s'.format(
+            'none', size / 2.0 ** 20, elapsed))
+
+        for name, command in modes(args.level, args.threads):
+            start = time.time()
+            run_pipeline([tar, command], output)
+            elapsed = time.time() - start
+            compressed = os.path.getsize(output)
+            print('{:<12} {:>10.1f} MiB {:>8.2f} s  ratio {:.2f}'.format(
+                name, compressed / 2.0 ** 20, elapsed,
+                size / float(compressed or 1)))
+    finally:
+        shutil.rmtree(tmpdir)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2020 FreeIPA Contributors see COPYING for license
+#
+"""Benchmark of the per-call overhead of ipalib commands
+
+Calls commands with the parameters of ca_is_enabled, user_show and user_find
+whose execute() returns a canned result, through Command.__call__ and
+Command.call_internal, and reports the time per call next to the time of
+execute() alone, e.g.
+
+    $ PYTHONPATH=. contrib/command-benchmark.py --calls 10000
+"""
+import argparse
+import sys
+import timeit
+
+from ipalib import Command, Flag, Int, Str, create_api, output
+from ipapython.dn import DN
+
+BASEDN = DN('dc=ipa,dc=example')
+UID_PATTERN = '^[a-zA-Z0-9_.][a-zA-Z0-9_.-]*[a-zA-Z0-9_.$-]?$'
+
+
+def user_entry(i):
+    uid = u'user{}'.format(i)
+    return {
+        'dn': DN(('uid', uid), ('cn', 'users'), ('cn', 'accounts'), BASEDN),
+        'uid': (uid,),
+        'givenname': (u'Test',),
+        'sn': (u'User {}'.format(i),),
+        'uidnumber': (u'{}'.format(1000000 + i),),
+        'homedirectory': (u'/home/{}'.format(uid),),
+        'memberof_group': (u'ipausers',),
+    }
+
+
+class ca_is_enabled(Command):
+    has_output = output.standard_value
+
+    def execute(self, *args, **options):
+        return dict(result=True, value=None)
+
+
+class user_show(Command):
+    takes_args = (
+        Str('uid', pattern=UID_PATTERN,
+            normalizer=lambda value: value.lower()),
+    )
+    takes_options = (
+        Flag('rights'),
+        Flag('no_members'),
+        Str('out?'),
+    )
+    has_output = output.standard_entry
+
+    def execute(self, *args, **options):
+        return dict(result=user_entry(0), value=args[0])
+
+
+class user_find(Command):
+    takes_args = (
+        Str('criteria?'),
+    )
+    takes_options = tuple(
+        Str(name + '?', normalizer=lambda value: value.strip())
+        for name in ('givenname', 'sn', 'cn', 'displayname', 'initials',
+                     'homedirectory', 'gecos', 'loginshell', 'title',
+                     'ou', 'street', 'l', 'st', 'postalcode', 'manager')
+    ) + (
+        Str('uid?', pattern=UID_PATTERN,
+            normalizer=lambda value: value.lower()),
+        Str('mail*'),
+        Str('in_group*'),
+        Str('not_in_group*'),
+        Int('timelimit?', minvalue=0),
+        Int('sizelimit?', minvalue=0),
+        Flag('whoami'),
+        Flag('no_members'),
+        Flag('pkey_only'),
+    )
+    has_output = output.standard_list_of_entries
+
+    entries = ()
+
+    def execute(self, *args, **options):
+        return dict(result=list(self.entries), count=len(self.entries),
+                    truncated=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=10000,
+                        help='number of calls per run')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of runs, the best is reported')
+    parser.add_argument('--entries', type=int, default=20,
+                        help='number of entries returned by user_find')
+    args = parser.parse_args()
+
+    api = create_api(mode='unit_test')
+    api.env.in_tree = True
+    api.env.in_server = True
+    api.env.context = 'benchmark'
+    api.finalize()
+
+    user_find.entries = tuple(user_entry(i) for i in range(args.entries))
+    commands = {}
+    for cls in (ca_is_enabled, user_show, user_find):
+        commands[cls.__name__] = cmd = cls(api)
+        cmd.finalize()
+
+    calls = [
+        ('ca_is_enabled', (), {}),
+        ('user_show', (u'Admin',), {'all': True}),
+        ('user_find', (), {'in_group': [u'admins'], 'sizelimit': 100,
+                           'all': True}),
+    ]
+
+    print('{:<16} {:>12} {:>12} {:>14}'.format(
+        'command', 'execute', '__call__', 'call_internal'))
+    for name, cmd_args, cmd_options in calls:
+        cmd = commands[name]
+        params = cmd.args_options_2_params(*cmd_args, **dict(cmd_options))
+        params.update(cmd.get_default(**params))
+        params = cmd.convert(**cmd.normalize(**params))
+        ex_args, ex_options = cmd.params_2_args_options(**params)
+
+        timings = []
+        for func, func_args, func_options in (
+                (cmd.execute, ex_args, ex_options),
+                (cmd, cmd_args, cmd_options),
+                (cmd.call_internal, ex_args, ex_options)):
+            best = min(timeit.repeat(
+                lambda: func(*func_args, **dict(func_options)),
+                number=args.calls, repeat=args.repeat))
+            timings.append(best / args.calls * 1e6)
+
+        print('{:<16} {:>9.1f} us {:>9.1f} us {:>11.1f} us'.format(
+            name, *timings))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
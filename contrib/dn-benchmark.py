@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2020 FreeIPA Contributors see COPYING for license
+#
+"""Microbenchmark of ipapython.dn
+
+Measures parsing, comparison, hashing and endswith() of DNs similar to the
+member DNs of user and group entries, e.g.
+
+    $ PYTHONPATH=. contrib/dn-benchmark.py --entries 10000
+"""
+import argparse
+import sys
+import timeit
+
+from ipapython.dn import DN, intern_dn
+
+BASEDN = 'dc=ipa,dc=example'
+CONTAINERS = (
+    'cn=users,cn=accounts',
+    'cn=groups,cn=accounts',
+    'cn=computers,cn=accounts',
+)
+
+
+def dn_strings(count):
+    return [
+        '{}={}{},{},{}'.format(
+            'uid' if i % 3 == 0 else 'cn', 'entry', i,
+            CONTAINERS[i % len(CONTAINERS)], BASEDN)
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=10000,
+                        help='number of DNs')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of runs, the best is reported')
+    parser.add_argument('--intern', action='store_true',
+                        help='intern the base DN and containers first')
+    args = parser.parse_args()
+
+    basedn = DN(BASEDN)
+    if args.intern:
+        basedn = intern_dn(basedn)
+        for container in CONTAINERS:
+            intern_dn(DN(container, basedn))
+
+    strings = dn_strings(args.entries)
+    dns = [DN(s) for s in strings]
+    copies = [DN(s.upper()) for s in strings]
+    users = DN(CONTAINERS[0], basedn)
+
+    benchmarks = [
+        ('parse', lambda: [DN(s) for s in strings]),
+        ('str', lambda: [str(dn) for dn in dns]),
+        ('compare', lambda: [a == b for a, b in zip(dns, copies)]),
+        ('compare str', lambda: [a == b for a, b in zip(dns, strings)]),
+        ('hash', lambda: [hash(dn) for dn in dns]),
+        ('set', lambda: set(dns).intersection(copies)),
+        ('sort', lambda: sorted(dns)),
+        ('endswith', lambda: [dn.endswith(users) for dn in dns]),
+        ('in', lambda: [users in dn for dn in dns]),
+    ]
+    for name, func in benchmarks:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print('{:<12} {:>8.2f} ms'.format(name, best * 1000))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
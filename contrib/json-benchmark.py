@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2020 FreeIPA Contributors see COPYING for license
+#
+"""Benchmark of the JSON backends of ipalib.rpc
+
+Encodes and decodes JSON-RPC responses similar to those of user_find,
+group_find, host_find and dnsrecord_find with each available backend, e.g.
+
+    $ PYTHONPATH=. contrib/json-benchmark.py --entries 2000
+"""
+import argparse
+import datetime
+import os
+import sys
+import timeit
+
+from ipalib import rpc
+from ipapython.dn import DN
+from ipapython.dnsutil import DNSName
+from ipapython.version import API_VERSION
+
+BASEDN = DN('dc=ipa,dc=example')
+
+
+def user_entry(i):
+    uid = 'user{}'.format(i)
+    return {
+        'dn': DN(('uid', uid), ('cn', 'users'), ('cn', 'accounts'), BASEDN),
+        'uid': (uid,),
+        'givenname': ('Test',),
+        'sn': ('User {}'.format(i),),
+        'cn': ('Test User {}'.format(i),),
+        'uidnumber': (str(1000000 + i),),
+        'gidnumber': (str(1000000 + i),),
+        'homedirectory': ('/home/{}'.format(uid),),
+        'loginshell': ('/bin/bash',),
+        'mail': ('{}@ipa.example'.format(uid),),
+        'krbprincipalname': ('{}@IPA.EXAMPLE'.format(uid),),
+        'krblastpwdchange': (datetime.datetime(2020, 1, 1, 12, 0, 0),),
+        'krbpasswordexpiration': (datetime.datetime(2020, 4, 1, 12, 0, 0),),
+        'ipauniqueid': ('5c4c2a56-54a6-11ea-a5e4-{:012x}'.format(i),),
+        'nsaccountlock': False,
+        'preserved': False,
+        'memberof_group': ('ipausers', 'group{}'.format(i % 100)),
+        'objectclass': (
+            'top', 'person', 'organizationalperson', 'inetorgperson',
+            'inetuser', 'posixaccount', 'krbprincipalaux',
+            'krbticketpolicyaux', 'ipaobject', 'ipasshuser',
+            'ipaSshGroupOfPubKeys', 'mepOriginEntry',
+        ),
+    }
+
+
+def group_entry(i):
+    cn = 'group{}'.format(i)
+    return {
+        'dn': DN(('cn', cn), ('cn', 'groups'), ('cn', 'accounts'), BASEDN),
+        'cn': (cn,),
+        'description': ('Group {}'.format(i),),
+        'gidnumber': (str(2000000 + i),),
+        'member_user': tuple('user{}'.format(j) for j in range(100)),
+        'memberindirect_user': tuple(
+            'user{}'.format(j) for j in range(100, 150)),
+        'objectclass': ('top', 'groupofnames', 'nestedgroup', 'ipausergroup',
+                        'ipaobject', 'posixgroup'),
+    }
+
+
+def host_entry(i):
+    fqdn = 'host{}.ipa.example'.format(i)
+    return {
+        'dn': DN(('fqdn', fqdn), ('cn', 'computers'), ('cn', 'accounts'),
+                 BASEDN),
+        'fqdn': (fqdn,),
+        'krbprincipalname': ('host/{}@IPA.EXAMPLE'.format(fqdn),),
+        'usercertificate': (os.urandom(1200),),
+        'sshpubkeyfp': ('SHA256:{} (ssh-ed25519)'.format('x' * 43),),
+        'has_keytab': True,
+        'has_password': False,
+        'managedby_host': (fqdn,),
+    }
+
+
+def dnsrecord_entry(i):
+    name = 'host{}'.format(i)
+    return {
+        'dn': DN(('idnsname', name), ('idnsname', 'ipa.example.'),
+                 ('cn', 'dns'), BASEDN),
+        'idnsname': (DNSName(name),),
+        'arecord': ('192.0.2.{}'.format(i % 256),),
+        'aaaarecord': ('2001:db8::{:x}'.format(i),),
+    }
+
+
+PAYLOADS = {
+    'user_find': user_entry,
+    'group_find': group_entry,
+    'host_find': host_entry,
+    'dnsrecord_find': dnsrecord_entry,
+}
+
+
+def response(make_entry, count):
+    result = [make_entry(i) for i in range(count)]
+    return {
+        'result': {
+            'result': result,
+            'count': count,
+            'truncated': False,
+            'summary': '{} entries matched'.format(count),
+        },
+        'error': None,
+        'id': 0,
+        'principal': 'admin@IPA.EXAMPLE',
+        'version': '4.9.0',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=1000,
+                        help='number of entries per response')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of runs, the best is reported')
+    parser.add_argument('--payload', choices=sorted(PAYLOADS),
+                        action='append',
+                        help='payloads to benchmark (default: all)')
+    args = parser.parse_args()
+
+    backends = rpc.get_json_backends()
+    print('backends: {}'.format(', '.join(backends)))
+
+    for name in args.payload or sorted(PAYLOADS):
+        value = response(PAYLOADS[name], args.entries)
+        for backend in backends:
+            rpc.set_json_backend(backend)
+            data = rpc.json_encode_binary(value, API_VERSION)
+            encode = min(timeit.repeat(
+                lambda: rpc.json_encode_binary(value, API_VERSION),
+                number=1, repeat=args.repeat))
+            decode = min(timeit.repeat(
+                lambda: rpc.json_decode_binary(data),
+                number=1, repeat=args.repeat))
+            print('{:<16} {:<8} {:>8.1f} KiB  encode {:>8.2f} ms  '
+                  'decode {:>8.2f} ms'.format(
+                      name, backend, len(data) / 1024.0,
+                      encode * 1000, decode * 1000))
+
+    rpc.set_json_backend()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -213,3 +213,15 @@ class cert_find(MethodOverride):
                                             options.pop('file'))
 
         return super(cert_find, self).forward(*args, **options)
+
+    def output_for_cli(self, textui, output, *args, **options):
+        rv = super(cert_find, self).output_for_cli(
+            textui, output, *args, **options)
+
+        cookie = output.get('cookie')
+        if cookie:
+            textui.print_plain(
+                _("More results are available, use --cookie=%s to get "
+                  "the next page") % cookie)
+
+        return rv
@@ -493,6 +493,7 @@ class dns_update_system_records(MethodOverride):
         super_res = output_super.get('result', {})
         super_res.pop('ipa_records', None)
         super_res.pop('location_records', None)
+        super_res.pop('records_diff', None)
 
         super(dns_update_system_records, self).output_for_cli(
             textui, output_super, *args, **options)
@@ -505,4 +506,11 @@ class dns_update_system_records(MethodOverride):
 
         self._standard_output(textui, result, labels)
 
+        if result.get('records_diff'):
+            textui.print_indented(
+                u'{}:'.format(labels['records_diff']), indent=1)
+            for val in result['records_diff']:
+                textui.print_indented(val, indent=2)
+            textui.print_line(u'')
+
         return int(not output['value'])
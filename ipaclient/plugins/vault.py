@@ -45,7 +45,7 @@ from ipalib.util import classproperty
 from ipalib import api, errors
 from ipalib import Bytes, Flag, Str
 from ipalib.plugable import Registry
-from ipalib import _
+from ipalib import _, ngettext
 from ipapython import ipautil
 from ipapython.dnsutil import DNSName
 
@@ -656,6 +656,19 @@ class ModVaultData(Local):
         algo = algorithms.TripleDES(os.urandom(key_length // 8))
         return algo
 
+    def _unwrap_response(self, algo, nonce, vault_data):
+        cipher = Cipher(algo, modes.CBC(nonce), backend=default_backend())
+        # decrypt
+        decryptor = cipher.decryptor()
+        padded_data = decryptor.update(vault_data)
+        padded_data += decryptor.finalize()
+        # remove padding
+        unpadder = PKCS7(algo.block_size).unpadder()
+        json_vault_data = unpadder.update(padded_data)
+        json_vault_data += unpadder.finalize()
+        # load JSON
+        return json.loads(json_vault_data.decode('utf-8'))
+
     def _do_internal(self, algo, transport_cert, raise_unexpected,
                      *args, **options):
         public_key = transport_cert.public_key()
@@ -1015,19 +1028,6 @@ class vault_retrieve(ModVaultData):
     def _iter_output(self):
         return self.api.Command.vault_retrieve_internal.output()
 
-    def _unwrap_response(self, algo, nonce, vault_data):
-        cipher = Cipher(algo, modes.CBC(nonce), backend=default_backend())
-        # decrypt
-        decryptor = cipher.decryptor()
-        padded_data = decryptor.update(vault_data)
-        padded_data += decryptor.finalize()
-        # remove padding
-        unpadder = PKCS7(algo.block_size).unpadder()
-        json_vault_data = unpadder.update(padded_data)
-        json_vault_data += unpadder.finalize()
-        # load JSON
-        return json.loads(json_vault_data.decode('utf-8'))
-
     def forward(self, *args, **options):
         output_file = options.get('out')
 
@@ -1149,3 +1149,107 @@ class vault_retrieve(ModVaultData):
             response['result'] = {'data': data}
 
         return response
+
+
+@register(no_fail=True)
+class _fake_vault_retrieve_bulk_internal(Method):
+    name = 'vault_retrieve_bulk_internal'
+    NO_CLI = True
+
+
+@register()
+class vault_retrieve_bulk(ModVaultData):
+    __doc__ = _('Retrieve data from multiple standard vaults.')
+
+    takes_options = (
+        Str(
+            'out_dir?',
+            cli_name='out_dir',
+            doc=_('Directory to store retrieved data, one file per vault'),
+        ),
+    )
+
+    has_output_params = (
+        Str(
+            'cn',
+            label=_('Vault name'),
+        ),
+        Bytes(
+            'data',
+            label=_('Data'),
+        ),
+    )
+
+    msg_summary = ngettext(
+        'Retrieved data from %(count)d vault',
+        'Retrieved data from %(count)d vaults', 0
+    )
+
+    @classmethod
+    def __NO_CLI_getter(cls):
+        return (api.Command.get_plugin('vault_retrieve_bulk_internal') is
+                _fake_vault_retrieve_bulk_internal)
+
+    NO_CLI = classproperty(__NO_CLI_getter)
+
+    @property
+    def api_version(self):
+        return self.api.Command.vault_retrieve_bulk_internal.api_version
+
+    def get_args(self):
+        for arg in self.api.Command.vault_retrieve_bulk_internal.args():
+            yield arg
+        for arg in super(vault_retrieve_bulk, self).get_args():
+            yield arg
+
+    def get_options(self):
+        for option in self.api.Command.vault_retrieve_bulk_internal.options():
+            if option.name not in ('session_key', 'version'):
+                yield option
+        for option in super(vault_retrieve_bulk, self).get_options():
+            yield option
+
+    def _iter_output(self):
+        return self.api.Command.vault_retrieve_bulk_internal.output()
+
+    def forward(self, *args, **options):
+        output_dir = options.pop('out_dir', None)
+
+        if self.api.env.in_server:
+            backend = self.api.Backend.ldap2
+        else:
+            backend = self.api.Backend.rpcclient
+        if not backend.isconnected():
+            backend.connect()
+
+        # generate session key, shared by all vaults
+        algo = self._generate_session_key()
+        # send retrieval request to server
+        response = self.internal(algo, *args, **options)
+
+        result = []
+        failed = response['failed']
+        for vault in response['result']:
+            name = vault['cn']
+            if vault['ipavaulttype'] != u'standard':
+                # symmetric and asymmetric vaults need a password or a
+                # private key of their own
+                failed[name] = _('Not a standard vault')
+                continue
+
+            # unwrap data with session key
+            vault_data = self._unwrap_response(
+                algo, vault['nonce'], vault['vault_data'])
+            data = base64.b64decode(vault_data[u'data'].encode('utf-8'))
+
+            if output_dir:
+                with open(os.path.join(output_dir, name), 'wb') as f:
+                    f.write(data)
+                result.append({'cn': name})
+            else:
+                result.append({'cn': name, 'data': data})
+        del algo
+
+        response['result'] = result
+        response['summary'] = self.msg_summary % {'count': len(result)}
+        return response
@@ -3,6 +3,7 @@
 #
 
 import errno
+import io
 import json
 import logging
 import os
@@ -348,6 +349,19 @@ class _SchemaNameSpace(Mapping):
             raise KeyError(key)
 
 
+class _SchemaTopicModule(types.ModuleType):
+    # The documentation of a topic is read from schema on first access,
+    # it is only needed by the help command.
+    def __init__(self, name, topics, full_name):
+        super(_SchemaTopicModule, self).__init__(name)
+        self._topics = topics
+        self._full_name = full_name
+
+    @property
+    def __doc__(self):
+        return self._topics[self._full_name].get('doc')
+
+
 class NotAvailable(Exception):
     pass
 
@@ -379,6 +393,7 @@ class Schema:
         self._dict = {}
         self._namespaces = {}
         self._help = None
+        self._file = None
 
         for ns in self.namespaces:
             self._dict[ns] = {}
@@ -444,16 +459,21 @@ class Schema:
         return (fp, ttl,)
 
     def _read_schema(self, fingerprint):
-        # It's more efficient to read zip file members at once than to open
-        # the zip file a couple of times, see #6690.
+        # It's more efficient to read the zip file at once than to open it
+        # a couple of times, see #6690. Members are decompressed only when
+        # they are actually used, a single command typically needs just a
+        # handful of them.
         filename = os.path.join(self._DIR, fingerprint)
-        with zipfile.ZipFile(filename, 'r') as schema:
-            for name in schema.namelist():
-                ns, _slash, key = name.partition('/')
-                if ns in self.namespaces:
-                    self._dict[ns][key] = schema.read(name)
-                elif name == '_help':
-                    self._help = schema.read(name)
+        with open(filename, 'rb') as f:
+            schema = zipfile.ZipFile(io.BytesIO(f.read()), 'r')
+        for name in schema.namelist():
+            ns, _slash, key = name.partition('/')
+            if ns in self.namespaces:
+                self._dict[ns][key] = None
+        self._file = schema
+
+    def _read_member(self, name):
+        return self._file.read(name)
 
     def __getitem__(self, key):
         try:
@@ -521,6 +541,8 @@ class Schema:
     def read_namespace_member(self, namespace, member):
         value = self._dict[namespace][member]
 
+        if value is None:
+            value = self._read_member('{}/{}'.format(namespace, member))
         if isinstance(value, bytes):
             value = json.loads(value.decode('utf-8'))
             self._dict[namespace][member] = value
@@ -531,6 +553,8 @@ class Schema:
         return iter(self._dict[namespace])
 
     def get_help(self, namespace, member):
+        if self._help is None:
+            self._help = self._read_member('_help')
         if isinstance(self._help, bytes):
             self._help = json.loads(
                 self._help.decode('utf-8')  # pylint: disable=no-member
@@ -595,15 +619,14 @@ def get_package(server_info, client):
             plugin = module.register()(plugin)  # pylint: disable=no-member
     sys.modules[module_name] = module
 
-    for full_name, topic in six.iteritems(schema['topics']):
+    topics = schema['topics']
+    for full_name in topics:
+        topic = topics.get_help(full_name)
         name = str(topic['name'])
         module_name = '.'.join((package_name, name))
-        try:
-            module = sys.modules[module_name]
-        except KeyError:
-            module = sys.modules[module_name] = types.ModuleType(module_name)
-            module.__file__ = os.path.join(package_dir, '{}.py'.format(name))
-        module.__doc__ = topic.get('doc')
+        module = _SchemaTopicModule(module_name, topics, full_name)
+        module.__file__ = os.path.join(package_dir, '{}.py'.format(name))
+        sys.modules[module_name] = module
         if 'topic_topic' in topic:
             s = topic['topic_topic']
             if isinstance(s, bytes):
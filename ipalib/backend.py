@@ -114,18 +114,20 @@ class Connectible(Backend):
 
 class Executioner(Backend):
 
-    def create_context(self, ccache=None, client_ip=None):
+    def create_context(self, ccache=None, client_ip=None, pooled=False):
         """
         client_ip: The IP address of the remote client.
+        pooled: Borrow the LDAP connection from the ldap2 connection pool.
         """
 
         if ccache is not None:
             os.environ["KRB5CCNAME"] = ccache
 
         if self.env.in_server:
-            self.Backend.ldap2.connect(ccache=ccache,
-                                       size_limit=None,
-                                       time_limit=None)
+            kw = dict(ccache=ccache, size_limit=None, time_limit=None)
+            if pooled:
+                kw['pooled'] = True
+            self.Backend.ldap2.connect(**kw)
         else:
             self.Backend.rpcclient.connect()
         if client_ip is not None:
@@ -39,7 +39,7 @@ from configparser import RawConfigParser, ParsingError
 import six
 
 from ipaplatform.tasks import tasks
-from ipapython.dn import DN
+from ipapython.dn import DN, intern_dn
 from ipalib.base import check_name
 from ipalib.constants import (
     CONFIG_SECTION,
@@ -269,6 +269,9 @@ class Env:
                 value = DN(value)
         if type(value) not in (unicode, int, float, bool, type(None), DN):
             raise TypeError(key, value)
+        if type(value) is DN:
+            # basedn and container DNs are part of most DNs read from LDAP
+            value = intern_dn(value)
         object.__setattr__(self, key, value)
         # pylint: disable=unsupported-assignment-operation, no-member
         self.__d[key] = value
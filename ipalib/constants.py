@@ -173,6 +173,47 @@ DEFAULT_CONFIG = (
     ('startup_timeout', 120),
     # How long http connection should wait for reply [seconds].
     ('http_timeout', 30),
+    # Keep-alive HTTPS connections to Dogtag on the server: maximum number
+    # of requests sent over one connection (0 disables reuse) and how long
+    # an idle connection is kept [seconds]
+    ('dogtag_pool_max_requests', 100),
+    ('dogtag_pool_idle_timeout', 15),
+    # How long the server reuses a Dogtag REST session [seconds], 0 logs
+    # out after each request. Must be shorter than the CA session timeout.
+    ('dogtag_session_ttl', 600),
+    # Idle time after which a reused KRA session logs in again before it is
+    # used, in case the KRA was restarted or expired it [seconds].
+    ('dogtag_session_check_interval', 30),
+    # Per-worker pool of bound LDAP connections used by the RPC server.
+    # Maximum number of idle connections kept, 0 disables pooling.
+    ('ldap_pool_size', 0),
+    # How long an idle pooled LDAP connection is kept [seconds].
+    ('ldap_pool_idle_timeout', 300),
+    # Idle time after which a pooled LDAP connection is checked with
+    # a Who Am I? operation before it is reused [seconds].
+    ('ldap_pool_check_interval', 30),
+    # How long a group membership graph of the whole tree is reused by
+    # subsequent requests of the same principal [seconds], 0 builds a graph
+    # of the groups related to the entries of each search instead.
+    ('membership_graph_ttl', 0),
+    # How long a snapshot of cn=masters (servers, their services and roles)
+    # is reused by subsequent requests of a server process [seconds],
+    # 0 limits its use to a single request.
+    ('masters_cache_ttl', 10),
+    # Maximum number of threads used by a parallel batch command.
+    ('batch_max_workers', 4),
+    # Log durations of processing phases and LDAP operations of each
+    # request and collect them for the /ipa/metrics endpoint.
+    ('request_timing', False),
+    # Number of concurrent certificate retrievals from the CA in
+    # cert-find --all.
+    ('cert_find_max_workers', 4),
+    # Number of certificates retrieved from the CA kept in memory by each
+    # server process, 0 disables the cache.
+    ('cert_cache_size', 5000),
+    # Number of threads adding entries to IPA during migrate-ds,
+    # 1 adds them in the thread serving the request.
+    ('migrate_max_workers', 4),
     # How long to wait for an entry to appear on a replica
     ('replication_wait_timeout', 300),
     # How long to wait for a certmonger request to finish
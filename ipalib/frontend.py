@@ -36,7 +36,7 @@ from ipalib.errors import (ZeroArgumentError, MaxArgumentError, OverlapError,
     VersionError, OptionError,
     ValidationError, ConversionError)
 from ipalib import errors, messages
-from ipalib.request import context, context_frame
+from ipalib.request import context, context_frame, timing_phase
 from ipalib.util import classproperty, json_serialize
 
 if six.PY3:
@@ -372,6 +372,19 @@ class HasParam(Plugin):
 _callback_registry = {}
 
 
+def _timed_callback(callback_type, callback):
+    """
+    Wrap a callback to record its duration in timings of the current request
+    """
+    name = 'callback.%s.%s' % (
+        callback_type, getattr(callback, '__name__', type(callback).__name__))
+
+    def wrapped(*args, **kwargs):
+        with timing_phase(name):
+            return callback(*args, **kwargs)
+    return wrapped
+
+
 class Command(HasParam):
     """
     A public IPA atomic operation.
@@ -462,16 +475,18 @@ class Command(HasParam):
                 self.add_message(
                     messages.VersionMissing(server_version=self.api_version))
         params = self.args_options_2_params(*args, **options)
-        logger.debug(
-            'raw: %s(%s)', self.name, ', '.join(self._repr_iter(**params))
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                'raw: %s(%s)', self.name, ', '.join(self._repr_iter(**params))
+            )
         if self.api.env.in_server:
             params.update(self.get_default(**params))
         params = self.normalize(**params)
         params = self.convert(**params)
-        logger.debug(
-            '%s(%s)', self.name, ', '.join(self._repr_iter(**params))
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                '%s(%s)', self.name, ', '.join(self._repr_iter(**params))
+            )
         if self.api.env.in_server:
             self.validate(**params)
         (args, options) = self.params_2_args_options(**params)
@@ -489,6 +504,73 @@ class Command(HasParam):
             self.validate_output(ret, options['version'])
         return ret
 
+    def call_internal(self, *args, **options):
+        """
+        Execute the command on behalf of another command in the server.
+
+        Values which already have the type of their parameter are passed to
+        the command as they are, they are not normalized, converted and
+        validated again. The output is not validated either. This is meant
+        for nested calls with values taken from validated parameters, LDAP
+        entries or constants; values received from clients must go through
+        `Command.__call__`.
+
+        Outside of the server, this is the same as calling the command.
+        """
+        if not self.api.env.in_server:
+            return self(*args, **options)
+        self.ensure_finalized()
+        with context_frame():
+            self.context.principal = getattr(context, 'principal', None)
+            return self.__do_call_internal(*args, **options)
+
+    def __do_call_internal(self, *args, **options):
+        self.context.__messages = []
+        if 'version' in options:
+            self.verify_client_version(unicode(options['version']))
+        else:
+            options['version'] = self.api_version
+        params = self.args_options_2_params(*args, **options)
+        params.update(self.get_default(**params))
+        for name, value in list(params.items()):
+            param = self.params[name]
+            if not self.__is_converted(param, value):
+                value = param.convert(param.normalize(value))
+                param.validate(value, supplied=True)
+                params[name] = value
+        for name in self._required_names:
+            if name not in params:
+                self.params[name].validate(None)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                'internal: %s(%s)', self.name,
+                ', '.join(self._repr_iter(**params))
+            )
+        (args, options) = self.params_2_args_options(**params)
+        ret = self.run(*args, **options)
+        if isinstance(ret, dict):
+            for message in self.context.__messages:
+                messages.add_message(options['version'], ret, message)
+        if (
+            isinstance(ret, dict)
+            and 'summary' in self.output
+            and 'summary' not in ret
+        ):
+            ret['summary'] = self.get_summary_default(ret)
+        return ret
+
+    @staticmethod
+    def __is_converted(param, value):
+        """
+        Check whether ``value`` already has the type of ``param``.
+        """
+        if param.multivalue:
+            if type(value) is not tuple or not value:
+                return False
+        else:
+            value = (value,)
+        return all(type(v) in param.allowed_types for v in value)
+
     def add_message(self, message):
         self.context.__messages.append(message)
 
@@ -695,8 +777,8 @@ class Command(HasParam):
         {}
         """
         if _params is None:
-            _params = [p.name for p in self.params()
-                       if p.name not in kw and (p.required or p.autofill)]
+            _params = [name for name in self._default_names
+                       if name not in kw]
         return dict(self.__get_default_iter(_params, kw))
 
     def get_default_of(self, _name, **kw):
@@ -876,6 +958,11 @@ class Command(HasParam):
                     pass
             params.insert(pos, i)
         self.params_by_default = NameSpace(params, sort=False)
+        # parameters looked up on every call
+        self._default_names = tuple(
+            p.name for p in self.params() if p.required or p.autofill)
+        self._required_names = tuple(
+            p.name for p in self.params() if p.required)
         self.output = NameSpace(self._iter_output(), sort=False)
         self._create_param_namespace('output_params')
         super(Command, self)._on_finalize()
@@ -1120,14 +1207,16 @@ class Command(HasParam):
         # Use one shared callback registry, keyed on class, to avoid problems
         # with missing attributes being looked up in superclasses
         callbacks = _callback_registry.get(callback_type, {}).get(cls, [None])
+        timed = getattr(context, 'timings', None) is not None
         for callback in callbacks:
             if callback is None:
                 try:
-                    yield getattr(cls, '%s_callback' % callback_type)
+                    callback = getattr(cls, '%s_callback' % callback_type)
                 except AttributeError:
-                    pass
-            else:
-                yield callback
+                    continue
+            if timed:
+                callback = _timed_callback(callback_type, callback)
+            yield callback
 
     @classmethod
     def register_callback(cls, callback_type, callback, first=False):
@@ -24,6 +24,7 @@ Per-request thread-local data.
 
 import contextlib
 import threading
+import time
 
 from ipalib.base import ReadOnly, lock
 from ipalib.constants import CALLABLE_ERROR
@@ -53,6 +54,61 @@ def context_frame():
             del context.current_frame
 
 
+class RequestTimings:
+    """
+    Durations of processing phases and LDAP operations of a request.
+
+    While a request is served with timing enabled, an instance is available
+    as ``context.timings``. Phases are recorded with `timing_phase()`, LDAP
+    operations by the connections of `ipapython.ipaldap.LDAPClient`.
+    """
+
+    def __init__(self):
+        self.name = None
+        self.start = time.monotonic()
+        self.duration = None
+        self.phases = []
+        self.ldap_operations = {}
+
+    def add_phase(self, name, duration):
+        self.phases.append((name, duration))
+
+    def add_ldap_operation(self, name, duration):
+        count, total = self.ldap_operations.get(name, (0, 0.0))
+        self.ldap_operations[name] = (count + 1, total + duration)
+
+    def finish(self):
+        self.duration = time.monotonic() - self.start
+
+    def __str__(self):
+        items = []
+        if self.duration is not None:
+            items.append('total=%.1fms' % (self.duration * 1000))
+        for name, duration in self.phases:
+            items.append('%s=%.1fms' % (name, duration * 1000))
+        for name, (count, total) in sorted(self.ldap_operations.items()):
+            items.append('ldap.%s=%d/%.1fms' % (name, count, total * 1000))
+        return ' '.join(items)
+
+
+@contextlib.contextmanager
+def timing_phase(name):
+    """
+    Record the duration of a phase of the current request.
+
+    Does nothing unless timing is enabled for the request.
+    """
+    timings = getattr(context, 'timings', None)
+    if timings is None:
+        yield
+        return
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        timings.add_phase(name, time.monotonic() - start)
+
+
 class Connection(ReadOnly):
     """
     Base class for connection objects stored on `request.context`.
@@ -38,6 +38,7 @@ import logging
 import os
 import locale
 import base64
+import collections
 import json
 import re
 import socket
@@ -88,6 +89,16 @@ else:
     from httplib import BadStatusLine as RemoteDisconnected
 # pylint: enable=import-error
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
 
 if six.PY3:
     unicode = str
@@ -401,6 +412,114 @@ class _JSONPrimer(dict):
         return self._enc_bytes(val.public_bytes(x509_Encoding.DER))
 
 
+class _JSONBackend:
+    """JSON serializer backend
+
+    All backends produce the same JSON documents, they only differ in the
+    JSON library they use. Documents are always parsed by Python's json
+    module: its C scanner with _ipa_obj_hook() is faster than the other
+    libraries followed by a walk converting the markers in Python.
+    """
+    name = None
+    available = False
+
+    def dumps(self, val, version):
+        raise NotImplementedError()
+
+
+class _StdlibJSONBackend(_JSONBackend):
+    """Python's json module, values are converted by _JSONPrimer"""
+    name = 'json'
+    available = True
+
+    def dumps(self, val, version):
+        return json.dumps(_JSONPrimer(version).convert(val))
+
+
+class _OrjsonBackend(_JSONBackend):
+    """orjson
+
+    orjson serializes str, int, float, bool, None, list, tuple and dict
+    values natively, only the other values (bytes, datetime, DN, DNSName,
+    ...) are passed to _JSONPrimer through its default hook. Subclasses of
+    str, int, list and dict are passed to the hook as well, orjson would
+    bypass their methods, e.g. CIDict would lose the case of its keys.
+
+    orjson refuses integers wider than 64 bits, e.g. serial numbers of
+    certificates; documents containing them are serialized by the json
+    module.
+    """
+    name = 'orjson'
+    available = orjson is not None
+
+    def dumps(self, val, version):
+        primer = _JSONPrimer(version)
+
+        def default(obj):
+            result = primer.convert(obj)
+            if result is obj:
+                # subclass of str or int the primer keeps as is
+                for typ in (unicode, int):
+                    if isinstance(obj, typ):
+                        return typ(obj)
+            return result
+
+        try:
+            result = orjson.dumps(
+                val,
+                default=default,
+                option=(orjson.OPT_PASSTHROUGH_DATETIME |
+                        orjson.OPT_PASSTHROUGH_SUBCLASS |
+                        orjson.OPT_NON_STR_KEYS)
+            )
+        except TypeError:
+            return json.dumps(primer.convert(val))
+        return result.decode('utf-8')
+
+
+class _UjsonBackend(_JSONBackend):
+    """ujson, values are converted by _JSONPrimer"""
+    name = 'ujson'
+    available = ujson is not None
+
+    def dumps(self, val, version):
+        result = _JSONPrimer(version).convert(val)
+        try:
+            return ujson.dumps(result)
+        except OverflowError:
+            return json.dumps(result)
+
+
+_json_backends = collections.OrderedDict(
+    (backend.name, backend)
+    for backend in (_OrjsonBackend, _UjsonBackend, _StdlibJSONBackend)
+)
+
+_json_backend = None
+
+
+def get_json_backends():
+    """Return names of the available JSON backends, fastest first"""
+    return [name for name, backend in _json_backends.items()
+            if backend.available]
+
+
+def set_json_backend(name=None):
+    """Select the JSON backend used by json_encode_binary()
+
+    :param name: name of an available backend, the fastest one if None
+    """
+    global _json_backend
+    if name is None:
+        name = get_json_backends()[0]
+    elif name not in get_json_backends():
+        raise ValueError("JSON backend '{}' is not available".format(name))
+    _json_backend = _json_backends[name]()
+
+
+set_json_backend()
+
+
 def json_encode_binary(val, version, pretty_print=False):
     """Serialize a Python object structure to JSON
 
@@ -410,12 +529,13 @@ def json_encode_binary(val, version, pretty_print=False):
     :return: text
     :note: pretty printing triggers a slow path in Python's JSON module. Only
            use pretty_print in debug mode.
+    :see: set_json_backend
     """
-    result = _JSONPrimer(version).convert(val)
     if pretty_print:
+        result = _JSONPrimer(version).convert(val)
         return json.dumps(result, indent=4, sort_keys=True)
     else:
-        return json.dumps(result)
+        return _json_backend.dumps(val, version)
 
 
 def _ipa_obj_hook(dct, _iteritems=six.iteritems, _list=list):
@@ -198,6 +198,7 @@ class BasePathNamespace:
     ODS_ENFORCER = "/usr/sbin/ods-enforcer"
     ODS_ENFORCER_DB_SETUP = "/usr/sbin/ods-enforcer-db-setup"
     OPENSSL = "/usr/bin/openssl"
+    PIGZ = "/usr/bin/pigz"
     PK12UTIL = "/usr/bin/pk12util"
     SOFTHSM2_UTIL = "/usr/bin/softhsm2-util"
     SSLGET = "/usr/bin/sslget"
@@ -205,6 +206,7 @@ class BasePathNamespace:
     SSS_SSH_KNOWNHOSTSPROXY = "/usr/bin/sss_ssh_knownhostsproxy"
     BIN_TIMEOUT = "/usr/bin/timeout"
     UPDATE_CA_TRUST = "/usr/bin/update-ca-trust"
+    ZSTD = "/usr/bin/zstd"
     BIN_CURL = "/usr/bin/curl"
     BIND_LDAP_SO = "/usr/lib/bind/ldap.so"
     BIND_LDAP_DNS_IPA_WORKDIR = "/var/named/dyndb-ldap/ipa/"
@@ -273,6 +275,9 @@ class BasePathNamespace:
     IPA_JS_PLUGINS_DIR = "/usr/share/ipa/ui/js/plugins"
     UPDATES_DIR = "/usr/share/ipa/updates/"
     DICT_WORDS = "/usr/share/dict/words"
+    IPA_CACHE_DIR = "/var/cache/ipa"
+    IPA_LDAP_SCHEMA_CACHE_DIR = "/var/cache/ipa/ldap_schema"
+    IPA_API_SCHEMA_CACHE_DIR = "/var/cache/ipa/api_schema"
     VAR_KERBEROS_KRB5KDC_DIR = "/var/kerberos/krb5kdc/"
     VAR_KRB5KDC_K5_REALM = "/var/kerberos/krb5kdc/.k5."
     CACERT_PEM = "/var/kerberos/krb5kdc/cacert.pem"
@@ -295,6 +300,7 @@ class BasePathNamespace:
     IPA_BACKUP_DIR = "/var/lib/ipa/backup"
     IPA_DNSSEC_DIR = "/var/lib/ipa/dnssec"
     IPA_KASP_DB_BACKUP = "/var/lib/ipa/ipa-kasp.db.backup"
+    IPA_MIGRATION_STATE_DIR = "/var/lib/ipa/migration"
     DNSSEC_TOKENS_DIR = "/var/lib/ipa/dnssec/tokens"
     DNSSEC_SOFTHSM_PIN = "/var/lib/ipa/dnssec/softhsm_pin"
     IPA_CA_CSR = "/var/lib/ipa/ca.csr"
@@ -544,6 +544,43 @@ def rdn_key(rdn):
     return (len(rdn),) + tuple(ava_key(k) for k in rdn)
 
 
+# Parsed DN strings, maps a DN string to the RDN's and their comparison keys.
+# The cache is emptied when it's full, except for the interned DN's.
+_DN_CACHE_SIZE = 4096
+_dn_cache = {}
+
+# DN's and RDN's added by intern_dn()
+_interned_dns = {}
+_interned_rdns = {}
+
+
+def _intern_key(rdn):
+    # AVA flags are not used for output, so RDN's which differ only in flags
+    # can be shared
+    return tuple((ava[0], ava[1]) for ava in rdn)
+
+
+def _make_rdns(rdns):
+    """
+    Convert RDN's in open ldap format to the tuples used by DN, returns the
+    RDN's and their comparison keys. Interned RDN's are shared.
+    """
+    result = []
+    keys = []
+    for rdn in rdns:
+        avas = [tuple(ava) for ava in rdn]
+        sort_avas(avas)
+        avas = tuple(avas)
+        interned = _interned_rdns.get(_intern_key(avas))
+        if interned is None:
+            result.append(avas)
+            keys.append(rdn_key(avas))
+        else:
+            result.append(interned[0])
+            keys.append(interned[1])
+    return tuple(result), tuple(keys)
+
+
 if six.PY2:
     # Python 2: Input/output is unicode; we store UTF-8 bytes
     def val_encode(s):
@@ -617,29 +654,26 @@ class AVA:
     The str method of an AVA returns the string representation in RFC 4514 DN
     syntax with proper escaping.
     '''
+    __slots__ = ('_ava',)
+
     def __init__(self, *args):
-        self._ava = get_ava(*args)
+        self._ava = tuple(get_ava(*args))
+
+    def __reduce__(self):
+        return (self.__class__, (str(self),))
+
+    def __setstate__(self, state):
+        # pickles created before __slots__ was used
+        self._ava = tuple(state['_ava'])
 
     def _get_attr(self):
         return val_decode(self._ava[0])
 
-    def _set_attr(self, new_attr):
-        try:
-            self._ava[0] = _normalize_ava_input(new_attr)
-        except Exception as e:
-            raise ValueError('unable to convert attr "%s": %s' % (new_attr, e))
-
     attr = property(_get_attr)
 
     def _get_value(self):
         return val_decode(self._ava[1])
 
-    def _set_value(self, new_value):
-        try:
-            self._ava[1] = _normalize_ava_input(new_value)
-        except Exception as e:
-            raise ValueError('unable to convert value "%s": %s' % (new_value, e))
-
     value = property(_get_value)
 
     def to_openldap(self):
@@ -663,13 +697,11 @@ class AVA:
             raise KeyError("\"%s\" not found in %s" % (key, self.__str__()))
 
     def __hash__(self):
-        # Hash is computed from AVA's string representation.
-        #
-        # Because attrs & values are comparison case-insensitive the
-        # hash value between two objects which compare as equal but
-        # differ in case must yield the same hash value.
+        # Hash is computed from the same case-insensitive key that is used
+        # for comparison, so objects which compare as equal but differ in
+        # case yield the same hash value.
 
-        return hash(str(self).lower())
+        return hash(ava_key(self._ava))
 
     def __eq__(self, other):
         '''
@@ -818,30 +850,33 @@ class RDN:
     syntax with proper escaping.
     '''
 
+    __slots__ = ('_avas',)
+
     AVA_type = AVA
 
     def __init__(self, *args, **kwds):
         self._avas = self._avas_from_sequence(args, kwds.get('raw', False))
 
+    def __reduce__(self):
+        return (self.__class__, (str(self),))
+
+    def __setstate__(self, state):
+        # pickles created before __slots__ was used
+        self._avas = tuple(tuple(ava) for ava in state['_avas'])
+
     def _avas_from_sequence(self, args, raw=False):
-        avas = []
-        sort = 0
         ava_count = len(args)
 
-        if raw:  # fast raw mode
-            avas = args
+        if raw:  # fast raw mode, args are AVA tuples
+            return args
         elif ava_count == 1 and isinstance(args[0], str):
             avas = str2rdn(args[0])
-            sort = 1
         elif ava_count == 1 and isinstance(args[0], RDN):
-            avas = args[0].to_openldap()
-        elif ava_count > 0:
-            sort = 1
-            for arg in args:
-                avas.append(get_ava(arg))
-        if sort:
-            sort_avas(avas)
-        return avas
+            return args[0]._avas
+        else:
+            avas = [tuple(get_ava(arg)) for arg in args]
+        sort_avas(avas)
+        return tuple(avas)
 
     def to_openldap(self):
         return [list(a) for a in self._avas]
@@ -884,12 +919,6 @@ class RDN:
             raise IndexError("No AVA's in this RDN")
         return val_decode(self._avas[0][0])
 
-    def _set_attr(self, new_attr):
-        if len(self._avas) == 0:
-            raise IndexError("No AVA's in this RDN")
-
-        self._avas[0][0] = val_encode(str(new_attr))
-
     attr  = property(_get_attr)
 
     def _get_value(self):
@@ -897,21 +926,14 @@ class RDN:
             raise IndexError("No AVA's in this RDN")
         return val_decode(self._avas[0][1])
 
-    def _set_value(self, new_value):
-        if len(self._avas) == 0:
-            raise IndexError("No AVA's in this RDN")
-        self._avas[0][1] = val_encode(str(new_value))
-
     value = property(_get_value)
 
     def __hash__(self):
-        # Hash is computed from RDN's string representation.
-        #
-        # Because attrs & values are comparison case-insensitive the
-        # hash value between two objects which compare as equal but
-        # differ in case must yield the same hash value.
+        # Hash is computed from the same case-insensitive key that is used
+        # for comparison, so objects which compare as equal but differ in
+        # case yield the same hash value.
 
-        return hash(str(self).lower())
+        return hash(rdn_key(self._avas))
 
     def __eq__(self, other):
         # Try coercing string to RDN, if successful compare to coerced object
@@ -939,21 +961,18 @@ class RDN:
         return rdn_key(self._avas) < rdn_key(other._avas)
 
     def __add__(self, other):
-        result = self.__class__(self)
+        avas = list(self._avas)
         if isinstance(other, RDN):
-            for ava in other._avas:
-                result._avas.append((ava[0], ava[1], ava[2]))
+            avas.extend(other._avas)
         elif isinstance(other, AVA):
-            result._avas.append(other.to_openldap())
+            avas.append(other._ava)
         elif isinstance(other, str):
-            rdn = self.__class__(other)
-            for ava in rdn._avas:
-                result._avas.append((ava[0], ava[1], ava[2]))
+            avas.extend(self.__class__(other)._avas)
         else:
             raise TypeError("expected RDN, AVA or basestring but got %s" % (other.__class__.__name__))
 
-        sort_avas(result._avas)
-        return result
+        sort_avas(avas)
+        return self.__class__(*avas, **{'raw': True})
 
 
 @functools.total_ordering
@@ -1106,65 +1125,102 @@ class DN:
     syntax with proper escaping.
     '''
 
+    # DN objects are immutable and there are many of them, the RDN's are
+    # kept in a tuple of tuples of AVA tuples, _key holds the comparison
+    # key of each RDN and the string form and hash are computed on demand
+    # and cached.
+    __slots__ = ('rdns', '_key', '_str', '_hash')
+
     AVA_type = AVA
     RDN_type = RDN
 
     def __init__(self, *args, **kwds):
-        self.rdns = self._rdns_from_sequence(args)
-
-    def _copy_rdns(self, rdns=None):
-        if not rdns:
-            rdns = self.rdns
-        return [[list(a) for a in rdn] for rdn in rdns]
+        if len(args) == 1 and isinstance(args[0], DN):
+            # fast copy, the RDN's are immutable and can be shared
+            self.rdns = args[0].rdns
+            self._key = args[0]._key
+        else:
+            self.rdns, self._key = self._rdns_from_sequence(args)
+        self._str = None
+        self._hash = None
+
+    @classmethod
+    def _from_rdns(cls, rdns, key):
+        dn = cls.__new__(cls)
+        dn.rdns = rdns
+        dn._key = key
+        dn._str = None
+        dn._hash = None
+        return dn
 
     def _rdns_from_value(self, value):
         if isinstance(value, str):
+            cached = _dn_cache.get(value)
+            if cached is not None:
+                return cached
             try:
-                if isinstance(value, str):
-                    value = val_encode(value)
-                rdns = str2dn(value)
+                rdns = str2dn(val_encode(value))
             except DECODING_ERROR:
                 raise ValueError("malformed RDN string = \"%s\"" % value)
-            for rdn in rdns:
-                sort_avas(rdn)
+            result = _make_rdns(rdns)
+            if len(_dn_cache) >= _DN_CACHE_SIZE:
+                _dn_cache.clear()
+                _dn_cache.update(_interned_dns)
+            _dn_cache[value] = result
+            return result
         elif isinstance(value, DN):
-            rdns = value._copy_rdns()
+            return value.rdns, value._key
         elif isinstance(value, (tuple, list, AVA)):
-            ava = get_ava(value)
-            rdns = [[ava]]
+            rdn = (tuple(get_ava(value)),)
+            return (rdn,), (rdn_key(rdn),)
         elif isinstance(value, RDN):
-            rdns = [value.to_openldap()]
+            rdn = tuple(value._avas)
+            return (rdn,), (rdn_key(rdn),)
         elif isinstance(value, cryptography.x509.name.Name):
-            rdns = list(reversed([
+            return _make_rdns(reversed([
                 [get_ava(
                     ATTR_NAME_BY_OID.get(ava.oid, ava.oid.dotted_string),
                     ava.value) for ava in rdn]
                 for rdn in value.rdns
             ]))
-            for rdn in rdns:
-                sort_avas(rdn)
         else:
             raise TypeError(
                 "must be str, unicode, tuple, Name, RDN or DN, got %s instead"
                 % type(value))
-        return rdns
 
     def _rdns_from_sequence(self, seq):
-        rdns = []
+        if len(seq) == 1:
+            return self._rdns_from_value(seq[0])
 
+        rdns = ()
+        key = ()
         for item in seq:
-            rdn = self._rdns_from_value(item)
-            rdns.extend(rdn)
-        return rdns
+            item_rdns, item_key = self._rdns_from_value(item)
+            rdns += item_rdns
+            key += item_key
+        return rdns, key
 
     def __deepcopy__(self, memo):
         return self
 
+    def __reduce__(self):
+        # the cached hash depends on the hash seed of the process, so only
+        # the string form is pickled
+        return (self.__class__, (str(self),))
+
+    def __setstate__(self, state):
+        # pickles created before __slots__ was used
+        self.rdns, self._key = _make_rdns(state['rdns'])
+        self._str = None
+        self._hash = None
+
     def _get_rdn(self, rdn):
         return self.RDN_type(*rdn, **{'raw': True})
 
     def ldap_text(self):
-        return dn2str(self.rdns)
+        if self._str is None:
+            self._str = dn2str(self.rdns)
+        return self._str
 
     def x500_text(self):
         return dn2str(reversed(self.rdns))
@@ -1189,10 +1245,7 @@ class DN:
         if isinstance(key, int):
             return self._get_rdn(self.rdns[key])
         if isinstance(key, slice):
-            cls = self.__class__
-            new_dn = cls.__new__(cls)
-            new_dn.rdns = self.rdns[key]
-            return new_dn
+            return self._from_rdns(self.rdns[key], self._key[key])
         elif isinstance(key, str):
             for rdn in self.rdns:
                 for ava in rdn:
@@ -1204,19 +1257,13 @@ class DN:
                                 (key.__class__.__name__))
 
     def __hash__(self):
-        # Hash is computed from DN's string representation.
-        #
-        # Because attrs & values are comparison case-insensitive the
-        # hash value between two objects which compare as equal but
-        # differ in case must yield the same hash value.
-
-        str_dn = ';,'.join([
-            '++'.join([
-                '=='.join((atype, avalue or ''))
-                for atype, avalue, _dummy in rdn
-            ]) for rdn in self.rdns
-        ])
-        return hash(str_dn.lower())
+        # Hash is computed from the same case-insensitive key that is used
+        # for comparison, so objects which compare as equal but differ in
+        # case yield the same hash value.
+
+        if self._hash is None:
+            self._hash = hash(self._key)
+        return self._hash
 
     def __eq__(self, other):
         # Try coercing to DN, if successful compare to coerced object
@@ -1231,11 +1278,12 @@ class DN:
         if not isinstance(other, DN):
             return False
 
-        if len(self) != len(other):
-            return False
+        if self is other or self.rdns is other.rdns:
+            return True
 
-        # Perform comparison between objects of same type
-        return self._cmp_sequence(other, 0, len(self)) == 0
+        # The keys have the length of each RDN as the first item, so DN's
+        # with a different number of RDN's never compare equal
+        return self._key == other._key
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -1247,18 +1295,17 @@ class DN:
         if len(self) != len(other):
             return len(self) < len(other)
 
-        return self._cmp_sequence(other, 0, len(self)) < 0
+        return self._key < other._key
 
     def _cmp_sequence(self, pattern, self_start, pat_len):
-        self_idx = self_start
-        pat_idx = 0
-        while pat_idx < pat_len:
-            r = cmp_rdns(self.rdns[self_idx], pattern.rdns[pat_idx])
-            if r != 0:
-                return r
-            self_idx += 1
-            pat_idx += 1
-        return 0
+        key_a = self._key[self_start:self_start + pat_len]
+        key_b = pattern._key[:pat_len]
+        if key_a == key_b:
+            return 0
+        elif key_a < key_b:
+            return -1
+        else:
+            return 1
 
     def __add__(self, other):
         return self.__class__(self, other)
@@ -1463,3 +1510,25 @@ ATTR_NAME_BY_OID = {
     cryptography.x509.ObjectIdentifier('2.5.4.17'): 'postalCode',
     cryptography.x509.ObjectIdentifier('0.9.2342.19200300.100.1.1'): 'UID',
 }
+
+
+def intern_dn(value):
+    """
+    Intern a DN which is common in LDAP data, e.g. the base DN or a container
+    DN, and return it as a DN object.
+
+    The string form of an interned DN is parsed only once, and its RDN's are
+    shared by every DN parsed later which contains them, which saves memory
+    and speeds up comparison.
+    """
+    dn = DN(value)
+    for rdn, key in zip(dn.rdns, dn._key):
+        _interned_rdns.setdefault(_intern_key(rdn), (rdn, key))
+    rdns, key = _make_rdns(dn.rdns)
+    texts = {str(dn)}
+    if isinstance(value, str):
+        texts.add(value)
+    for text in texts:
+        _interned_dns[text] = (rdns, key)
+        _dn_cache[text] = (rdns, key)
+    return DN._from_rdns(rdns, key)
@@ -21,6 +21,9 @@ import collections
 import gzip
 import io
 import logging
+import socket
+import threading
+import time
 from urllib.parse import urlencode
 import xml.dom.minidom
 import zlib
@@ -43,6 +46,13 @@ except ImportError:
     # pylint: disable=import-error
     import http.client as httplib
 
+# pylint: disable=import-error
+if six.PY3:
+    from http.client import RemoteDisconnected
+else:
+    from httplib import BadStatusLine as RemoteDisconnected
+# pylint: enable=import-error
+
 if six.PY3:
     unicode = str
 
@@ -147,6 +157,55 @@ def ca_status(ca_host=None):
     return _parse_ca_status(body)
 
 
+class ConnectionPool(threading.local):
+    """
+    Per-thread pool of keep-alive HTTP connections
+
+    A connection is reused for at most max_requests requests and is
+    discarded once it has been idle for more than idle_timeout seconds.
+    """
+
+    def __init__(self):
+        super(ConnectionPool, self).__init__()
+        self._connections = {}
+
+    def get(self, key, idle_timeout):
+        """
+        Take an idle connection for key out of the pool.
+
+        :return: (connection, number of requests already made) or
+                 (None, 0) if there is no usable connection
+        """
+        try:
+            conn, requests, last_used = self._connections.pop(key)
+        except KeyError:
+            return None, 0
+        if time.time() - last_used > idle_timeout:
+            conn.close()
+            return None, 0
+        return conn, requests
+
+    def put(self, key, conn, requests, max_requests):
+        """
+        Return a connection after a completed request to the pool.
+        """
+        old = self._connections.pop(key, None)
+        if old is not None:
+            old[0].close()
+        if requests >= max_requests:
+            conn.close()
+        else:
+            self._connections[key] = (conn, requests, time.time())
+
+    def clear(self):
+        for conn, _requests, _last_used in self._connections.values():
+            conn.close()
+        self._connections.clear()
+
+
+connection_pool = ConnectionPool()
+
+
 def https_request(
         host, port, url, cafile, client_certfile, client_keyfile,
         method='POST', headers=None, body=None, **kw):
@@ -170,11 +229,17 @@ def https_request(
             tls_version_min=api.env.tls_version_min,
             tls_version_max=api.env.tls_version_max)
 
+    pool_key = None
+    if api.env.in_server and api.env.dogtag_pool_max_requests > 0:
+        pool_key = (host, port, cafile, client_certfile, client_keyfile)
+
     if body is None:
         body = urlencode(kw)
     return _httplib_request(
         'https', host, port, url, connection_factory, body,
-        method=method, headers=headers)
+        method=method, headers=headers, pool_key=pool_key,
+        pool_max_requests=api.env.dogtag_pool_max_requests,
+        pool_idle_timeout=api.env.dogtag_pool_idle_timeout)
 
 
 def http_request(host, port, url, timeout=None, **kw):
@@ -198,9 +263,28 @@ def http_request(host, port, url, timeout=None, **kw):
         connection_options=conn_opt)
 
 
+def _can_resend(method, sent, error):
+    """
+    Return True if a request which failed over a reused connection can be
+    sent again over a new connection.
+
+    The server may have closed the idle connection. A request is only sent
+    again if the server cannot have processed it: it failed while being
+    sent or the connection was closed before any byte of the response was
+    received. GET and HEAD requests are sent again after any failure except
+    a timeout.
+    """
+    if isinstance(error, socket.timeout):
+        return False
+    if method in ('GET', 'HEAD'):
+        return True
+    return not sent or isinstance(error, RemoteDisconnected)
+
+
 def _httplib_request(
         protocol, host, port, path, connection_factory, request_body,
-        method='POST', headers=None, connection_options=None):
+        method='POST', headers=None, connection_options=None,
+        pool_key=None, pool_max_requests=0, pool_idle_timeout=0):
     """
     :param request_body: Request body
     :param connection_factory: Connection class to use. Will be called
@@ -208,6 +292,12 @@ def _httplib_request(
     :param method: HTTP request method (default: 'POST')
     :param connection_options: a dictionary that will be passed to
         connection_factory as keyword arguments.
+    :param pool_key: if not None, the connection is kept open and reused
+        by subsequent requests with the same key, see `ConnectionPool`.
+    :param pool_max_requests: maximum number of requests sent over a
+        reused connection
+    :param pool_idle_timeout: how long an idle connection is reused
+        [seconds]
 
     Perform a HTTP(s) request.
     """
@@ -225,15 +315,40 @@ def _httplib_request(
     ):
         headers['content-type'] = 'application/x-www-form-urlencoded'
 
+    conn, requests = None, 0
+    if pool_key is not None:
+        conn, requests = connection_pool.get(pool_key, pool_idle_timeout)
+
     try:
-        conn = connection_factory(host, port, **connection_options)
-        conn.request(method, path, body=request_body, headers=headers)
-        res = conn.getresponse()
+        while True:
+            reused = conn is not None
+            if not reused:
+                conn = connection_factory(host, port, **connection_options)
+                requests = 0
+            sent = False
+            try:
+                conn.request(method, path, body=request_body, headers=headers)
+                sent = True
+                res = conn.getresponse()
+                http_body = res.read()
+            except (httplib.HTTPException, EnvironmentError) as e:
+                conn.close()
+                if not reused or not _can_resend(method, sent, e):
+                    raise
+                # the server may have closed the idle connection
+                logger.debug("reused connection failed, reconnecting",
+                             exc_info=True)
+                conn = None
+                continue
+            break
 
         http_status = res.status
         http_headers = res.msg
-        http_body = res.read()
-        conn.close()
+        if pool_key is not None and not res.will_close:
+            connection_pool.put(pool_key, conn, requests + 1,
+                                pool_max_requests)
+        else:
+            conn.close()
     except Exception as e:
         logger.debug("httplib request failed:", exc_info=True)
         raise NetworkError(uri=uri, error=str(e))
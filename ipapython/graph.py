@@ -10,16 +10,21 @@ class Graph:
 
     G = (V, E) where G is graph, V set of vertices and E list of edges.
     E = (tail, head) where tail and head are vertices
+
+    Heads and tails of each vertex are indexed, so queries and removal of a
+    vertex don't have to scan all edges.
     """
 
     def __init__(self):
         self.vertices = set()
         self.edges = []
         self._adj = dict()
+        self._radj = dict()
 
     def add_vertex(self, vertex):
         self.vertices.add(vertex)
         self._adj[vertex] = []
+        self._radj[vertex] = []
 
     def add_edge(self, tail, head):
         if tail not in self.vertices:
@@ -30,15 +35,17 @@ class Graph:
 
         self.edges.append((tail, head))
         self._adj[tail].append(head)
+        self._radj[head].append(tail)
 
     def remove_edge(self, tail, head):
         try:
             self.edges.remove((tail, head))
-        except KeyError:
+        except ValueError:
             raise ValueError(
                 "graph does not contain edge: ({0}, {1})".format(tail, head)
             )
         self._adj[tail].remove(head)
+        self._radj[head].remove(tail)
 
     def remove_vertex(self, vertex):
         try:
@@ -48,27 +55,33 @@ class Graph:
                 "graph does not contain vertex: {0}".format(vertex)
             )
 
-        # delete _adjacencies
-        del self._adj[vertex]
-        for adj in self._adj.values():
-            adj[:] = [v for v in adj if v != vertex]
+        # delete adjacencies of the neighbours
+        heads = self._adj.pop(vertex)
+        tails = self._radj.pop(vertex)
+        for head in set(heads):
+            if head != vertex:
+                self._radj[head] = [v for v in self._radj[head] if v != vertex]
+        for tail in set(tails):
+            if tail != vertex:
+                self._adj[tail] = [v for v in self._adj[tail] if v != vertex]
 
         # delete edges
-        self.edges = [
-            e for e in self.edges if vertex not in (e[0], e[1])
-        ]
+        if heads or tails:
+            self.edges = [
+                e for e in self.edges if vertex not in (e[0], e[1])
+            ]
 
     def get_tails(self, head):
         """
         Get list of vertices where a vertex is on the right side of an edge
         """
-        return [e[0] for e in self.edges if e[1] == head]
+        return list(self._radj.get(head, []))
 
     def get_heads(self, tail):
         """
         Get list of vertices where a vertex is on the left side of an edge
         """
-        return [e[1] for e in self.edges if e[0] == tail]
+        return list(self._adj.get(tail, []))
 
     def bfs(self, start=None):
         """
@@ -86,3 +99,90 @@ class Graph:
                 visited.add(vertex)
                 queue.extend(set(self._adj.get(vertex, [])) - visited)
         return visited
+
+    def strongly_connected_components(self, removed=()):
+        """
+        Find strongly connected components of the graph using Tarjan's
+        algorithm, ignoring vertices in `removed`.
+
+        Return a list of sets of vertices. A component is listed before all
+        components from which it is reachable.
+        """
+        removed = set(removed)
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        components = []
+
+        for root in self.vertices:
+            if root in index or root in removed:
+                continue
+
+            # iterative DFS, work items are (vertex, iterator over heads)
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self._adj[root]))]
+
+            while work:
+                vertex, heads = work[-1]
+                for head in heads:
+                    if head in removed:
+                        continue
+                    if head not in index:
+                        index[head] = lowlink[head] = len(index)
+                        stack.append(head)
+                        on_stack.add(head)
+                        work.append((head, iter(self._adj[head])))
+                        break
+                    elif head in on_stack:
+                        lowlink[vertex] = min(lowlink[vertex], index[head])
+                else:
+                    work.pop()
+                    if work:
+                        tail = work[-1][0]
+                        lowlink[tail] = min(lowlink[tail], lowlink[vertex])
+                    if lowlink[vertex] == index[vertex]:
+                        component = set()
+                        while True:
+                            v = stack.pop()
+                            on_stack.discard(v)
+                            component.add(v)
+                            if v == vertex:
+                                break
+                        components.append(component)
+
+        return components
+
+    def reachability(self, removed=()):
+        """
+        Get vertices reachable from each vertex, ignoring vertices in
+        `removed`.
+
+        All vertices are evaluated in a single pass over the strongly
+        connected components instead of a traversal from each vertex.
+        Return a dict which maps each vertex to a frozenset of vertices
+        reachable from it, including the vertex itself.
+        """
+        removed = set(removed)
+        components = self.strongly_connected_components(removed)
+
+        if len(components) == 1:
+            # strongly connected, every vertex reaches all vertices
+            reachable = frozenset(components[0])
+            return {v: reachable for v in reachable}
+
+        result = {}
+        # components reachable from a component are already evaluated
+        for component in components:
+            reachable = set(component)
+            for vertex in component:
+                for head in self._adj[vertex]:
+                    if head not in removed and head not in component:
+                        reachable.update(result[head])
+            reachable = frozenset(reachable)
+            for vertex in component:
+                result[vertex] = reachable
+
+        return result
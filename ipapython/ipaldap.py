@@ -25,16 +25,20 @@ import logging
 import time
 import datetime
 from decimal import Decimal
-from copy import deepcopy
 import contextlib
 import os
+import hashlib
+import pickle
 import pwd
+import stat
+import tempfile
 import warnings
 
 from cryptography import x509 as crypto_x509
 from cryptography.hazmat.primitives import serialization
 
 import ldap
+import ldap.ldapobject
 import ldap.sasl
 import ldap.filter
 from ldap.controls import SimplePagedResultsControl, GetEffectiveRightsControl
@@ -43,7 +47,8 @@ import six
 
 # pylint: disable=ipa-forbidden-import
 from ipalib import errors, x509, _
-from ipalib.constants import LDAP_GENERALIZED_TIME_FORMAT
+from ipalib.constants import LDAP_GENERALIZED_TIME_FORMAT, USER_CACHE_PATH
+from ipalib.request import context
 # pylint: enable=ipa-forbidden-import
 from ipaplatform.paths import paths
 from ipapython.ipautil import format_netloc, CIDict
@@ -103,6 +108,27 @@ def realm_to_ldapi_uri(realm_name):
     return 'ldapi://' + ldapurl.ldapUrlEscape(socketname)
 
 
+class _LDAPObject(ldap.ldapobject.SimpleLDAPObject):
+    """
+    LDAP connection recording its calls in the timings of the current request
+
+    See `ipalib.request.RequestTimings`, without timing enabled the calls
+    are passed through unchanged.
+    """
+    _untimed_calls = frozenset(['get_option', 'set_option'])
+
+    def _ldap_call(self, func, *args, **kwargs):
+        timings = getattr(context, 'timings', None)
+        if timings is None or func.__name__ in self._untimed_calls:
+            return super(_LDAPObject, self)._ldap_call(func, *args, **kwargs)
+        start = time.monotonic()
+        try:
+            return super(_LDAPObject, self)._ldap_call(func, *args, **kwargs)
+        finally:
+            timings.add_ldap_operation(
+                func.__name__, time.monotonic() - start)
+
+
 def ldap_initialize(uri, cacertfile=None):
     """Wrapper around ldap.initialize()
 
@@ -114,8 +140,11 @@ def ldap_initialize(uri, cacertfile=None):
       locations, also known as system-wide trust store.
     * Cert validation is enforced.
     * SSLv2 and SSLv3 are disabled.
+
+    LDAP calls of the connection are recorded in timings of the current
+    request, see `_LDAPObject`.
     """
-    conn = ldap.initialize(uri)
+    conn = _LDAPObject(uri)
 
     # Do not perform reverse DNS lookups to canonicalize SASL host names
     conn.set_option(ldap.OPT_X_SASL_NOCANON, ldap.OPT_ON)
@@ -142,19 +171,32 @@ class _ServerSchema:
     Properties of a schema retrieved from an LDAP server.
     '''
 
-    def __init__(self, server, schema):
+    def __init__(self, server, schema, version=None):
         self.server = server
         self.schema = schema
+        self.version = version
         self.retrieve_timestamp = time.time()
 
 
 class SchemaCache:
     '''
     Cache the schema's from individual LDAP servers.
+
+    Besides the in-process cache, parsed schemas are persisted in
+    *cache_dir* together with the server's schema version (nsSchemaCSN and
+    modifyTimestamp of the schema entry), so that a new process only needs
+    to read the version from the server to be able to reuse the schema
+    retrieved by a previous process. The module-level cache uses the
+    per-user cache directory, server processes point it to a directory
+    owned by the server (see ldap2).
     '''
 
-    def __init__(self):
+    FORMAT = 1
+    _VERSION_ATTRS = ['nsschemacsn', 'modifytimestamp']
+
+    def __init__(self, cache_dir=None):
         self.servers = {}
+        self.cache_dir = cache_dir
 
     def get_schema(self, url, conn, force_update=False):
         '''
@@ -171,8 +213,12 @@ class SchemaCache:
 
         server_schema = self.servers.get(url)
         if server_schema is None:
-            schema = self._retrieve_schema_from_server(url, conn)
-            server_schema = _ServerSchema(url, schema)
+            if not force_update:
+                server_schema = self._read_schema(url, conn)
+            if server_schema is None:
+                schema, version = self._retrieve_schema_from_server(url, conn)
+                server_schema = _ServerSchema(url, schema, version)
+                self._write_schema(server_schema)
             self.servers[url] = server_schema
         return server_schema.schema
 
@@ -183,34 +229,96 @@ class SchemaCache:
         except KeyError:
             pass
 
-    def _retrieve_schema_from_server(self, url, conn):
-        """
-        Retrieve the LDAP schema from the provided url and determine if
-        User-Private Groups (upg) are configured.
+    def _get_path(self, url):
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, str(self.FORMAT), digest)
 
-        Bind using kerberos credentials. If in the context of the
-        in-tree "lite" server then use the current ccache. If in the context of
-        Apache then create a new ccache and bind using the Apache HTTP service
-        principal.
+    @classmethod
+    def _get_version(cls, schema_entry):
+        attrs = {k.lower(): v for k, v in schema_entry.items()}
+        version = tuple(
+            b''.join(attrs.get(name, [])) for name in cls._VERSION_ATTRS)
+        if not any(version):
+            # the server does not provide any schema version
+            return None
+        return version
 
-        If a connection is provided then it the credentials bound to it are
-        used. The connection is not closed when the request is done.
+    def _read_schema(self, url, conn):
         """
-        assert conn is not None
+        Load the schema from the on-disk cache if it matches the version
+        currently provided by the server, return None otherwise.
+        """
+        if self.cache_dir is None:
+            return None
 
-        logger.debug(
-            'retrieving schema for SchemaCache url=%s conn=%s', url, conn)
+        path = self._get_path(url)
+        try:
+            with open(path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                if (st.st_uid != os.geteuid() or
+                        st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+                    logger.debug('ignoring untrusted schema cache %s', path)
+                    return None
+                version, schema = pickle.load(f)
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                logger.debug('failed to read schema cache %s: %s', path, e)
+            return None
+        except Exception as e:
+            logger.debug('failed to load schema cache %s: %s', path, e)
+            return None
+
+        if version is None:
+            return None
 
+        try:
+            schema_entry = self._search_schema(
+                url, conn, self._VERSION_ATTRS)
+        except errors.PublicError as e:
+            logger.debug('failed to read schema version: %s', e)
+            return None
+
+        if self._get_version(schema_entry) != version:
+            logger.debug('schema of %s changed, ignoring schema cache', url)
+            return None
+
+        logger.debug('loaded schema for SchemaCache url=%s from %s', url, path)
+        return _ServerSchema(url, schema, version)
+
+    def _write_schema(self, server_schema):
+        if self.cache_dir is None or server_schema.version is None:
+            return
+
+        path = self._get_path(server_schema.server)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                    'wb', dir=directory, delete=False) as f:
+                try:
+                    pickle.dump(
+                        (server_schema.version, server_schema.schema), f,
+                        pickle.HIGHEST_PROTOCOL)
+                    f.close()
+                except Exception:
+                    os.unlink(f.name)
+                    raise
+                else:
+                    os.rename(f.name, path)
+        except Exception as e:
+            logger.debug('failed to write schema cache %s: %s', path, e)
+
+    def _search_schema(self, url, conn, attrlist):
         try:
             try:
                 schema_entry = conn.search_s('cn=schema', ldap.SCOPE_BASE,
-                    attrlist=['attributetypes', 'objectclasses'])[0]
+                    attrlist=attrlist)[0]
             except ldap.NO_SUCH_OBJECT:
                 # try different location for schema
                 # openldap has schema located in cn=subschema
                 logger.debug('cn=schema not found, fallback to cn=subschema')
                 schema_entry = conn.search_s('cn=subschema', ldap.SCOPE_BASE,
-                    attrlist=['attributetypes', 'objectclasses'])[0]
+                    attrlist=attrlist)[0]
         except ldap.SERVER_DOWN:
             raise errors.NetworkError(uri=url,
                                error=u'LDAP Server Down, unable to retrieve LDAP schema')
@@ -224,9 +332,40 @@ class SchemaCache:
         # TODO: DS uses 'cn=schema', support for other server?
         #       raise a more appropriate exception
 
-        return ldap.schema.SubSchema(schema_entry[1])
+        return schema_entry[1]
+
+    def _retrieve_schema_from_server(self, url, conn):
+        """
+        Retrieve the LDAP schema from the provided url and determine if
+        User-Private Groups (upg) are configured.
+
+        Bind using kerberos credentials. If in the context of the
+        in-tree "lite" server then use the current ccache. If in the context of
+        Apache then create a new ccache and bind using the Apache HTTP service
+        principal.
+
+        If a connection is provided then it the credentials bound to it are
+        used. The connection is not closed when the request is done.
+
+        Returns the schema and its version.
+        """
+        assert conn is not None
+
+        logger.debug(
+            'retrieving schema for SchemaCache url=%s conn=%s', url, conn)
 
-schema_cache = SchemaCache()
+        schema_entry = self._search_schema(
+            url, conn,
+            ['attributetypes', 'objectclasses'] + self._VERSION_ATTRS)
+        version = self._get_version(schema_entry)
+        for name in list(schema_entry):
+            if name.lower() in self._VERSION_ATTRS:
+                del schema_entry[name]
+
+        return ldap.schema.SubSchema(schema_entry), version
+
+schema_cache = SchemaCache(
+    os.path.join(USER_CACHE_PATH, 'ipa', 'ldap_schema'))
 
 
 class LDAPEntry(MutableMapping):
@@ -282,6 +421,10 @@ class LDAPEntry(MutableMapping):
 
         if isinstance(_obj, LDAPEntry):
             #pylint: disable=E1103
+            # the value lists are shared with the copy, the original values
+            # must not be modified through them
+            for name in list(_obj._orig_raw):
+                _obj._detach_orig_raw(name)
             self._not_list = set(_obj._not_list)
             self._orig_raw = dict(_obj._orig_raw)
             if _obj.conn is _conn:
@@ -329,6 +472,30 @@ class LDAPEntry(MutableMapping):
     def copy(self):
         return LDAPEntry(self)
 
+    def _load_raw(self, attrs):
+        """
+        Load attributes of an entry read from LDAP.
+
+        The values are lists of bytes, so the checks of _set_raw() are
+        skipped. They are decoded on first access. Entries read from LDAP
+        are mostly never modified, so instead of being copied, the original
+        values share the value lists with the current values until they are
+        modified.
+        """
+        for name, value in attrs.items():
+            name = self._add_attr_name(self._attr_name(name))
+            self._raw[name] = value
+            self._nice[name] = None
+            self._sync.pop(name, None)
+        self._orig_raw = dict(self._raw)
+
+    def _detach_orig_raw(self, name):
+        # copy original values shared by _load_raw() before the value list
+        # is modified
+        orig = self._orig_raw.get(name)
+        if orig is not None and orig is self._raw.get(name):
+            self._orig_raw[name] = list(orig)
+
     def _sync_attr(self, name):
         nice = self._nice[name]
         assert isinstance(nice, list)
@@ -345,6 +512,9 @@ class LDAPEntry(MutableMapping):
         raw_adds = set(raw) - set(raw_sync)
         raw_dels = set(raw_sync) - set(raw)
 
+        if nice_adds or nice_dels:
+            self._detach_orig_raw(name)
+
         for value in nice_dels:
             value = self._conn.encode(value)
             if value in raw_adds:
@@ -377,7 +547,8 @@ class LDAPEntry(MutableMapping):
                 continue
             nice.append(value)
 
-        self._sync[name] = (deepcopy(nice), deepcopy(raw))
+        # the values are immutable, copying the lists is enough
+        self._sync[name] = (list(nice), list(raw))
 
         if len(nice) > 1:
             self._not_list.discard(name)
@@ -502,6 +673,9 @@ class LDAPEntry(MutableMapping):
         if self._nice[name] is not None:
             self._sync_attr(name)
 
+        # the caller may modify the list
+        self._detach_orig_raw(name)
+
         return value
 
     def __getitem__(self, name):
@@ -549,7 +723,9 @@ class LDAPEntry(MutableMapping):
         if other is None:
             other = self
         assert isinstance(other, LDAPEntry)
-        self._orig_raw = deepcopy(dict(other.raw))
+        self._orig_raw = {
+            name: list(value) for name, value in other.raw.items()
+        }
 
     def generate_modlist(self):
         modlist = []
@@ -1056,10 +1232,9 @@ class LDAPClient:
                 continue
 
             ipa_entry = LDAPEntry(self, DN(original_dn))
-
-            for attr, original_values in original_attrs.items():
-                ipa_entry.raw[attr] = original_values
-            ipa_entry.reset_modlist()
+            # pylint: disable=protected-access
+            ipa_entry._load_raw(original_attrs)
+            # pylint: enable=protected-access
 
             ipa_result.append(ipa_entry)
 
@@ -1479,12 +1654,58 @@ class LDAPClient:
         :raises: errors.NotFound if result set is empty
                                  or base_dn doesn't exist
         """
+        res = []
+        search = self._search_entries(
+            filter, attrs_list, base_dn, scope, time_limit, size_limit,
+            paged_search, get_effective_rights)
+        while True:
+            try:
+                res.append(next(search))
+            except StopIteration as e:
+                truncated = e.value
+                break
+
+        if not res and not truncated:
+            raise errors.EmptyResult(reason='no matching entry found')
+
+        return (res, truncated)
+
+    def iter_entries(
+            self, filter=None, attrs_list=None, base_dn=None,
+            scope=ldap.SCOPE_SUBTREE, time_limit=None, size_limit=None,
+            page_size=None, get_effective_rights=False):
+        """
+        Iterate over entries matching specified search parameters.
+
+        Unlike find_entries(), entries are yielded as they arrive from the
+        server and the search is always paged, so memory use is bounded by
+        the page size rather than by the size of the result set. Closing the
+        iterator early abandons the search.
+
+        Keyword arguments are the same as for find_entries(), in addition:
+        :param page_size: number of entries requested per page
+                          (default 2000)
+
+        :raises: errors.LimitsExceeded after the last entry if the results
+                 were truncated by the server
+        :raises: errors.NotFound if base_dn doesn't exist
+        """
+        truncated = yield from self._search_entries(
+            filter, attrs_list, base_dn, scope, time_limit, size_limit,
+            True, get_effective_rights, page_size=page_size)
+        self.handle_truncated_result(truncated)
+
+    def _search_entries(
+            self, filter, attrs_list, base_dn, scope, time_limit, size_limit,
+            paged_search, get_effective_rights, page_size=None):
+        """
+        Generator yielding entries of a search, returns the truncated flag.
+        """
         if base_dn is None:
             base_dn = DN()
         assert isinstance(base_dn, DN)
         if not filter:
             filter = '(objectClass=*)'
-        res = []
         truncated = False
 
         if time_limit is None:
@@ -1508,8 +1729,11 @@ class LDAPClient:
             base_sctrls.append(self.__get_effective_rights_control())
 
         cookie = ''
-        page_size = (size_limit if size_limit > 0 else 2000) - 1
-        if page_size == 0:
+        if page_size is None:
+            page_size = (size_limit if size_limit > 0 else 2000) - 1
+        elif size_limit > 0:
+            page_size = min(page_size, size_limit - 1)
+        if page_size <= 0:
             paged_search = False
 
         # pass arguments to python-ldap
@@ -1539,7 +1763,16 @@ class LDAPClient:
                             break
                         res_list = self._convert_result(res_list)
                         if res_list:
-                            res.append(res_list[0])
+                            try:
+                                yield res_list[0]
+                            except GeneratorExit:
+                                # the consumer stopped iterating
+                                self.conn.abandon(id)
+                                if paged_search and cookie:
+                                    self._cancel_paged_search(
+                                        base_dn, scope, filter, attrs_list,
+                                        time_limit, size_limit, cookie)
+                                raise
 
                     if paged_search:
                         # Get cookie for the next page
@@ -1561,15 +1794,9 @@ class LDAPClient:
                 except ldap.LDAPError as e:
                     # If paged search is in progress, try to cancel it
                     if paged_search and cookie:
-                        sctrls = [SimplePagedResultsControl(0, 0, cookie)]
-                        try:
-                            self.conn.search_ext_s(
-                                str(base_dn), scope, filter, attrs_list,
-                                serverctrls=sctrls, timeout=time_limit,
-                                sizelimit=size_limit)
-                        except ldap.LDAPError as e2:
-                            logger.warning(
-                                "Error cancelling paged search: %s", e2)
+                        self._cancel_paged_search(
+                            base_dn, scope, filter, attrs_list, time_limit,
+                            size_limit, cookie)
                         cookie = ''
 
                     try:
@@ -1582,10 +1809,18 @@ class LDAPClient:
                 if not paged_search or not cookie:
                     break
 
-        if not res and not truncated:
-            raise errors.EmptyResult(reason='no matching entry found')
+        return truncated
 
-        return (res, truncated)
+    def _cancel_paged_search(self, base_dn, scope, filter, attrs_list,
+                             time_limit, size_limit, cookie):
+        sctrls = [SimplePagedResultsControl(0, 0, cookie)]
+        try:
+            self.conn.search_ext_s(
+                str(base_dn), scope, filter, attrs_list,
+                serverctrls=sctrls, timeout=time_limit,
+                sizelimit=size_limit)
+        except ldap.LDAPError as e:
+            logger.warning("Error cancelling paged search: %s", e)
 
     def __get_effective_rights_control(self):
         """Construct a GetEffectiveRights control for current user."""
@@ -8,7 +8,7 @@ import logging
 
 import six
 
-from collections import defaultdict, OrderedDict
+from collections import OrderedDict
 from dns import (
     rdata,
     rdataclass,
@@ -21,6 +21,7 @@ from time import sleep, time
 
 from ipalib import errors
 from ipalib.dns import record_name_format
+from ipapython.dn import DN
 from ipapython.dnsutil import DNSName, resolve_rrsets
 
 if six.PY3:
@@ -57,6 +58,8 @@ IPA_DEFAULT_NTP_SRV_REC = (
 
 CA_RECORDS_DNS_TIMEOUT = 30  # timeout in seconds
 
+CNAME_TEMPLATE_ATTR = 'idnsTemplateAttribute;cnamerecord'
+
 
 class IPADomainIsNotManagedByIPAError(Exception):
     pass
@@ -263,53 +266,164 @@ class IPASystemRecords:
 
         return zone_obj
 
-    def __prepare_records_update_dict(self, node):
-        update_dict = defaultdict(list)
-        for rdataset in node:
-            for rdata in rdataset:
-                option_name = (record_name_format % rdatatype.to_text(
-                    rdata.rdtype).lower())
-                update_dict[option_name].append(unicode(rdata.to_text()))
-        return update_dict
-
-    def __update_dns_records(
-            self, record_name, nodes, set_cname_template=True
-    ):
-        update_dict = self.__prepare_records_update_dict(nodes)
-        cname_template = {
-            'addattr': ['objectclass=idnsTemplateObject'],
-            'setattr': [
-                r'idnsTemplateAttribute;cnamerecord=%s'
-                r'.\{substitutionvariable_ipalocation\}._locations' %
-                record_name.relativize(self.domain_abs)
-            ]
-        }
+    def __get_cname_template(self, record_name):
+        return (
+            r'%s.\{substitutionvariable_ipalocation\}._locations' %
+            record_name.relativize(self.domain_abs)
+        )
+
+    def __get_names_requiring_cname_templates(self):
+        return set(
+            rec[0].derelativize(self.domain_abs) for rec in (
+                IPA_DEFAULT_MASTER_SRV_REC +
+                IPA_DEFAULT_ADTRUST_SRV_REC +
+                IPA_DEFAULT_NTP_SRV_REC
+            )
+        )
+
+    def __get_existing_records(self, record_names):
+        """
+        Read entries of the given records from the IPA domain zone in a
+        single LDAP search
+        :param record_names: absolute names of records
+        :return: (zone DN, {record_name: LDAPEntry}), records which do not
+        exist are missing in the dictionary
+        :raise IPADomainIsNotManagedByIPAError: if IPA domain is not managed
+        by IPA DNS
+        """
+        ldap = self.api_instance.Backend.ldap2
+        names = sorted(set(
+            name.relativize(self.domain_abs).ToASCII()
+            for name in record_names
+        ))
+
+        existing = {}
         try:
-            if set_cname_template:
-                # only srv records should have configured cname templates
-                update_dict.update(cname_template)
-            self.api_instance.Command.dnsrecord_mod(
-                self.domain_abs, record_name,
-                **update_dict
+            zone_dn = self.api_instance.Object.dnszone.get_dn(self.domain_abs)
+            if not names:
+                return zone_dn, existing
+            entries = ldap.iter_entries(
+                filter=ldap.make_filter_from_attr(
+                    'idnsname', names, rules=ldap.MATCH_ANY),
+                attrs_list=['*'],
+                base_dn=zone_dn,
+                scope=ldap.SCOPE_ONELEVEL,
+                size_limit=-1,
+                time_limit=-1,
             )
+            for entry in entries:
+                record_name = entry.single_value['idnsname'].derelativize(
+                    self.domain_abs)
+                existing[record_name] = entry
         except errors.NotFound:
-            # because internal API magic, addattr and setattr doesn't work with
-            # dnsrecord-add well, use dnsrecord-mod instead later
-            update_dict.pop('addattr', None)
-            update_dict.pop('setattr', None)
+            raise IPADomainIsNotManagedByIPAError()
 
-            self.api_instance.Command.dnsrecord_add(
-                self.domain_abs, record_name, **update_dict)
+        return zone_dn, existing
+
+    def __value_to_rdata(self, rdtype, value):
+        try:
+            return rdata.from_text(rdataclass.IN, rdtype, value,
+                                   origin=self.domain_abs, relativize=False)
+        except DNSException:
+            return None
 
-            if set_cname_template:
+    def __get_record_mods(self, record_name, node, entry, set_cname_template):
+        """
+        Compare expected records with the LDAP entry of the record
+        :param entry: LDAPEntry of the record, None if it does not exist
+        :return: dict {attribute: new values} of attributes which have to be
+        replaced, empty if the entry is up to date
+        """
+        mods = {}
+        for rdataset in node:
+            attr = (record_name_format % rdatatype.to_text(
+                rdataset.rdtype).lower())
+            old_values = entry.get(attr, []) if entry is not None else []
+            # invalid records are converted to None and replaced
+            old_rdata = set(
+                self.__value_to_rdata(rdataset.rdtype, value)
+                for value in old_values
+            )
+            if old_rdata != set(rdataset):
+                mods[attr] = [unicode(rd.to_text()) for rd in rdataset]
+
+        if entry is None:
+            objectclasses = ['top', 'idnsrecord']
+            mods['objectclass'] = objectclasses
+        else:
+            objectclasses = entry.get('objectclass', [])
+
+        if set_cname_template:
+            # only srv records should have configured cname templates
+            if 'idnstemplateobject' not in (
+                    oc.lower() for oc in objectclasses):
+                mods['objectclass'] = (
+                    list(objectclasses) + ['idnsTemplateObject'])
+            template = self.__get_cname_template(record_name)
+            old_template = (
+                entry.get(CNAME_TEMPLATE_ATTR) if entry is not None else None)
+            if old_template != [template]:
+                mods[CNAME_TEMPLATE_ATTR] = [template]
+
+        return mods
+
+    def __get_changes(self, zone_obj, existing, cname_template_names=()):
+        """
+        :return: [(record_name, node, entry, mods), ...] for all records in
+        zone_obj, see __get_record_mods
+        """
+        changes = []
+        for record_name, node in zone_obj.items():
+            entry = existing.get(record_name)
+            mods = self.__get_record_mods(
+                record_name, node, entry,
+                record_name in cname_template_names)
+            changes.append((record_name, node, entry, mods))
+        return changes
+
+    def __apply_record_mods(self, zone_dn, record_name, entry, mods):
+        """
+        Write changes of a record directly to LDAP, without the overhead of
+        dnsrecord_add and dnsrecord_mod commands
+        """
+        ldap = self.api_instance.Backend.ldap2
+        dnsrecord = self.api_instance.Object.dnsrecord
+        relative_name = record_name.relativize(self.domain_abs)
+        keys = (self.domain_abs, relative_name)
+
+        dnsrecord.check_record_type_collisions(
+            keys, dnsrecord.updated_rrattrs(entry, mods))
+
+        if entry is None:
+            entry = ldap.make_entry(
+                DN(('idnsname', relative_name.ToASCII()), zone_dn),
+                idnsname=[relative_name],
+            )
+            entry.update(mods)
+            ldap.add_entry(entry)
+        else:
+            entry.update(mods)
+            ldap.update_entry(entry)
+
+        if self.api_instance.env['wait_for_dns']:
+            # only the record attributes, like dnsrecord_mod
+            dnsrecord.wait_for_modified_entries(
+                {keys: dnsrecord.updated_rrattrs(None, mods)})
+
+    def __update_records(self, zone_obj, zone_dn, existing,
+                         cname_template_names=()):
+        fail = []
+        success = []
+        for record_name, node, entry, mods in self.__get_changes(
+                zone_obj, existing, cname_template_names):
+            if mods:
                 try:
-                    self.api_instance.Command.dnsrecord_mod(
-                        self.domain_abs,
-                        record_name, **cname_template)
-                except errors.EmptyModlist:
-                    pass
-        except errors.EmptyModlist:
-            pass
+                    self.__apply_record_mods(zone_dn, record_name, entry, mods)
+                except errors.PublicError as e:
+                    fail.append((record_name, node, e))
+                    continue
+            success.append((record_name, node))
+        return success, fail
 
     def get_base_records(
             self, servers=None, roles=None, include_master_role=True,
@@ -369,28 +483,14 @@ class IPASystemRecords:
         :return: [(record_name, node), ...], [(record_name, node, error), ...]
         where the first list contains successfully updated records, and the
         second list contains failed updates with particular exceptions
+        :raise IPADomainIsNotManagedByIPAError: if IPA domain is not managed by
+        IPA DNS
         """
-        fail = []
-        success = []
-        names_requiring_cname_templates = set(
-            rec[0].derelativize(self.domain_abs) for rec in (
-                IPA_DEFAULT_MASTER_SRV_REC +
-                IPA_DEFAULT_ADTRUST_SRV_REC +
-                IPA_DEFAULT_NTP_SRV_REC
-            )
-        )
-
         base_zone = self.get_base_records()
-        for record_name, node in base_zone.items():
-            set_cname_template = record_name in names_requiring_cname_templates
-            try:
-                self.__update_dns_records(
-                    record_name, node, set_cname_template)
-            except errors.PublicError as e:
-                fail.append((record_name, node, e))
-            else:
-                success.append((record_name, node))
-        return success, fail
+        zone_dn, existing = self.__get_existing_records(base_zone.keys())
+        return self.__update_records(
+            base_zone, zone_dn, existing,
+            self.__get_names_requiring_cname_templates())
 
     def update_locations_records(self):
         """
@@ -398,41 +498,91 @@ class IPASystemRecords:
         :return: [(record_name, node), ...], [(record_name, node, error), ...]
         where the first list contains successfully updated records, and the
         second list contains failed updates with particular exceptions
+        :raise IPADomainIsNotManagedByIPAError: if IPA domain is not managed by
+        IPA DNS
         """
-        fail = []
-        success = []
-
         location_zone = self.get_locations_records()
-        for record_name, nodes in location_zone.items():
-            try:
-                self.__update_dns_records(
-                    record_name, nodes,
-                    set_cname_template=False)
-            except errors.PublicError as e:
-                fail.append((record_name, nodes, e))
-            else:
-                success.append((record_name, nodes))
-        return success, fail
+        zone_dn, existing = self.__get_existing_records(location_zone.keys())
+        return self.__update_records(location_zone, zone_dn, existing)
 
     def update_dns_records(self):
         """
         Update all IPA DNS records
+
+        Existing records are read in a single LDAP search and only records
+        which differ from the expected records are written.
         :return: (sucessfully_updated_base_records, failed_base_records,
         sucessfully_updated_locations_records, failed_locations_records)
         For format see update_base_records or update_locations_method
         :raise IPADomainIsNotManagedByIPAError: if IPA domain is not managed by
         IPA DNS
         """
-        try:
-            self.api_instance.Command.dnszone_show(self.domain_abs)
-        except errors.NotFound:
-            raise IPADomainIsNotManagedByIPAError()
+        base_zone = self.get_base_records()
+        location_zone = self.get_locations_records()
+        zone_dn, existing = self.__get_existing_records(
+            list(base_zone.keys()) + list(location_zone.keys()))
 
         return (
-            self.update_base_records(),
-            self.update_locations_records()
+            self.__update_records(
+                base_zone, zone_dn, existing,
+                self.__get_names_requiring_cname_templates()),
+            self.__update_records(location_zone, zone_dn, existing)
         )
 
+    def get_records_diff(self, base_zone=None, location_zone=None):
+        """
+        Compare expected IPA DNS records with records stored in LDAP
+        :param base_zone: result of get_base_records, generated if None
+        :param location_zone: result of get_locations_records, generated if
+        None
+        :return: list of records which would be removed, prefixed with '-',
+        and records which would be added, prefixed with '+', by
+        update_dns_records
+        :raise IPADomainIsNotManagedByIPAError: if IPA domain is not managed by
+        IPA DNS
+        """
+        if base_zone is None:
+            base_zone = self.get_base_records()
+        if location_zone is None:
+            location_zone = self.get_locations_records()
+        zone_dn, existing = self.__get_existing_records(
+            list(base_zone.keys()) + list(location_zone.keys()))
+
+        changes = (
+            self.__get_changes(
+                base_zone, existing,
+                self.__get_names_requiring_cname_templates()) +
+            self.__get_changes(location_zone, existing)
+        )
+
+        diff = []
+        for record_name, node, entry, mods in sorted(
+                changes, key=lambda c: c[0]):
+            for rdataset in node:
+                rrtype = rdatatype.to_text(rdataset.rdtype)
+                attr = record_name_format % rrtype.lower()
+                if attr not in mods:
+                    continue
+                old_values = entry.get(attr, []) if entry is not None else []
+                old_rdata = {
+                    value: self.__value_to_rdata(rdataset.rdtype, value)
+                    for value in old_values
+                }
+                removed = [
+                    value for value, rd in old_rdata.items()
+                    if rd not in rdataset
+                ]
+                added = [
+                    unicode(rd.to_text()) for rd in rdataset
+                    if rd not in old_rdata.values()
+                ]
+                for prefix, values in (('-', removed), ('+', added)):
+                    for value in sorted(values):
+                        diff.append(u'{prefix} {name} {rrtype} {value}'.format(
+                            prefix=prefix, name=record_name.ToASCII(),
+                            rrtype=rrtype, value=value))
+        return diff
+
     def remove_location_records(self, location):
         """
         Remove all location records
@@ -0,0 +1,292 @@
+#
+# Copyright (C) 2020  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Manifest of backups, used by incremental backups
+
+The manifest records the state of the backed up files and a hash of each
+entry in the LDIF files of a backup. An incremental backup compares the
+current state with the manifest of the previous backup and stores only the
+files and entries which changed since, together with a list of deleted
+files and entries. Restore replays a chain of incremental backups onto the
+full backup they are based on.
+"""
+
+from __future__ import absolute_import
+
+import base64
+import collections
+import gzip
+import hashlib
+import json
+import logging
+import os
+import stat
+import tarfile
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json.gz'
+MANIFEST_VERSION = 1
+
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def new_manifest(base=None):
+    """
+    Create an empty manifest
+
+    :param base: name of the backup an incremental backup is based on
+    """
+    return {
+        'version': MANIFEST_VERSION,
+        'base': base,
+        'files': {},
+        'deleted_files': [],
+        'ldif': {},
+        'deleted_entries': {},
+    }
+
+
+def read_manifest(backup_dir):
+    """
+    Read manifest of a backup, return None if the backup has no manifest
+    """
+    filename = os.path.join(backup_dir, MANIFEST_NAME)
+    if not os.path.exists(filename):
+        return None
+    with gzip.open(filename, 'rb') as f:
+        manifest = json.loads(f.read().decode('utf-8'))
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(
+            "Unsupported version of backup manifest %s" % filename)
+    return manifest
+
+
+def write_manifest(backup_dir, manifest):
+    filename = os.path.join(backup_dir, MANIFEST_NAME)
+    with gzip.open(filename, 'wb') as f:
+        f.write(json.dumps(manifest, sort_keys=True).encode('utf-8'))
+
+
+def _file_state(path):
+    st = os.lstat(path)
+    state = {
+        'mode': st.st_mode,
+        'uid': st.st_uid,
+        'gid': st.st_gid,
+    }
+    if stat.S_ISREG(st.st_mode):
+        state['size'] = st.st_size
+        state['mtime'] = st.st_mtime_ns
+    elif stat.S_ISLNK(st.st_mode):
+        state['target'] = os.readlink(path)
+    return state
+
+
+def scan_files(paths, exclude=()):
+    """
+    Get the state of files and directories in paths, recursively
+
+    The content is not read, see hash_archive().
+
+    :returns: dict mapping path to its state
+    """
+    states = {}
+
+    def add(path):
+        try:
+            states[path] = _file_state(path)
+        except OSError as e:
+            # the file was removed in the meantime
+            logger.debug("Cannot read state of %s: %s", path, e)
+
+    for top in paths:
+        if top in exclude or not os.path.lexists(top):
+            continue
+        add(top)
+        if os.path.islink(top) or not os.path.isdir(top):
+            continue
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = [
+                d for d in dirnames if os.path.join(dirpath, d) not in exclude
+            ]
+            for name in dirnames + filenames:
+                add(os.path.join(dirpath, name))
+
+    return states
+
+
+def changed_files(states, previous):
+    """
+    Compare states of files with the manifest of the previous backup
+
+    The content hash is not compared, files which were touched are reported
+    as changed.
+
+    :returns: tuple of sorted lists of changed and deleted paths
+    """
+    changed = []
+    for path, state in states.items():
+        old = previous.get(path)
+        if old is None:
+            changed.append(path)
+            continue
+        old = {k: v for k, v in old.items() if k != 'sha256'}
+        if old != state:
+            changed.append(path)
+
+    deleted = [path for path in previous if path not in states]
+
+    return sorted(changed), sorted(deleted)
+
+
+def hash_archive(filename):
+    """
+    Compute SHA-256 of content of regular files in a tar archive
+
+    :returns: dict mapping absolute path to hex digest
+    """
+    hashes = {}
+    with tarfile.open(filename, 'r:*') as archive:
+        for member in archive:
+            if not member.isreg():
+                continue
+            digest = hashlib.sha256()
+            f = archive.extractfile(member)
+            for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+            name = member.name
+            if name.startswith('./'):
+                name = name[2:]
+            hashes['/' + name.lstrip('/')] = digest.hexdigest()
+    return hashes
+
+
+def _ldif_key(record):
+    """
+    Get the key of an LDIF record, the normalized DN, or None if the record
+    is not an entry
+    """
+    lines = record.split(b'\n')
+    # unfold the first logical line
+    first = lines[0]
+    for line in lines[1:]:
+        if not line.startswith(b' '):
+            break
+        first += line[1:]
+
+    if first.startswith(b'dn::'):
+        dn = base64.b64decode(first[4:].strip())
+    elif first.startswith(b'dn:'):
+        dn = first[3:].strip()
+    else:
+        return None
+    return dn.decode('utf-8').lower()
+
+
+def iter_ldif_records(f):
+    """
+    Split an LDIF file into records
+
+    :param f: LDIF file opened in binary mode
+    :returns: iterator of (key, record) tuples, key is None for records
+        which are not entries, like the version line
+    """
+    lines = []
+    for line in f:
+        if line.strip():
+            if not line.startswith(b'#'):
+                lines.append(line.rstrip(b'\r\n'))
+        elif lines:
+            record = b'\n'.join(lines) + b'\n'
+            yield _ldif_key(record), record
+            lines = []
+    if lines:
+        record = b'\n'.join(lines) + b'\n'
+        yield _ldif_key(record), record
+
+
+def _hash_record(record):
+    return hashlib.sha256(record).hexdigest()
+
+
+def ldif_entry_hashes(filename):
+    """
+    Get hash of each entry in an LDIF file
+
+    :returns: dict mapping normalized DN to hex digest of the entry
+    """
+    with open(filename, 'rb') as f:
+        return {
+            key: _hash_record(record)
+            for key, record in iter_ldif_records(f) if key is not None
+        }
+
+
+def reduce_ldif(filename, previous):
+    """
+    Rewrite an LDIF file to contain only entries which changed since the
+    previous backup
+
+    :param previous: entry hashes of the LDIF in the previous backup
+    :returns: tuple of entry hashes of the full LDIF and sorted list of
+        keys of deleted entries
+    """
+    hashes = {}
+    tmpname = filename + '.tmp'
+    with open(filename, 'rb') as f, open(tmpname, 'wb') as out:
+        for key, record in iter_ldif_records(f):
+            if key is None:
+                out.write(record + b'\n')
+                continue
+            digest = hashes[key] = _hash_record(record)
+            if previous.get(key) != digest:
+                out.write(record + b'\n')
+    os.rename(tmpname, filename)
+
+    deleted = sorted(key for key in previous if key not in hashes)
+    return hashes, deleted
+
+
+def merge_ldif(base, increments, output):
+    """
+    Replay changes of incremental backups onto the LDIF of a full backup
+
+    Changed entries replace the original entries at their position, so
+    parents stay before their children, new entries are appended.
+
+    :param base: LDIF file of the full backup, None if it has none
+    :param increments: list of (LDIF file or None, deleted keys) tuples of
+        incremental backups, from the oldest to the newest
+    :param output: merged LDIF file
+    """
+    changes = collections.OrderedDict()
+    deleted = set()
+    for filename, deleted_keys in increments:
+        for key in deleted_keys:
+            changes.pop(key, None)
+            deleted.add(key)
+        if filename is None:
+            continue
+        with open(filename, 'rb') as f:
+            for key, record in iter_ldif_records(f):
+                if key is None:
+                    continue
+                deleted.discard(key)
+                changes[key] = record
+
+    with open(output + '.tmp', 'wb') as out:
+        if base is not None:
+            with open(base, 'rb') as f:
+                for key, record in iter_ldif_records(f):
+                    if key is not None:
+                        if key in changes:
+                            record = changes.pop(key)
+                        elif key in deleted:
+                            continue
+                    out.write(record + b'\n')
+        for record in changes.values():
+            out.write(record + b'\n')
+    os.rename(output + '.tmp', output)
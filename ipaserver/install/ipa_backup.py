@@ -23,6 +23,8 @@ import logging
 import optparse  # pylint: disable=deprecated-module
 import os
 import shutil
+import stat
+import subprocess
 import sys
 import tempfile
 import time
@@ -38,7 +40,7 @@ from ipapython.ipautil import run, write_tmp_file
 from ipapython import admintool, certdb
 from ipapython.dn import DN
 from ipaserver.install.replication import wait_for_task
-from ipaserver.install import installutils
+from ipaserver.install import backup_manifest, installutils
 from ipapython import ipaldap
 from ipaplatform.constants import constants
 from ipaplatform.tasks import tasks
@@ -76,6 +78,125 @@ EOF
 """
 
 
+COMPRESSION_TYPES = ('gzip', 'zstd')
+
+
+def encrypt_command():
+    """
+    Get the command which encrypts its standard input to its standard output
+    """
+    return [
+        paths.GPG2,
+        '--batch',
+        '--default-recipient-self',
+        '--encrypt',
+    ]
+
+
+def compress_command(compression, level=None, threads=None):
+    """
+    Get the command which compresses its standard input or files given as
+    additional arguments to its standard output.
+
+    gzip compression uses pigz, which compresses in parallel, when it is
+    available. The output of both is the same format.
+
+    :param compression: one of COMPRESSION_TYPES
+    :param level: compression level, None for the default
+    :param threads: number of threads, None for one per CPU
+    """
+    if compression == 'gzip':
+        if os.path.exists(paths.PIGZ):
+            args = [paths.PIGZ, '-c']
+            if threads:
+                args.append('--processes=%d' % threads)
+        else:
+            args = [paths.GZIP, '-c']
+    elif compression == 'zstd':
+        args = [paths.ZSTD, '-c', '-q', '--threads=%d' % (threads or 0)]
+    else:
+        raise ValueError("unknown compression '%s'" % compression)
+
+    if level is not None:
+        args.append('-%d' % level)
+
+    return args
+
+
+def tar_compression_option(compression):
+    """
+    Get the tar option which (de)compresses an archive
+    """
+    if compression == 'gzip':
+        return '--gzip'
+    elif compression == 'zstd':
+        return '--use-compress-program=%s' % paths.ZSTD
+    else:
+        raise ValueError("unknown compression '%s'" % compression)
+
+
+def run_pipeline(commands, output):
+    """
+    Run commands with the standard output of each connected to the standard
+    input of the next one. The output of the last command is written to the
+    file `output`, which is removed when a command fails.
+
+    :raises ScriptError: when a command fails
+    """
+    processes = []
+    try:
+        with open(output, 'wb') as f:
+            stdin = None
+            try:
+                for i, args in enumerate(commands):
+                    logger.debug('Starting external process')
+                    logger.debug('args=%s', ' '.join(args))
+                    last = i == len(commands) - 1
+                    stderr = tempfile.TemporaryFile()
+                    try:
+                        p = subprocess.Popen(
+                            args, stdin=stdin,
+                            stdout=f if last else subprocess.PIPE,
+                            stderr=stderr, close_fds=True)
+                    except BaseException:
+                        stderr.close()
+                        raise
+                    processes.append((args, p, stderr))
+                    if stdin is not None:
+                        # let the previous process get SIGPIPE when this
+                        # one exits early
+                        stdin.close()
+                    stdin = p.stdout
+            finally:
+                if stdin is not None:
+                    stdin.close()
+                for _args, p, _stderr in processes:
+                    p.wait()
+
+        error = None
+        for args, p, stderr in processes:
+            name = os.path.basename(args[0])
+            stderr.seek(0)
+            error_log = stderr.read().decode('utf-8', 'replace')
+            logger.debug('Process %s finished, return code=%s',
+                         name, p.returncode)
+            if error_log:
+                logger.debug('stderr=%s', error_log)
+            if p.returncode != 0 and error is None:
+                error = admintool.ScriptError(
+                    '%s returned non-zero code %d: %s' %
+                    (name, p.returncode, error_log))
+        if error is not None:
+            raise error
+    except BaseException:
+        if os.path.exists(output):
+            os.unlink(output)
+        raise
+    finally:
+        for _args, _p, stderr in processes:
+            stderr.close()
+
+
 def encrypt_file(filename, remove_original=True):
     source = filename
     dest = filename + '.gpg'
@@ -247,6 +368,22 @@ class Backup(admintool.AdminTool):
             "--online", dest="online", action="store_true",
             default=False,
             help="Perform the LDAP backups online, for data only.")
+        parser.add_option(
+            "--incremental", dest="incremental", action="store_true",
+            default=False,
+            help="Back up only files and entries changed since the "
+                 "previous backup")
+        parser.add_option(
+            "--compression", dest="compression", type="choice",
+            choices=COMPRESSION_TYPES, default='gzip',
+            help="Compression of the backup: gzip (default) or zstd")
+        parser.add_option(
+            "--compression-level", dest="compression_level", type="int",
+            help="Compression level, 1-9 for gzip, 1-19 for zstd")
+        parser.add_option(
+            "--compression-threads", dest="compression_threads",
+            type="int",
+            help="Number of compression threads, one per CPU by default")
         parser.add_option(
             "--disable-role-check", dest="rolecheck", action="store_false",
             default=True,
@@ -283,6 +420,21 @@ class Backup(admintool.AdminTool):
             self.option_parser.error("You cannot specify --data "
                 "with --logs")
 
+        if options.compression == 'zstd' and not os.path.exists(paths.ZSTD):
+            self.option_parser.error(
+                "zstd compression requires %s" % paths.ZSTD)
+
+        max_level = 19 if options.compression == 'zstd' else 9
+        if (options.compression_level is not None and
+                not 1 <= options.compression_level <= max_level):
+            self.option_parser.error(
+                "--compression-level must be between 1 and %d" % max_level)
+
+        if (options.compression_threads is not None and
+                options.compression_threads < 1):
+            self.option_parser.error(
+                "--compression-threads must be at least 1")
+
     def run(self):
         options = self.options
         super(Backup, self).run()
@@ -304,6 +456,22 @@ class Backup(admintool.AdminTool):
 
         self.header = os.path.join(self.top_dir, 'header')
 
+        self.base = None
+        self.base_manifest = None
+        self.file_states = None
+        if options.incremental:
+            self.base = self.find_previous_backup(
+                options.data_only, options.logs)
+            if self.base is None:
+                raise admintool.ScriptError(
+                    "No previous backup with a manifest and the same --logs "
+                    "setting found in %s, a full backup is required first"
+                    % paths.IPA_BACKUP_DIR)
+            logger.info("Incremental backup based on %s", self.base)
+            self.base_manifest = backup_manifest.read_manifest(
+                os.path.join(paths.IPA_BACKUP_DIR, self.base))
+        self.manifest = backup_manifest.new_manifest(self.base)
+
         cwd = os.getcwd()
         try:
             dirsrv = services.knownservices.dirsrv
@@ -333,7 +501,10 @@ class Backup(admintool.AdminTool):
                                   (instance, 'ipaca')):
                     self.db2ldif(instance, 'ipaca', online=options.online)
                 self.db2ldif(instance, 'userRoot', online=options.online)
-                self.db2bak(instance, online=options.online)
+                # restore always imports the LDIF, an incremental backup
+                # does not need the binary backup
+                if not options.incremental:
+                    self.db2bak(instance, online=options.online)
             if not options.data_only:
                 # create backup of auth configuration
                 auth_backup_path = os.path.join(paths.VAR_LIB_IPA, 'auth_backup')
@@ -348,8 +519,9 @@ class Backup(admintool.AdminTool):
                 logger.info('Starting IPA service')
                 run([paths.IPACTL, 'start'])
 
-            # Compress after services are restarted to minimize
-            # the unavailability window
+            # Create the manifest and compress after services are restarted
+            # to minimize the unavailability window
+            self.create_manifest()
             if not options.data_only:
                 self.compress_file_backup()
 
@@ -393,22 +565,17 @@ class Backup(admintool.AdminTool):
 
         for role in role_names:
             search_filter = '(cn=%s)' % role
-            try:
-                masters = dict()
-                result = self._conn.get_entries(
-                    search_base,
-                    filter=search_filter,
-                    attrs_list=attrs_list,
-                    scope=self._conn.SCOPE_SUBTREE
-                )
-                masters[role] = {e.dn[1]['cn'] for e in result}
-
-                if api.env.host in masters[role]:
-                    locally_installed_roles.add(role)
-                if masters[role] is not None:
-                    globally_used_roles.add(role)
-            except errors.EmptyResult:
-                pass
+            masters = {
+                e.dn[1]['cn'] for e in self._conn.iter_entries(
+                    search_filter, attrs_list, search_base,
+                    self._conn.SCOPE_SUBTREE)
+            }
+            if not masters:
+                continue
+
+            if api.env.host in masters:
+                locally_installed_roles.add(role)
+            globally_used_roles.add(role)
 
         if locally_installed_roles == globally_used_roles:
             logger.info(
@@ -627,6 +794,16 @@ class Backup(admintool.AdminTool):
 
         self.tarfile = os.path.join(self.dir, 'files.tar')
 
+        backup_paths = verify_directories(self.dirs + self.files)
+        if options.logs:
+            backup_paths.extend(verify_directories(self.logs))
+        self.file_states = backup_manifest.scan_files(
+            backup_paths, exclude=(paths.IPA_BACKUP_DIR,))
+
+        if self.base_manifest is not None:
+            self.incremental_file_backup()
+            return
+
         logger.info("Backing up files")
         args = ['tar',
                 '--exclude=%s' % paths.IPA_BACKUP_DIR,
@@ -670,20 +847,117 @@ class Backup(admintool.AdminTool):
                     'when adding directory structure: %s' %
                     (result.returncode, result.error_log))
 
+    def incremental_file_backup(self):
+        changed, deleted = backup_manifest.changed_files(
+            self.file_states, self.base_manifest['files'])
+        self.manifest['deleted_files'] = deleted
+
+        logger.info("Backing up %d changed files", len(changed))
+        filelist = os.path.join(self.top_dir, 'files.list')
+        with open(filelist, 'wb') as f:
+            for path in changed:
+                f.write(os.fsencode(path) + b'\0')
+
+        # the list contains the changed directories too, tar must not
+        # add their whole content
+        args = ['tar',
+                '--xattrs',
+                '--selinux',
+                '--no-recursion',
+                '--null',
+                '-T', filelist,
+                '-cf',
+                self.tarfile,
+               ]
+        result = run(args, raiseonerr=False)
+        if result.returncode != 0:
+            raise admintool.ScriptError('tar returned non-zero code %d: %s' %
+                                        (result.returncode, result.error_log))
+
+    def find_previous_backup(self, data_only, logs=False):
+        '''
+        Find the most recent backup of the same type with a manifest, which
+        an incremental backup can be based on.
+
+        The backup must also include the log files if and only if *logs* is
+        set, otherwise files which are only in one of the backups would be
+        deleted on restore.
+        '''
+        backup_type = 'DATA' if data_only else 'FULL'
+        latest = None
+        if not os.path.isdir(paths.IPA_BACKUP_DIR):
+            return None
+        for name in os.listdir(paths.IPA_BACKUP_DIR):
+            backup_dir = os.path.join(paths.IPA_BACKUP_DIR, name)
+            header = os.path.join(backup_dir, 'header')
+            manifest = os.path.join(backup_dir, backup_manifest.MANIFEST_NAME)
+            if not os.path.exists(header) or not os.path.exists(manifest):
+                continue
+            config = SafeConfigParser()
+            config.read(header)
+            if (not config.has_option('ipa', 'time') or
+                    not config.has_option('ipa', 'logs') or
+                    config.get('ipa', 'type') != backup_type or
+                    config.get('ipa', 'host') != api.env.host or
+                    config.getboolean('ipa', 'logs') != bool(logs)):
+                continue
+            backup_time = config.get('ipa', 'time')
+            if latest is None or backup_time > latest[0]:
+                latest = (backup_time, name)
+
+        return latest[1] if latest is not None else None
+
+    def create_manifest(self):
+        '''
+        Record the state of the backed up files and entries. For an
+        incremental backup, drop the entries which did not change since the
+        previous backup from the LDIF files.
+        '''
+        previous = self.base_manifest or backup_manifest.new_manifest()
+
+        if self.file_states is not None:
+            hashes = backup_manifest.hash_archive(self.tarfile)
+            files = self.manifest['files']
+            for path, state in self.file_states.items():
+                if stat.S_ISREG(state['mode']):
+                    # unchanged files are not in the archive
+                    digest = hashes.get(path)
+                    if digest is None:
+                        digest = previous['files'].get(path, {}).get('sha256')
+                    state = dict(state, sha256=digest)
+                files[path] = state
+
+        for name in sorted(os.listdir(self.dir)):
+            if not name.endswith('.ldif'):
+                continue
+            filename = os.path.join(self.dir, name)
+            if self.base_manifest is None:
+                hashes = backup_manifest.ldif_entry_hashes(filename)
+            else:
+                hashes, deleted = backup_manifest.reduce_ldif(
+                    filename, previous['ldif'].get(name, {}))
+                self.manifest['deleted_entries'][name] = deleted
+                logger.info("%s: %d entries deleted since %s",
+                            name, len(deleted), self.base)
+            self.manifest['ldif'][name] = hashes
+
+    def compress_command(self):
+        return compress_command(self.options.compression,
+                                self.options.compression_level,
+                                self.options.compression_threads)
+
     def compress_file_backup(self):
 
         # Compress the archive. This is done separately, since 'tar' cannot
         # append to a compressed archive.
         if self.tarfile:
-            result = run([paths.GZIP, self.tarfile], raiseonerr=False)
-            if result.returncode != 0:
-                raise admintool.ScriptError(
-                    'gzip returned non-zero code %d '
-                    'when compressing the backup: %s' %
-                    (result.returncode, result.error_log))
+            compressed = self.tarfile + '.compressed'
+            run_pipeline([self.compress_command() + [self.tarfile]],
+                         compressed)
+            os.unlink(self.tarfile)
 
             # Rename the archive back to files.tar to preserve compatibility
-            os.rename(os.path.join(self.dir, 'files.tar.gz'), self.tarfile)
+            os.rename(compressed, self.tarfile)
 
     def create_header(self, data_only):
         '''
@@ -702,21 +976,26 @@ class Backup(admintool.AdminTool):
         config.set('ipa', 'host', api.env.host)
         config.set('ipa', 'ipa_version', str(version.VERSION))
         config.set('ipa', 'version', '1')
+        config.set('ipa', 'compression', self.options.compression)
+        config.set('ipa', 'logs', str(bool(self.options.logs)))
+        if self.base is not None:
+            config.set('ipa', 'base', self.base)
 
         dn = DN(('cn', api.env.host), api.env.container_masters,
                 api.env.basedn)
         services_cns = []
         try:
             conn = self.get_connection()
-            services = conn.get_entries(dn, conn.SCOPE_ONELEVEL)
+            services_cns = [
+                s.single_value['cn'] for s in conn.iter_entries(
+                    None, ['cn'], dn, conn.SCOPE_ONELEVEL)
+            ]
         except errors.NetworkError:
             logger.critical(
               "Unable to obtain list of master services, continuing anyway")
         except Exception as e:
             logger.error("Failed to read services from '%s': %s",
                          conn.ldap_uri, e)
-        else:
-            services_cns = [s.single_value['cn'] for s in services]
 
         config.set('ipa', 'services', ','.join(services_cns))
         with open(self.header, 'w') as fd:
@@ -732,19 +1011,22 @@ class Backup(admintool.AdminTool):
         the db2bak output and an LDIF.
 
         These, along with the header, are moved into a new subdirectory
-        in paths.IPA_BACKUP_DIR (/var/lib/ipa/backup).
+        in paths.IPA_BACKUP_DIR (/var/lib/ipa/backup). The archive is
+        compressed and encrypted in a single pipeline, so it is written
+        only once.
         '''
 
+        incr = '-incr' if self.base is not None else ''
         if data_only:
             backup_dir = os.path.join(
                 paths.IPA_BACKUP_DIR,
-                time.strftime('ipa-data-%Y-%m-%d-%H-%M-%S')
+                time.strftime('ipa-data%s-%%Y-%%m-%%d-%%H-%%M-%%S' % incr)
             )
             filename = os.path.join(backup_dir, "ipa-data.tar")
         else:
             backup_dir = os.path.join(
                 paths.IPA_BACKUP_DIR,
-                time.strftime('ipa-full-%Y-%m-%d-%H-%M-%S')
+                time.strftime('ipa-full%s-%%Y-%%m-%%d-%%H-%%M-%%S' % incr)
             )
             filename = os.path.join(backup_dir, "ipa-full.tar")
 
@@ -760,20 +1042,18 @@ class Backup(admintool.AdminTool):
             )
 
         os.chdir(self.dir)
-        args = [
-            'tar', '--xattrs', '--selinux', '-czf', filename, '.'
+        commands = [
+            ['tar', '--xattrs', '--selinux', '-cf', '-', '.'],
+            self.compress_command(),
         ]
-        result = run(args, raiseonerr=False)
-        if result.returncode != 0:
-            raise admintool.ScriptError(
-                'tar returned non-zero code %s: %s' %
-                (result.returncode, result.error_log)
-            )
         if encrypt:
+            filename += '.gpg'
             logger.info('Encrypting %s', filename)
-            filename = encrypt_file(filename)
+            commands.append(encrypt_command())
+        run_pipeline(commands, filename)
         try:
             shutil.move(self.header, backup_dir)
+            backup_manifest.write_manifest(backup_dir, self.manifest)
         except (IOError, OSError) as e:
             raise admintool.ScriptError(
                 'Could not create or move data to backup directory %s: %s' %
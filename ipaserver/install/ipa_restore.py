@@ -41,7 +41,8 @@ from ipapython import admintool, certdb
 from ipapython.dn import DN
 from ipaserver.install.replication import (wait_for_task, ReplicationManager,
                                            get_cs_replication_manager)
-from ipaserver.install import installutils
+from ipaserver.install import backup_manifest, installutils
+from ipaserver.install.ipa_backup import tar_compression_option
 from ipaserver.install import dsinstance, httpinstance, cainstance, krbinstance
 from ipaserver.masters import get_masters
 from ipapython import ipaldap
@@ -252,7 +253,8 @@ class Restore(admintool.AdminTool):
 
         try:
             self.read_header()
-        except IOError as e:
+            self.read_backup_chain()
+        except (IOError, ValueError) as e:
             raise admintool.ScriptError("Cannot read backup metadata: %s" % e)
 
         if options.data_only:
@@ -718,18 +720,21 @@ class Restore(admintool.AdminTool):
         '''
         cwd = os.getcwd()
         os.chdir(self.dir)
-        args = ['tar',
-                '--xattrs',
-                '--selinux',
-                '-xzf',
-                os.path.join(self.dir, 'files.tar'),
-                paths.IPA_DEFAULT_CONF[1:],
-               ]
+        for archive_dir, compression, manifest in self.file_archives():
+            args = ['tar',
+                    '--xattrs',
+                    '--selinux',
+                    tar_compression_option(compression),
+                    '-xf',
+                    os.path.join(archive_dir, 'files.tar'),
+                    paths.IPA_DEFAULT_CONF[1:],
+                   ]
 
-        result = run(args, raiseonerr=False)
-        if result.returncode != 0:
-            logger.critical('Restoring %s failed: %s',
-                            paths.IPA_DEFAULT_CONF, result.error_log)
+            result = run(args, raiseonerr=False)
+            # incremental backups contain only changed files
+            if result.returncode != 0 and manifest is None:
+                logger.critical('Restoring %s failed: %s',
+                                paths.IPA_DEFAULT_CONF, result.error_log)
         os.chdir(cwd)
 
     def remove_old_files(self):
@@ -772,22 +777,44 @@ class Restore(admintool.AdminTool):
         logger.info("Restoring files")
         cwd = os.getcwd()
         os.chdir('/')
-        args = ['tar',
-                '--xattrs',
-                '--selinux',
-                '-xzf',
-                os.path.join(self.dir, 'files.tar')
-               ]
-        if nologs:
-            args.append('--exclude')
-            args.append('var/log')
+        for archive_dir, compression, manifest in self.file_archives():
+            args = ['tar',
+                    '--xattrs',
+                    '--selinux',
+                    tar_compression_option(compression),
+                    '-xf',
+                    os.path.join(archive_dir, 'files.tar')
+                   ]
+            if nologs:
+                args.append('--exclude')
+                args.append('var/log')
+
+            result = run(args, raiseonerr=False)
+            if result.returncode != 0:
+                logger.critical('Restoring files failed: %s',
+                                result.error_log)
 
-        result = run(args, raiseonerr=False)
-        if result.returncode != 0:
-            logger.critical('Restoring files failed: %s', result.error_log)
+            if manifest is not None:
+                self.remove_deleted_files(manifest, nologs)
 
         os.chdir(cwd)
 
+    def remove_deleted_files(self, manifest, nologs=False):
+        '''
+        Remove files which were deleted before an incremental backup.
+        '''
+        # the paths are sorted, remove children before their parents
+        for path in reversed(manifest['deleted_files']):
+            if nologs and path.startswith('/var/log/'):
+                continue
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                elif os.path.lexists(path):
+                    os.unlink(path)
+            except OSError as e:
+                logger.warning("Could not remove %s: %s", path, e)
+
 
     def read_header(self):
         '''
@@ -807,48 +834,155 @@ class Restore(admintool.AdminTool):
         # method
         self.backup_services = config.get('ipa', 'services').split(',')
         # pylint: enable=no-member
+        self.backup_compression = self._get_compression(config)
+        if config.has_option('ipa', 'base'):
+            self.backup_base = config.get('ipa', 'base')
+        else:
+            self.backup_base = None
 
-    def extract_backup(self):
+    def _get_compression(self, config):
+        # backups of older versions are always compressed with gzip
+        if config.has_option('ipa', 'compression'):
+            return config.get('ipa', 'compression')
+        else:
+            return 'gzip'
+
+    def read_backup_chain(self):
         '''
-        Extract the contents of the tarball backup into a temporary location,
-        decrypting if necessary.
+        Find the backups an incremental backup is based on.
+
+        The chain starts with a full backup, the incremental backups are
+        replayed onto it from the oldest to the newest.
+        '''
+        self.base_backup_dir = self.backup_dir
+        self.base_compression = self.backup_compression
+        self.increments = []
+
+        base = self.backup_base
+        while base is not None:
+            manifest = backup_manifest.read_manifest(self.base_backup_dir)
+            if manifest is None:
+                raise admintool.ScriptError(
+                    "Manifest of incremental backup %s is missing" %
+                    self.base_backup_dir)
+            self.increments.insert(
+                0, (self.base_backup_dir, self.base_compression, manifest))
+
+            self.base_backup_dir = os.path.join(
+                os.path.dirname(self.base_backup_dir), base)
+            config = SafeConfigParser()
+            if not config.read(os.path.join(self.base_backup_dir, 'header')):
+                raise admintool.ScriptError(
+                    "Cannot read base backup %s" % self.base_backup_dir)
+            if config.get('ipa', 'type') != self.backup_type:
+                raise admintool.ScriptError(
+                    "Base backup %s is not a %s backup" %
+                    (self.base_backup_dir, self.backup_type))
+            self.base_compression = self._get_compression(config)
+            if config.has_option('ipa', 'base'):
+                base = config.get('ipa', 'base')
+            else:
+                base = None
+
+        if self.increments:
+            logger.info("Restoring %s and %d incremental backups",
+                        self.base_backup_dir, len(self.increments))
+
+    def _increment_dir(self, index):
+        return os.path.join(self.top_dir, 'increment-%d' % index)
+
+    def file_archives(self):
         '''
+        Get the directories with the file archives to restore in order, with
+        their compression and the manifest of incremental backups.
+        '''
+        archives = [(self.dir, self.base_compression, None)]
+        for i, (_backup_dir, compression, manifest) in enumerate(
+                self.increments):
+            archives.append((self._increment_dir(i), compression, manifest))
+        return archives
 
+    def _extract_archive(self, backup_dir, compression, target_dir):
         encrypt = False
         filename = None
         if self.backup_type == 'FULL':
-            filename = os.path.join(self.backup_dir, 'ipa-full.tar')
+            filename = os.path.join(backup_dir, 'ipa-full.tar')
         else:
-            filename = os.path.join(self.backup_dir, 'ipa-data.tar')
+            filename = os.path.join(backup_dir, 'ipa-data.tar')
         if not os.path.exists(filename):
             if not os.path.exists(filename + '.gpg'):
-                raise admintool.ScriptError('Unable to find backup file in %s' % self.backup_dir)
+                raise admintool.ScriptError('Unable to find backup file in %s' % backup_dir)
             else:
                 filename = filename + '.gpg'
                 encrypt = True
 
         if encrypt:
             logger.info('Decrypting %s', filename)
-            filename = decrypt_file(self.dir, filename)
+            filename = decrypt_file(target_dir, filename)
 
-        os.chdir(self.dir)
+        os.chdir(target_dir)
 
         args = ['tar',
                 '--xattrs',
                 '--selinux',
-                '-xzf',
+                tar_compression_option(compression),
+                '-xf',
                 filename,
                 '.'
                ]
         run(args)
 
+        if encrypt:
+            # We can remove the decoded tarball
+            os.unlink(filename)
+
+    def extract_backup(self):
+        '''
+        Extract the contents of the tarball backup into a temporary location,
+        decrypting if necessary.
+
+        The LDIF files of incremental backups are merged into the LDIF files
+        of the full backup they are based on.
+        '''
+        self._extract_archive(self.base_backup_dir, self.base_compression,
+                              self.dir)
+
+        for i, (backup_dir, compression, _manifest) in enumerate(
+                self.increments):
+            os.mkdir(self._increment_dir(i), 0o700)
+            self._extract_archive(backup_dir, compression,
+                                  self._increment_dir(i))
+        if self.increments:
+            self.merge_increments()
+
         pent = pwd.getpwnam(constants.DS_USER)
         os.chown(self.top_dir, pent.pw_uid, pent.pw_gid)
         recursive_chown(self.dir, pent.pw_uid, pent.pw_gid)
 
-        if encrypt:
-            # We can remove the decoded tarball
-            os.unlink(filename)
+    def merge_increments(self):
+        '''
+        Replay the entries of incremental backups onto the LDIF files of the
+        full backup.
+        '''
+        names = {n for n in os.listdir(self.dir) if n.endswith('.ldif')}
+        names.update(self.increments[-1][2]['ldif'])
+
+        for name in sorted(names):
+            increments = []
+            for i, (_backup_dir, _compression, manifest) in enumerate(
+                    self.increments):
+                filename = os.path.join(self._increment_dir(i), name)
+                if not os.path.exists(filename):
+                    filename = None
+                increments.append(
+                    (filename, manifest['deleted_entries'].get(name, [])))
+
+            logger.info('Replaying %d incremental backups onto %s',
+                        len(increments), name)
+            ldiffile = os.path.join(self.dir, name)
+            backup_manifest.merge_ldif(
+                ldiffile if os.path.exists(ldiffile) else None,
+                increments, ldiffile)
 
     def __create_dogtag_log_dirs(self):
         """
@@ -39,7 +39,8 @@ from ipalib import api, errors, x509
 from ipaplatform import services
 from ipaplatform.paths import paths
 from ipaserver.masters import (
-    CONFIGURED_SERVICE, ENABLED_SERVICE, HIDDEN_SERVICE, SERVICE_LIST
+    CONFIGURED_SERVICE, ENABLED_SERVICE, HIDDEN_SERVICE, SERVICE_LIST,
+    invalidate_masters_view
 )
 from ipaserver.servroles import HIDDEN
 
@@ -277,6 +278,7 @@ def _set_services_state(fqdn, dest_state):
             logger.debug(
                 "Set service %s for %s to %s", name, fqdn, dest_state
             )
+    invalidate_masters_view()
 
 
 class Service:
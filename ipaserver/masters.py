@@ -9,10 +9,14 @@ from __future__ import absolute_import
 import collections
 import logging
 import random
+import threading
+import time
 
 from ipapython.dn import DN
+from ipapython.ipautil import CIDict
 from ipalib import api
 from ipalib import errors
+from ipalib.request import context
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +53,160 @@ SERVICES = [
 SERVICE_LIST = {s.service_entry: s for s in SERVICES}
 
 
+class MasterEntry(CIDict):
+    """Copy of an entry in cn=masters kept by MastersView
+
+    Attribute values are tuples, the entry must not be modified.
+    """
+
+    def __init__(self, entry):
+        super(MasterEntry, self).__init__(
+            {name: tuple(entry[name]) for name in MastersView.ATTRS
+             if name in entry})
+        self.dn = entry.dn
+
+
+class MastersView:
+    """Snapshot of cn=masters,cn=ipa,cn=etc
+
+    The whole subtree, the masters and their service entries, is read in
+    a single search. Matching follows LDAP rules, names, object classes and
+    ipaConfigString values are compared case-insensitively.
+    """
+    ATTRS = ('cn', 'objectClass', 'ipaConfigString')
+
+    def __init__(self, conn, api=api):
+        self.timestamp = time.time()
+        self.base_dn = DN(api.env.container_masters, api.env.basedn)
+        self.masters = []
+        self.services = []
+
+        try:
+            entries = conn.get_entries(
+                self.base_dn, conn.SCOPE_SUBTREE, None, list(self.ATTRS),
+                size_limit=-1, time_limit=-1)
+        except errors.NotFound:
+            entries = []
+
+        for entry in entries:
+            depth = len(entry.dn) - len(self.base_dn)
+            if depth == 1:
+                self.masters.append(MasterEntry(entry))
+            elif depth == 2:
+                self.services.append(MasterEntry(entry))
+
+    @staticmethod
+    def _match(entry, attr, values):
+        if values is None:
+            return True
+        return any(v.lower() in values for v in entry.get(attr, ()))
+
+    @staticmethod
+    def _lower(values):
+        if values is None:
+            return None
+        if isinstance(values, str):
+            values = [values]
+        return {v.lower() for v in values}
+
+    def get_masters(self, objectclass=None):
+        """Get master entries
+
+        :param objectclass: only masters with the object class
+        """
+        objectclasses = self._lower(objectclass)
+        return [
+            e for e in self.masters
+            if self._match(e, 'objectClass', objectclasses)
+        ]
+
+    def get_services(self, names=None, server=None, objectclass=None,
+                     config_strings=None):
+        """Get service entries
+
+        :param names: only services with one of the names
+        :param server: only services of the server
+        :param objectclass: only services with the object class
+        :param config_strings: only services with one of the ipaConfigString
+            values
+        """
+        names = self._lower(names)
+        objectclasses = self._lower(objectclass)
+        config_strings = self._lower(config_strings)
+        if server is not None:
+            server = server.lower()
+        return [
+            e for e in self.services
+            if (server is None or e.dn[1].value.lower() == server) and
+            self._match(e, 'cn', names) and
+            self._match(e, 'objectClass', objectclasses) and
+            self._match(e, 'ipaConfigString', config_strings)
+        ]
+
+
+_masters_views = {}
+_masters_views_lock = threading.Lock()
+
+
+def get_masters_view(conn=None, api=api):
+    """Return a snapshot of cn=masters
+
+    In the server, the snapshot is shared within the current request and,
+    if masters_cache_ttl is set, also by subsequent requests of the same
+    principal until it expires. The ACIs of cn=masters give principals
+    different views, e.g. only some can read hidden services. Code which modifies cn=masters has to call
+    invalidate_masters_view(). Other programs, e.g. installers, always get
+    a fresh snapshot.
+
+    :param conn: a connection to the LDAP server
+    :param api: ipalib.API instance
+    :return: MastersView instance
+    """
+    if conn is None:
+        conn = api.Backend.ldap2
+
+    if api.env.context not in ('server', 'lite'):
+        return MastersView(conn, api)
+
+    key = (getattr(context, 'principal', None),
+           str(DN(api.env.container_masters, api.env.basedn)))
+    views = getattr(context, 'masters_views', None)
+    if views is None:
+        views = context.masters_views = {}
+    view = views.get(key)
+    if view is not None:
+        return view
+
+    ttl = api.env.masters_cache_ttl
+    if ttl > 0:
+        with _masters_views_lock:
+            view = _masters_views.get(key)
+        if view is not None and time.time() - view.timestamp > ttl:
+            view = None
+
+    if view is None:
+        view = MastersView(conn, api)
+        if ttl > 0:
+            with _masters_views_lock:
+                for old_key, old_view in list(_masters_views.items()):
+                    if view.timestamp - old_view.timestamp > ttl:
+                        del _masters_views[old_key]
+                _masters_views[key] = view
+
+    views[key] = view
+    return view
+
+
+def invalidate_masters_view():
+    """Drop snapshots of cn=masters after it was modified
+    """
+    with _masters_views_lock:
+        _masters_views.clear()
+    views = getattr(context, 'masters_views', None)
+    if views is not None:
+        views.clear()
+
+
 def find_providing_servers(svcname, conn=None, preferred_hosts=(), api=api):
     """Find servers that provide the given service.
 
@@ -64,39 +222,13 @@ def find_providing_servers(svcname, conn=None, preferred_hosts=(), api=api):
     assert isinstance(preferred_hosts, (tuple, list))
     if svcname not in SERVICE_LIST:
         raise ValueError("Unknown service '{}'.".format(svcname))
-    if conn is None:
-        conn = api.Backend.ldap2
 
-    dn = DN(api.env.container_masters, api.env.basedn)
-
-    query_filter = conn.combine_filters(
-        [
-            conn.make_filter(
-                {
-                    'objectClass': 'ipaConfigObject',
-                    'cn': svcname
-                },
-                rules=conn.MATCH_ALL,
-            ),
-            conn.make_filter(
-                {
-                    'ipaConfigString': [ENABLED_SERVICE, HIDDEN_SERVICE]
-                },
-                rules=conn.MATCH_ANY
-            ),
-        ],
-        rules=conn.MATCH_ALL
+    entries = get_masters_view(conn, api).get_services(
+        svcname,
+        objectclass='ipaConfigObject',
+        config_strings=[ENABLED_SERVICE, HIDDEN_SERVICE],
     )
 
-    try:
-        entries, _trunc = conn.find_entries(
-            filter=query_filter,
-            attrs_list=['ipaConfigString'],
-            base_dn=dn
-        )
-    except errors.NotFound:
-        return []
-
     # DNS is case insensitive
     preferred_hosts = list(host_name.lower() for host_name in preferred_hosts)
     servers = []
@@ -153,11 +285,9 @@ def get_masters(conn=None, api=api):
     :param api: ipalib.API instance
     :return: list of hostnames
     """
-    if conn is None:
-        conn = api.Backend.ldap2
-
-    dn = DN(api.env.container_masters, api.env.basedn)
-    entries = conn.get_entries(dn, conn.SCOPE_ONELEVEL, None, ['cn'])
+    entries = get_masters_view(conn, api).get_masters()
+    if not entries:
+        raise errors.EmptyResult(reason='no matching entry found')
     return list(e['cn'][0] for e in entries)
 
 
@@ -174,24 +304,6 @@ def is_service_enabled(svcname, conn=None, api=api):
     """
     if svcname not in SERVICE_LIST:
         raise ValueError("Unknown service '{}'.".format(svcname))
-    if conn is None:
-        conn = api.Backend.ldap2
 
-    dn = DN(api.env.container_masters, api.env.basedn)
-    query_filter = conn.make_filter(
-        {
-            'objectClass': 'ipaConfigObject',
-            'cn': svcname
-        },
-        rules='&'
-    )
-    try:
-        conn.find_entries(
-            filter=query_filter,
-            attrs_list=[],
-            base_dn=dn
-        )
-    except errors.NotFound:
-        return False
-    else:
-        return True
+    return bool(get_masters_view(conn, api).get_services(
+        svcname, objectclass='ipaConfigObject'))
@@ -21,6 +21,7 @@ Base classes for LDAP plugins.
 """
 
 import re
+import threading
 import time
 from copy import deepcopy
 import base64
@@ -33,6 +34,7 @@ from ipalib import Flag, Int, Str
 from ipalib.cli import to_cli
 from ipalib import output
 from ipalib.text import _
+from ipalib.request import context
 from ipalib.util import json_serialize, validate_hostname
 from ipalib.capabilities import client_has_capability
 from ipalib.messages import add_message, SearchResultTruncated
@@ -506,6 +508,151 @@ def host_is_master(ldap, fqdn):
         return
 
 
+class MembershipGraph:
+    """
+    Group membership graph built with a few searches.
+
+    Answers indirect member and memberof questions for any number of
+    entries without further LDAP searches. Without *entries* the graph
+    covers every group of the subtree, otherwise only the groups nested in
+    the entries and the groups the entries are direct members of. Raw DN
+    values are matched by their normalized DN.
+    """
+
+    member_attrs = ('member', 'memberuser', 'memberhost')
+    # maximum number of DNs in a single search filter
+    filter_size = 100
+
+    def __init__(self, ldap, base_dn, entries=None):
+        # group -> raw values of its member attribute
+        self.members = {}
+        # group -> groups which are its direct members
+        self.children = {}
+        # entry -> groups it is a direct member of
+        self.parents = {}
+        self.timestamp = time.time()
+
+        if entries is None:
+            search_filter = ldap.combine_filters(
+                ['(%s=*)' % attr for attr in self.member_attrs],
+                ldap.MATCH_ANY)
+            self._search_groups(ldap, search_filter, base_dn)
+        else:
+            groups = [
+                entry for entry in entries
+                if any(entry.raw.get(attr) for attr in self.member_attrs)
+            ]
+            self._add_groups(groups)
+            # groups nested in the groups found
+            for dns in self._split([entry.dn for entry in groups]):
+                search_filter = ldap.combine_filters(
+                    ('(member=*)', ldap.make_filter({'memberof': dns})),
+                    ldap.MATCH_ALL)
+                self._search_groups(ldap, search_filter, base_dn)
+            # groups the entries found are direct members of
+            member_dns = [
+                entry.dn for entry in entries if entry.raw.get('memberof')]
+            for dns in self._split(member_dns):
+                search_filter = ldap.make_filter(
+                    {attr: dns for attr in self.member_attrs})
+                self._search_groups(ldap, search_filter, base_dn)
+
+        for group in self.members:
+            for parent in self.parents.get(group, ()):
+                self.children.setdefault(parent, set()).add(group)
+
+    def _split(self, dns):
+        for i in range(0, len(dns), self.filter_size):
+            yield dns[i:i + self.filter_size]
+
+    def _search_groups(self, ldap, search_filter, base_dn):
+        self._add_groups(ldap.iter_entries(
+            search_filter, list(self.member_attrs), base_dn,
+            size_limit=-1))  # paged search will get everything anyway
+
+    def _add_groups(self, entries):
+        for entry in entries:
+            group = DN(entry.dn)
+            self.members[group] = entry.raw.get('member', [])
+            for attr in self.member_attrs:
+                for value in entry.raw.get(attr, []):
+                    self.parents.setdefault(
+                        self._get_dn(value), set()).add(group)
+
+    @staticmethod
+    def _get_dn(value):
+        return DN(value.decode('utf-8'))
+
+    def get_memberindirect(self, dn):
+        """
+        Return raw values of indirect members of the group *dn*.
+        """
+        group = DN(dn)
+        direct = {
+            self._get_dn(value) for value in self.members.get(group, [])}
+
+        indirect = {}
+        seen = {group}
+        stack = list(self.children.get(group, ()))
+        while stack:
+            subgroup = stack.pop()
+            if subgroup in seen:
+                continue
+            seen.add(subgroup)
+            for value in self.members.get(subgroup, []):
+                key = self._get_dn(value)
+                if key not in direct:
+                    indirect.setdefault(key, value)
+            stack.extend(self.children.get(subgroup, ()))
+
+        return list(indirect.values())
+
+    def get_direct_memberof(self, dn):
+        """
+        Return DNs of groups *dn* is a direct member of.
+        """
+        return self.parents.get(DN(dn), set())
+
+
+_membership_graphs = {}
+_membership_graphs_lock = threading.Lock()
+
+
+def get_membership_graph(ldap, base_dn):
+    """
+    Return a membership graph of base_dn, shared within the current request.
+
+    If membership_graph_ttl is set, the graph is also reused by subsequent
+    requests of the same principal until it expires.
+    """
+    key = (getattr(context, 'principal', None), str(base_dn))
+    graphs = getattr(context, 'membership_graphs', None)
+    if graphs is None:
+        graphs = context.membership_graphs = {}
+    graph = graphs.get(key)
+    if graph is not None:
+        return graph
+
+    ttl = api.env.membership_graph_ttl
+    if ttl > 0:
+        with _membership_graphs_lock:
+            graph = _membership_graphs.get(key)
+        if graph is not None and time.time() - graph.timestamp > ttl:
+            graph = None
+
+    if graph is None:
+        graph = MembershipGraph(ldap, base_dn)
+        if ttl > 0:
+            with _membership_graphs_lock:
+                for old_key, old_graph in list(_membership_graphs.items()):
+                    if graph.timestamp - old_graph.timestamp > ttl:
+                        del _membership_graphs[old_key]
+                _membership_graphs[key] = graph
+
+    graphs[key] = graph
+    return graph
+
+
 def add_missing_object_class(ldap, objectclass, dn, entry_attrs=None, update=True):
     """
     Add object class if missing into entry. Fetches entry if not passed. Updates
@@ -680,29 +827,39 @@ class LDAPObject(Object):
                         new_attr.append(new_value)
                         break
 
-    def get_indirect_members(self, entry_attrs, attrs_list):
+    def get_indirect_members(self, entry_attrs, attrs_list, graph=None):
         if 'memberindirect' in attrs_list:
-            self.get_memberindirect(entry_attrs)
+            self.get_memberindirect(entry_attrs, graph)
         if 'memberofindirect' in attrs_list:
-            self.get_memberofindirect(entry_attrs)
+            self.get_memberofindirect(entry_attrs, graph)
+
+    def get_membership_graph(self, entries=None):
+        """
+        Get the group membership graph for *entries*.
+
+        If membership_graph_ttl is set or *entries* is None, the graph of the
+        whole tree is shared within the request (and across requests).
+        """
+        if entries is not None and self.api.env.membership_graph_ttl <= 0:
+            return MembershipGraph(self.backend, self.api.env.basedn, entries)
+        return get_membership_graph(self.backend, self.api.env.basedn)
 
-    def get_memberindirect(self, group_entry):
+    def get_memberindirect(self, group_entry, graph=None):
         """
         Get indirect members
         """
+        if graph is not None:
+            indirect = graph.get_memberindirect(group_entry.dn)
+            if indirect:
+                group_entry.raw['memberindirect'] = indirect
+            return
 
         mo_filter = self.backend.make_filter({'memberof': group_entry.dn})
         filter = self.backend.combine_filters(
             ('(member=*)', mo_filter), self.backend.MATCH_ALL)
-        try:
-            result = self.backend.get_entries(
-                self.api.env.basedn,
-                filter=filter,
-                attrs_list=['member'],
-                size_limit=-1, # paged search will get everything anyway
-                paged_search=True)
-        except errors.NotFound:
-            result = []
+        result = self.backend.iter_entries(
+            filter, ['member'], self.api.env.basedn,
+            size_limit=-1)  # paged search will get everything anyway
 
         indirect = set()
         for entry in result:
@@ -712,20 +869,28 @@ class LDAPObject(Object):
         if indirect:
             group_entry.raw['memberindirect'] = list(indirect)
 
-    def get_memberofindirect(self, entry):
+    def get_memberofindirect(self, entry, graph=None):
+
+        if graph is not None:
+            parents = graph.get_direct_memberof(entry.dn)
+            direct = []
+            indirect = []
+            for dn in entry.raw.get('memberof', []):
+                if DN(dn.decode('utf-8')) in parents:
+                    direct.append(dn)
+                else:
+                    indirect.append(dn)
+            entry.raw['memberof'] = direct
+            if indirect:
+                entry.raw['memberofindirect'] = indirect
+            return
 
         dn = entry.dn
         filter = self.backend.make_filter(
             {'member': dn, 'memberuser': dn, 'memberhost': dn})
-        try:
-            result = self.backend.get_entries(
-                self.api.env.basedn,
-                filter=filter,
-                attrs_list=[''],
-                size_limit=-1,  # paged search will get everything anyway
-                paged_search=True)
-        except errors.NotFound:
-            result = []
+        result = self.backend.iter_entries(
+            filter, [''], self.api.env.basedn,
+            size_limit=-1)  # paged search will get everything anyway
 
         direct = set()
         indirect = set(entry.raw.get('memberof', []))
@@ -2089,8 +2254,14 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
                 entries.sort(key=sort_key)
 
         if not options.get('raw', False):
+            graph = None
+            if len(entries) > 1 and (
+                    'memberindirect' in attrs_list or
+                    'memberofindirect' in attrs_list):
+                # resolve indirect membership of all entries in one pass
+                graph = self.obj.get_membership_graph(entries)
             for entry in entries:
-                self.obj.get_indirect_members(entry, attrs_list)
+                self.obj.get_indirect_members(entry, attrs_list, graph)
                 self.obj.convert_attribute_members(entry, *args, **options)
 
         for (i, e) in enumerate(entries):
@@ -25,12 +25,14 @@ import six
 from ipalib import api, errors
 from ipalib import Command
 from ipalib.frontend import Local
-from ipalib.parameters import Str, Dict
+from ipalib.parameters import Str, Dict, Flag
 from ipalib.output import Output
 from ipalib.text import _
 from ipalib.request import context
 from ipalib.plugable import Registry
 from ipapython.version import API_VERSION
+from ipaserver.plugins.baseldap import LDAPRetrieve, LDAPSearch
+from ipaserver.plugins.ldap2 import LDAPWorkerPool
 
 __doc__ = _("""
 Plugin to make multiple ipa calls via one remote procedure call
@@ -57,6 +59,12 @@ The format of the response is nested the same way.  At the top you will see
 
 And then a nested response for each IPA command method sent in the request
 
+With the "parallel" option set, consecutive *_show and *_find methods are
+executed concurrently, each worker thread using its own LDAP connection.
+Other methods are executed in order and act as barriers, so a read-only
+method always sees the effects of the methods that precede it. The results
+are returned in the order of the request.
+
 """)
 
 if six.PY3:
@@ -88,6 +96,12 @@ class batch(Command):
         ),
     )
 
+    takes_options = (
+        Flag('parallel?',
+            doc=_('Execute read-only methods concurrently'),
+        ),
+    )
+
     has_output = (
         Output('count', int, doc=''),
         Output('results', (list, tuple), doc='')
@@ -157,53 +171,111 @@ class batch(Command):
             logger.debug('batch: %s',
                          ', '.join(super(batch, self)._repr_iter(**params)))
 
-    def execute(self, methods=None, **options):
-        results = []
-        for arg in (methods or []):
-            params = dict()
-            name = None
-            try:
-                self._validate_request(arg)
-                name = arg['method']
-                a, kw = arg['params']
-                newkw = dict((str(k), v) for k, v in kw.items())
-                params = api.Command[name].args_options_2_params(
-                    *a, **newkw)
-                newkw.setdefault('version', options['version'])
-
-                result = api.Command[name](*a, **newkw)
+    def _is_read_only(self, request):
+        """
+        Check whether the request is a side effect free LDAP query which can
+        be executed concurrently with other such requests.
+        """
+        try:
+            command = self.api.Command[request['method']]
+        except (KeyError, TypeError):
+            return False
+        return (
+            isinstance(command, (LDAPRetrieve, LDAPSearch)) and
+            command.name.endswith(('_show', '_find'))
+        )
+
+    def _execute_request(self, arg, version):
+        params = dict()
+        name = None
+        try:
+            self._validate_request(arg)
+            name = arg['method']
+            a, kw = arg['params']
+            newkw = dict((str(k), v) for k, v in kw.items())
+            params = api.Command[name].args_options_2_params(
+                *a, **newkw)
+            newkw.setdefault('version', version)
+
+            result = api.Command[name](*a, **newkw)
+            logger.info(
+                '%s: batch: %s(%s): SUCCESS',
+                getattr(context, 'principal', 'UNKNOWN'),
+                name,
+                ', '.join(api.Command[name]._repr_iter(**params))
+            )
+            result['error']=None
+        except Exception as e:
+            if (isinstance(e, errors.RequirementError) or
+                    isinstance(e, errors.CommandError) or
+                    isinstance(e, errors.ConversionError)):
                 logger.info(
-                    '%s: batch: %s(%s): SUCCESS',
-                    getattr(context, 'principal', 'UNKNOWN'),
-                    name,
-                    ', '.join(api.Command[name]._repr_iter(**params))
+                    '%s: batch: %s',
+                    context.principal,  # pylint: disable=no-member
+                    e.__class__.__name__
                 )
-                result['error']=None
-            except Exception as e:
-                if (isinstance(e, errors.RequirementError) or
-                        isinstance(e, errors.CommandError) or
-                        isinstance(e, errors.ConversionError)):
-                    logger.info(
-                        '%s: batch: %s',
-                        context.principal,  # pylint: disable=no-member
-                        e.__class__.__name__
-                    )
-                else:
-                    logger.info(
-                        '%s: batch: %s(%s): %s',
-                        context.principal, name,  # pylint: disable=no-member
-                        ', '.join(api.Command[name]._repr_iter(**params)),
-                        e.__class__.__name__
-                    )
-                if isinstance(e, errors.PublicError):
-                    reported_error = e
-                else:
-                    reported_error = errors.InternalError()
-                result = dict(
-                    error=reported_error.strerror,
-                    error_code=reported_error.errno,
-                    error_name=unicode(type(reported_error).__name__),
-                    error_kw=reported_error.kw,
+            else:
+                logger.info(
+                    '%s: batch: %s(%s): %s',
+                    context.principal, name,  # pylint: disable=no-member
+                    ', '.join(api.Command[name]._repr_iter(**params)),
+                    e.__class__.__name__
                 )
-            results.append(result)
-        return dict(count=len(results) , results=results)
+            result = self._error_result(e)
+        return result
+
+    def _error_result(self, e):
+        if isinstance(e, errors.PublicError):
+            reported_error = e
+        else:
+            reported_error = errors.InternalError()
+        return dict(
+            error=reported_error.strerror,
+            error_code=reported_error.errno,
+            error_name=unicode(type(reported_error).__name__),
+            error_kw=reported_error.kw,
+        )
+
+    def _execute_parallel(self, requests, results, version):
+        """
+        Execute (index, request) pairs on a pool of worker threads, storing
+        each result at its index in results.
+        """
+        def process(index, arg):
+            results[index] = self._execute_request(arg, version)
+
+        def fail(error, index, arg):
+            results[index] = self._error_result(error)
+
+        num_workers = min(self.api.env.batch_max_workers, len(requests))
+        workers = LDAPWorkerPool(self.api, num_workers, process, fail)
+        try:
+            for index, arg in requests:
+                workers.put(index, arg)
+        finally:
+            workers.join()
+
+    def execute(self, methods=None, parallel=False, **options):
+        methods = methods or []
+        version = options['version']
+
+        if (not parallel or not self.api.env.in_server or
+                self.api.env.batch_max_workers < 2):
+            results = [self._execute_request(arg, version)
+                       for arg in methods]
+            return dict(count=len(results), results=results)
+
+        results = [None] * len(methods)
+        read_only = []
+        for index, arg in enumerate(methods):
+            if self._is_read_only(arg):
+                read_only.append((index, arg))
+                continue
+            if read_only:
+                self._execute_parallel(read_only, results, version)
+                read_only = []
+            results[index] = self._execute_request(arg, version)
+        if read_only:
+            self._execute_parallel(read_only, results, version)
+
+        return dict(count=len(results), results=results)
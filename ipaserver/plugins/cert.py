@@ -22,9 +22,11 @@
 import base64
 import collections
 import datetime
+import functools
 import itertools
 import logging
 from operator import attrgetter
+import threading
 
 import cryptography.x509
 from cryptography.hazmat.primitives import hashes, serialization
@@ -277,7 +279,7 @@ def normalize_serial_number(num):
 
 
 def ca_enabled_check(_api):
-    if not _api.Command.ca_is_enabled()['result']:
+    if not _api.Command.ca_is_enabled.call_internal()['result']:
         raise errors.NotFound(reason=_('CA is not configured'))
 
 
@@ -335,6 +337,65 @@ def bind_principal_can_manage_cert(cert):
         return hostname == cns[-1].value
 
 
+class CertificateCache:
+    """
+    Bounded cache of certificates retrieved from the CA.
+
+    Entries are keyed by ``(issuer, serial_number)`` and hold the result of
+    ``ra.get_certificate()`` together with the parsed certificate. The CA
+    status of the certificate is stored with each entry; an entry looked up
+    with a different status is stale (e.g. the certificate has been revoked
+    since) and is discarded; ``None`` matches any status. The least recently
+    used entries are evicted first.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, status):
+        """
+        Return a ``(ra_obj, cert)`` tuple or ``None`` on a miss.
+        """
+        with self._lock:
+            try:
+                cached_status, ra_obj, cert = self._entries[key]
+            except KeyError:
+                return None
+            if status is not None and cached_status != status:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return ra_obj, cert
+
+    def add(self, key, status, ra_obj, cert):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (status, ra_obj, cert)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_certificate_cache = None
+
+
+def get_certificate_cache():
+    """
+    Return the certificate cache shared by the requests of this process.
+    """
+    global _certificate_cache
+    if _certificate_cache is None:
+        _certificate_cache = CertificateCache(api.env.cert_cache_size)
+    return _certificate_cache
+
+
 class BaseCertObject(Object):
     takes_params = (
         Str(
@@ -458,7 +519,7 @@ class BaseCertObject(Object):
         ),
     )
 
-    def _parse(self, obj, full=True):
+    def _parse(self, obj, full=True, cert=None):
         """Extract certificate-specific data into a result object.
 
         ``obj``
@@ -470,6 +531,8 @@ class BaseCertObject(Object):
             recognised otherNames to the generic ``san_other``
             attribute when ``True`` in addition to the specialised
             attribute.
+        ``cert``
+            The certificate of ``obj`` if already parsed.
 
         Raise ``ValueError`` if the certificate is malformed.
         (Note: only the main certificate structure and Subject Alt
@@ -477,8 +540,9 @@ class BaseCertObject(Object):
 
         """
         if 'certificate' in obj:
-            cert = x509.load_der_x509_certificate(
-                base64.b64decode(obj['certificate']))
+            if cert is None:
+                cert = x509.load_der_x509_certificate(
+                    base64.b64decode(obj['certificate']))
             obj['subject'] = DN(cert.subject)
             obj['issuer'] = DN(cert.issuer)
             obj['serial_number'] = cert.serial_number
@@ -1572,6 +1636,24 @@ class cert_find(Search, CertMethod):
             doc=_("Maximum number of entries returned (0 is unlimited)"),
             minvalue=0,
         ),
+        Int('pagesize?',
+            label=_('Page size'),
+            doc=_('Return the results in pages of this size'),
+            minvalue=1,
+        ),
+        Str('cookie?',
+            label=_('Cookie'),
+            doc=_('Continuation token returned with the previous page'),
+        ),
+    )
+
+    has_output = output.standard_list_of_entries + (
+        output.Output(
+            'cookie',
+            type=(unicode, type(None)),
+            doc=_('Continuation token of the next page of results'),
+            flags={'no_display'},  # we use customized print to CLI
+        ),
     )
 
     msg_summary = ngettext(
@@ -1616,6 +1698,31 @@ class cert_find(Search, CertMethod):
     def _get_cert_key(self, cert):
         return (DN(cert.issuer), cert.serial_number)
 
+    @staticmethod
+    def _merge_results(result, complete, sub_result, sub_complete):
+        """
+        Merge results of a sub-search into ``result``.
+
+        Return whether the merged results are complete, i.e. restricted by
+        the search criteria.
+        """
+        if sub_complete:
+            for key in tuple(result):
+                if key not in sub_result:
+                    del result[key]
+
+        for key, sub_obj in six.iteritems(sub_result):
+            try:
+                obj = result[key]
+            except KeyError:
+                if complete:
+                    continue
+                result[key] = sub_obj
+            else:
+                obj.update(sub_obj)
+
+        return complete or sub_complete
+
     def _cert_search(self, pkey_only, **options):
         result = collections.OrderedDict()
 
@@ -1633,7 +1740,11 @@ class cert_find(Search, CertMethod):
 
         return result, False, True
 
-    def _ca_search(self, raw, pkey_only, exactly, **options):
+    def _get_ra_options(self, exactly=False, paged=False, **options):
+        """
+        Return Dogtag search options for the search criteria and whether
+        the criteria restrict the search results.
+        """
         ra_options = {}
         for name in ('revocation_reason',
                      'issuer',
@@ -1655,7 +1766,6 @@ class cert_find(Search, CertMethod):
         if exactly:
             ra_options['exactly'] = True
 
-        result = collections.OrderedDict()
         complete = bool(ra_options)
 
         # workaround for RHBZ#1669012 and RHBZ#1695685
@@ -1666,7 +1776,9 @@ class cert_find(Search, CertMethod):
         # supplied.
         # IPA enforces that subject CN is either a hostname or a username.
         # The complete flag is left to False to catch overrides.
-        if not ra_options:
+        # A paged search cannot use it, because the certificates of the
+        # owner not matched by the subject would not be returned by any page.
+        if not ra_options and not paged:
             services = options.get('service', ())
             hosts = options.get('host', ())
             users = options.get('user', ())
@@ -1679,21 +1791,27 @@ class cert_find(Search, CertMethod):
             elif len(users) == 1 and not services and not hosts:
                 ra_options['subject'] = users[0]
 
-        try:
-            ca_enabled_check(self.api)
-        except errors.NotFound:
-            if ra_options:
-                raise
-            return result, False, complete
+        return ra_options, complete
 
-        ca_objs = self.api.Command.ca_find(
+    def _get_ca_objs(self):
+        ca_objs = self.api.Command.ca_find.call_internal(
             timelimit=0,
             sizelimit=0,
         )['result']
-        ca_objs = {DN(ca['ipacasubjectdn'][0]): ca for ca in ca_objs}
+        return {DN(ca['ipacasubjectdn'][0]): ca for ca in ca_objs}
+
+    def _add_ca_results(self, result, ra_objs, ca_objs, raw, pkey_only,
+                        sizelimit=0):
+        """
+        Add the CA search results ``ra_objs`` to ``result``.
+
+        If ``sizelimit`` is set, stop consuming ``ra_objs`` as soon as
+        ``result`` has more than ``sizelimit`` entries.
+        """
+        for ra_obj in ra_objs:
+            if len(result) > sizelimit > 0:
+                break
 
-        ra = self.api.Backend.ra
-        for ra_obj in ra.find(ra_options):
             issuer = DN(ra_obj['issuer'])
             serial_number = ra_obj['serial_number']
 
@@ -1721,9 +1839,41 @@ class cert_find(Search, CertMethod):
 
             result[issuer, serial_number] = obj
 
+    def _ca_search(self, raw, pkey_only, exactly, sizelimit=0, **options):
+        ra_options, complete = self._get_ra_options(exactly, **options)
+
+        result = collections.OrderedDict()
+
+        try:
+            ca_enabled_check(self.api)
+        except errors.NotFound:
+            if ra_options:
+                raise
+            return result, False, complete
+
+        ca_objs = self._get_ca_objs()
+
+        # The CA results are only filtered by the other sub-searches when
+        # a certificate or an owner is given. Otherwise the first
+        # sizelimit + 1 of them are enough to fill in a truncated result.
+        if 'certificate' in options or self._get_ldap_filter(**options)[1]:
+            sizelimit = 0
+
+        ra = self.api.Backend.ra
+        self._add_ca_results(
+            result, ra.iter_find(ra_options), ca_objs, raw, pkey_only,
+            sizelimit)
+
         return result, False, complete
 
-    def _ldap_search(self, all, pkey_only, no_members, **options):
+    def _get_ldap_filter(self, certificates=None, **options):
+        """
+        Return LDAP filter of the entries with certificates matching the
+        search criteria and whether the criteria restrict the search results.
+
+        ``certificates``
+            Match only entries with one of these certificates.
+        """
         ldap = self.api.Backend.ldap2
 
         filters = []
@@ -1748,18 +1898,55 @@ class cert_find(Search, CertMethod):
                     rule)
                 filters.append(filter)
 
-        result = collections.OrderedDict()
         complete = bool(filters)
 
-        cert = options.get('certificate')
-        if cert is not None:
+        if certificates is None and 'certificate' in options:
+            certificates = [options['certificate']]
+        if certificates is not None:
             filter = ldap.make_filter_from_attr(
-                'usercertificate', cert.public_bytes(x509.Encoding.DER))
+                'usercertificate', list(certificates), ldap.MATCH_ANY)
         else:
             filter = '(usercertificate=*)'
         filters.append(filter)
 
-        filter = ldap.combine_filters(filters, ldap.MATCH_ALL)
+        return ldap.combine_filters(filters, ldap.MATCH_ALL), complete
+
+    def _add_entry_results(self, result, entry, all, pkey_only, no_members,
+                           skip_issuers=()):
+        ca_enabled = getattr(context, 'ca_enabled')
+        for attr in ('usercertificate', 'usercertificate;binary'):
+            for cert in entry.get(attr, []):
+                cert_key = self._get_cert_key(cert)
+                if cert_key[0] in skip_issuers:
+                    continue
+                try:
+                    obj = result[cert_key]
+                except KeyError:
+                    obj = {'serial_number': cert.serial_number}
+                    if not pkey_only and (all or not ca_enabled):
+                        # Retrieving certificate details is now deferred
+                        # until after all certificates are collected.
+                        # For the case of CA-less we need to keep
+                        # the certificate because getting it again later
+                        # would require unnecessary LDAP searches.
+                        obj['certificate'] = (
+                            base64.b64encode(
+                                cert.public_bytes(x509.Encoding.DER))
+                            .decode('ascii'))
+
+                    result[cert_key] = obj
+
+                if not pkey_only and (all or not no_members):
+                    owners = obj.setdefault('owner', [])
+                    if entry.dn not in owners:
+                        owners.append(entry.dn)
+
+    def _ldap_search(self, all, pkey_only, no_members, **options):
+        ldap = self.api.Backend.ldap2
+
+        result = collections.OrderedDict()
+        filter, complete = self._get_ldap_filter(**options)
+
         try:
             entries, truncated = ldap.find_entries(
                 base_dn=self.api.env.basedn,
@@ -1779,40 +1966,216 @@ class cert_find(Search, CertMethod):
 
             truncated = bool(truncated)
 
-        ca_enabled = getattr(context, 'ca_enabled')
         for entry in entries:
-            for attr in ('usercertificate', 'usercertificate;binary'):
-                for cert in entry.get(attr, []):
-                    cert_key = self._get_cert_key(cert)
-                    try:
-                        obj = result[cert_key]
-                    except KeyError:
-                        obj = {'serial_number': cert.serial_number}
-                        if not pkey_only and (all or not ca_enabled):
-                            # Retrieving certificate details is now deferred
-                            # until after all certificates are collected.
-                            # For the case of CA-less we need to keep
-                            # the certificate because getting it again later
-                            # would require unnecessary LDAP searches.
-                            obj['certificate'] = (
-                                base64.b64encode(
-                                    cert.public_bytes(x509.Encoding.DER))
-                                .decode('ascii'))
-
-                        result[cert_key] = obj
-
-                    if not pkey_only and (all or not no_members):
-                        owners = obj.setdefault('owner', [])
-                        if entry.dn not in owners:
-                            owners.append(entry.dn)
+            self._add_entry_results(result, entry, all, pkey_only, no_members)
 
         return result, truncated, complete
 
+    def _get_certificates(self, result):
+        """
+        Retrieve the certificates of the CA search results in ``result``.
+
+        Return a dict mapping the result keys to ``(ra_obj, cert)`` tuples.
+        Certificates missing from the certificate cache are retrieved from
+        the CA concurrently and added to the cache.
+        """
+        cache = get_certificate_cache()
+        certs = {}
+        missing = {}
+        for key, obj in six.iteritems(result):
+            if 'cacn' not in obj:
+                continue
+            cached = cache.get(key, obj.get('status'))
+            if cached is not None:
+                certs[key] = cached
+            else:
+                _issuer, serial_number = key
+                missing.setdefault(str(serial_number), []).append(key)
+
+        if missing:
+            ra_objs = self.api.Backend.ra.get_certificates(
+                missing, max_workers=self.api.env.cert_find_max_workers)
+            for serial_number, keys in six.iteritems(missing):
+                ra_obj = ra_objs[serial_number]
+                cert = x509.load_der_x509_certificate(
+                    base64.b64decode(ra_obj['certificate']))
+                for key in keys:
+                    certs[key] = (ra_obj, cert)
+                    cache.add(key, result[key].get('status'), ra_obj, cert)
+
+        return certs
+
+    def _fill_results(self, result, all, raw, ca_enabled, certs=None):
+        """
+        Add certificate details to the search results.
+
+        ``certs``
+            Certificates of the results as returned by
+            ``_get_certificates()``, if already retrieved.
+        """
+        ca_objs = {}
+        if certs is None:
+            certs = {}
+            if all and ca_enabled:
+                certs = self._get_certificates(result)
+
+        for key, obj in six.iteritems(result):
+            cert = None
+            if all and 'cacn' in obj:
+                cacn = obj['cacn']
+
+                try:
+                    ca_obj = ca_objs[cacn]
+                except KeyError:
+                    ca_obj = ca_objs[cacn] = (
+                        self.api.Command.ca_show.call_internal(
+                            cacn, all=True)['result'])
+
+                ra_obj, cert = certs[key]
+                obj.update(ra_obj)
+                if not raw:
+                    obj['certificate'] = (
+                        obj['certificate'].replace('\r\n', ''))
+
+                if 'certificate_chain' in ca_obj:
+                    cert_der = base64.b64decode(obj['certificate'])
+                    obj['certificate_chain'] = (
+                        [cert_der] + ca_obj['certificate_chain'])
+
+            if not raw:
+                self.obj._parse(obj, all, cert=cert)
+                if not ca_enabled and not all:
+                    # For the case of CA-less don't display the full
+                    # certificate unless requested. It is kept in the
+                    # entry from _ldap_search() so its attributes can
+                    # be retrieved.
+                    obj.pop('certificate', None)
+                self.obj._fill_owners(obj)
+
+    @staticmethod
+    def _parse_cookie(cookie):
+        """
+        Return the search phase and start offset of the continuation token.
+        """
+        if cookie is None:
+            return 'ca', 0
+        phase, _sep, start = cookie.partition(':')
+        try:
+            start = int(start)
+        except ValueError:
+            start = -1
+        if phase not in ('ca', 'ldap') or start < 0:
+            raise errors.ValidationError(
+                name='cookie', error=_('invalid continuation token'))
+        return phase, start
+
+    def _ldap_page(self, start, pagesize, all, pkey_only, no_members,
+                   skip_issuers, **options):
+        """
+        Return a page of certificates found in LDAP entries.
+
+        Entries are skipped up to ``start``, then entries are read until
+        at least ``pagesize`` certificates are found. Return the results
+        and the offset of the next page or ``None`` if there are no more
+        entries.
+        """
+        ldap = self.api.Backend.ldap2
+
+        result = collections.OrderedDict()
+        filter, _complete = self._get_ldap_filter(**options)
+
+        entries = ldap.iter_entries(
+            filter, ['usercertificate'], self.api.env.basedn,
+            time_limit=0, size_limit=0)
+        try:
+            for i, entry in enumerate(entries):
+                if i < start:
+                    continue
+                self._add_entry_results(
+                    result, entry, all, pkey_only, no_members, skip_issuers)
+                if len(result) >= pagesize:
+                    return result, i + 1
+        except errors.LimitsExceeded as e:
+            self.add_message(messages.SearchResultTruncated(reason=e))
+        finally:
+            entries.close()
+
+        return result, None
+
+    def _execute_paged(self, all, raw, pkey_only, no_members, pagesize,
+                       cookie, ca_enabled, **options):
+        """
+        Return one page of the search results.
+
+        Certificates known to the CA are listed first, ``pagesize`` at a
+        time as returned by the Dogtag search, and their owners are looked
+        up in LDAP for that page only. Then the certificates stored in LDAP
+        entries which were not issued by an IPA CA are listed. A page may
+        contain fewer than ``pagesize`` certificates when the owner criteria
+        exclude some of them; there are more pages as long as a cookie is
+        returned.
+        """
+        phase, start = self._parse_cookie(cookie)
+        ra_options, ca_complete = self._get_ra_options(paged=True, **options)
+        _filter, ldap_complete = self._get_ldap_filter(**options)
+
+        if ca_enabled:
+            ca_objs = self._get_ca_objs()
+        else:
+            if ra_options:
+                ca_enabled_check(self.api)
+            ca_objs = {}
+            if phase == 'ca':
+                phase, start = 'ldap', 0
+
+        result = collections.OrderedDict()
+        certs = None
+        next_cookie = None
+
+        if phase == 'ca':
+            ra_objs = self.api.Backend.ra.find(
+                dict(ra_options, start=start, sizelimit=pagesize))
+            self._add_ca_results(result, ra_objs, ca_objs, raw, pkey_only)
+
+            if result and (ldap_complete or
+                           (not pkey_only and (all or not no_members))):
+                certs = self._get_certificates(result)
+                sub_result, _truncated, sub_complete = self._ldap_search(
+                    all=all,
+                    pkey_only=pkey_only,
+                    no_members=no_members,
+                    certificates=[cert for _ra_obj, cert in certs.values()],
+                    **options)
+                self._merge_results(result, True, sub_result, sub_complete)
+
+            if len(ra_objs) >= pagesize:
+                next_cookie = u'ca:%d' % (start + len(ra_objs))
+            elif not ca_complete:
+                next_cookie = u'ldap:0'
+        elif not ca_complete:
+            result, next_start = self._ldap_page(
+                start, pagesize, all, pkey_only, no_members, ca_objs,
+                **options)
+            if next_start is not None:
+                next_cookie = u'ldap:%d' % next_start
+
+        if not pkey_only:
+            self._fill_results(result, all, raw, ca_enabled, certs)
+
+        result = list(six.itervalues(result))
+        return dict(
+            result=result,
+            count=len(result),
+            truncated=False,
+            cookie=next_cookie,
+        )
+
     def execute(self, criteria=None, all=False, raw=False, pkey_only=False,
-                no_members=True, timelimit=None, sizelimit=None, **options):
+                no_members=True, timelimit=None, sizelimit=None,
+                pagesize=None, cookie=None, **options):
         # Store ca_enabled status in the context to save making the API
         # call multiple times.
-        ca_enabled = self.api.Command.ca_is_enabled()['result']
+        ca_enabled = self.api.Command.ca_is_enabled.call_internal()['result']
         setattr(context, 'ca_enabled', ca_enabled)
 
         if 'cacn' in options:
@@ -1822,12 +2185,27 @@ class cert_find(Search, CertMethod):
                 if DN(ca_sdn) != DN(options['issuer']):
                     # client has provided both 'ca' and 'issuer' but
                     # issuer DNs don't match; result must be empty
-                    return dict(result=[], count=0, truncated=False)
+                    return dict(result=[], count=0, truncated=False,
+                                cookie=None)
             else:
                 options['issuer'] = ca_sdn
 
         if criteria is not None:
-            return dict(result=[], count=0, truncated=False)
+            return dict(result=[], count=0, truncated=False, cookie=None)
+
+        if cookie is not None and pagesize is None:
+            raise errors.RequirementError(name='pagesize')
+
+        if pagesize is not None and 'certificate' not in options:
+            return self._execute_paged(
+                all=all,
+                raw=raw,
+                pkey_only=pkey_only,
+                no_members=no_members,
+                pagesize=pagesize,
+                cookie=cookie,
+                ca_enabled=ca_enabled,
+                **options)
 
         # respect the configured search limits
         if timelimit is None:
@@ -1840,7 +2218,8 @@ class cert_find(Search, CertMethod):
         complete = False
 
         for sub_search in (self._cert_search,
-                           self._ca_search,
+                           functools.partial(self._ca_search,
+                                             sizelimit=sizelimit),
                            self._ldap_search):
             sub_result, sub_truncated, sub_complete = sub_search(
                 all=all,
@@ -1849,59 +2228,12 @@ class cert_find(Search, CertMethod):
                 no_members=no_members,
                 **options)
 
-            if sub_complete:
-                for key in tuple(result):
-                    if key not in sub_result:
-                        del result[key]
-
-            for key, sub_obj in six.iteritems(sub_result):
-                try:
-                    obj = result[key]
-                except KeyError:
-                    if complete:
-                        continue
-                    result[key] = sub_obj
-                else:
-                    obj.update(sub_obj)
-
+            complete = self._merge_results(
+                result, complete, sub_result, sub_complete)
             truncated = truncated or sub_truncated
-            complete = complete or sub_complete
 
         if not pkey_only:
-            ca_objs = {}
-            if ca_enabled:
-                ra = self.api.Backend.ra
-
-            for key, obj in six.iteritems(result):
-                if all and 'cacn' in obj:
-                    _issuer, serial_number = key
-                    cacn = obj['cacn']
-
-                    try:
-                        ca_obj = ca_objs[cacn]
-                    except KeyError:
-                        ca_obj = ca_objs[cacn] = (
-                            self.api.Command.ca_show(cacn, all=True)['result'])
-
-                    obj.update(ra.get_certificate(str(serial_number)))
-                    if not raw:
-                        obj['certificate'] = (
-                            obj['certificate'].replace('\r\n', ''))
-
-                    if 'certificate_chain' in ca_obj:
-                        cert_der = base64.b64decode(obj['certificate'])
-                        obj['certificate_chain'] = (
-                            [cert_der] + ca_obj['certificate_chain'])
-
-                if not raw:
-                    self.obj._parse(obj, all)
-                    if not ca_enabled and not all:
-                        # For the case of CA-less don't display the full
-                        # certificate unless requested. It is kept in the
-                        # entry from _ldap_search() so its attributes can
-                        # be retrieved.
-                        obj.pop('certificate', None)
-                    self.obj._fill_owners(obj)
+            self._fill_results(result, all, raw, ca_enabled)
 
         result = list(six.itervalues(result))
         if (len(result) > sizelimit > 0):
@@ -1916,6 +2248,7 @@ class cert_find(Search, CertMethod):
         )
         ret['count'] = len(ret['result'])
         ret['truncated'] = bool(truncated)
+        ret['cookie'] = None
         return ret
 
 
@@ -4460,7 +4460,11 @@ class dns_system_records(Object):
         Str(
             'location_records*',
             label=_('IPA location records')
-        )
+        ),
+        Str(
+            'records_diff*',
+            label=_('Changes of DNS records')
+        ),
     )
 
 
@@ -4515,10 +4519,23 @@ class dns_update_system_records(Method):
         system_records = IPASystemRecords(self.api)
 
         if options.get('dry_run'):
+            base_zone = system_records.get_base_records()
+            location_zone = system_records.get_locations_records()
             result['result']['ipa_records'] = output_to_list(
-                system_records.get_base_records().items())
+                base_zone.items())
             result['result']['location_records'] = output_to_list(
-                system_records.get_locations_records().items())
+                location_zone.items())
+            try:
+                records_diff = system_records.get_records_diff(
+                    base_zone, location_zone)
+            except IPADomainIsNotManagedByIPAError:
+                self.add_message(
+                    messages.DNSUpdateNotIPAManagedZone(
+                        zone=self.api.env.domain)
+                )
+            else:
+                if records_diff:
+                    result['result']['records_diff'] = records_diff
         else:
             try:
                 (
@@ -242,23 +242,27 @@ digits and nothing else follows.
 from __future__ import absolute_import
 
 import datetime
+import io
 import json
 import logging
 
 from lxml import etree
 import time
 import contextlib
+import threading
 
 import six
+from six.moves import queue
 
 from ipalib import Backend, api
 from ipapython.dn import DN
 import ipapython.cookie
 from ipapython import dogtag, ipautil, certdb
-from ipaserver.masters import find_providing_server
+from ipaserver.masters import find_providing_server, find_providing_servers
 
 if api.env.in_server:
     import pki
+    import pki.account
     from pki.client import PKIConnection
     import pki.crypto as cryptoutil
     from pki.kra import KRAClient
@@ -274,6 +278,19 @@ CMS_SUCCESS      = 0
 CMS_FAILURE      = 1
 CMS_AUTH_FAILURE = 2
 
+# Number of certificates requested at once by ra.iter_find()
+CERT_SEARCH_PAGE_SIZE = 1000
+
+# Elements of CertDataInfo returned by certificate search, mapped to the
+# keys of ra.find() results
+CERT_DATA_INFO_FIELDS = {
+    'SubjectDN': 'subject',
+    'IssuerDN': 'issuer',
+    'NotValidBefore': 'valid_not_before',
+    'NotValidAfter': 'valid_not_after',
+    'Status': 'status',
+}
+
 # CMS (Certificate Management System) status return values
 # These are requestStatus return values used with templates
 CMS_STATUS_UNAUTHORIZED = 1
@@ -1239,6 +1256,11 @@ class RestClient(Backend):
             # REST client is now logged in
             profile_api.create_profile(...)
 
+    In the server, the REST session is not logged out at the end of the
+    ``with`` suite. It is reused by subsequent requests of the process for
+    ``dogtag_session_ttl`` seconds. When the CA rejects the session, or does
+    not respond to a GET request, the client logs in again, to another CA
+    server if there is one.
     """
     DEFAULT_PROFILE = dogtag.DEFAULT_PROFILE
     KDC_PROFILE = dogtag.KDC_PROFILE
@@ -1269,6 +1291,9 @@ class RestClient(Backend):
         # session cookie
         self.override_port = None
         self.cookie = None
+        # (port, time of login) of the session
+        self._session = None
+        self._session_lock = threading.Lock()
 
     @property
     def ca_host(self):
@@ -1279,31 +1304,53 @@ class RestClient(Backend):
         """
         if self._ca_host is not None:
             return self._ca_host
+        return self._select_ca_host()
 
+    def _select_ca_host(self, failed_host=None):
+        """
+        Select a CA host, other than failed_host if there is another one.
+        """
         preferred = [api.env.ca_host]
         if api.env.host != api.env.ca_host:
             preferred.append(api.env.host)
-        ca_host = find_providing_server(
+        ca_hosts = find_providing_servers(
             'CA', conn=self.api.Backend.ldap2, preferred_hosts=preferred,
             api=self.api
         )
-        if ca_host is None:
+        if failed_host in ca_hosts and len(ca_hosts) > 1:
+            ca_hosts.remove(failed_host)
+        if ca_hosts:
+            ca_host = ca_hosts[0]
+        else:
             # TODO: need during installation, CA is not yet set as enabled
             ca_host = api.env.ca_host
         # object is locked, need to use __setattr__()
         object.__setattr__(self, '_ca_host', ca_host)
         return ca_host
 
-    def __enter__(self):
-        """Log into the REST API"""
-        if self.cookie is not None:
-            return None
-
+    @property
+    def _session_ttl(self):
+        """How long a session is kept open, 0 if it is logged out after use
+        """
+        if self.api.env.context not in ('server', 'lite'):
+            return 0
+        return self.api.env.dogtag_session_ttl
+
+    def _session_is_valid(self):
+        if self.cookie is None or self._session is None:
+            return False
+        port, login_time = self._session
+        return (port == (self.override_port or self.env.ca_agent_port) and
+                time.time() - login_time < self._session_ttl)
+
+    def _login(self, failed_host=None):
         # Refresh the ca_host property
         object.__setattr__(self, '_ca_host', None)
+        ca_host = self._select_ca_host(failed_host)
+        port = self.override_port or self.env.ca_agent_port
 
         status, resp_headers, _resp_body = dogtag.https_request(
-            self.ca_host, self.override_port or self.env.ca_agent_port,
+            ca_host, port,
             url='/ca/rest/account/login',
             cafile=self.ca_cert,
             client_certfile=self.client_certfile,
@@ -1314,10 +1361,10 @@ class RestClient(Backend):
         if status != 200 or len(cookies) == 0:
             raise errors.RemoteRetrieveError(reason=_('Failed to authenticate to CA REST API'))
         object.__setattr__(self, 'cookie', str(cookies[0]))
-        return self
+        object.__setattr__(self, '_session', (port, time.time()))
 
-    def __exit__(self, exc_type, exc_value, traceback):
-        """Log out of the REST API"""
+    def _logout(self):
+        object.__setattr__(self, '_session', None)
         dogtag.https_request(
             self.ca_host, self.override_port or self.env.ca_agent_port,
             url='/ca/rest/account/logout',
@@ -1328,6 +1375,41 @@ class RestClient(Backend):
         )
         object.__setattr__(self, 'cookie', None)
 
+    def _relogin(self, cookie, failed_host=None):
+        """
+        Log in again after the session given by cookie failed, unless
+        another thread did it already.
+        """
+        with self._session_lock:
+            if self.cookie == cookie:
+                object.__setattr__(self, 'cookie', None)
+                self._login(failed_host)
+            return self.cookie
+
+    def __enter__(self):
+        """Log into the REST API"""
+        if not self._session_ttl:
+            if self.cookie is None:
+                self._login()
+            return self
+
+        with self._session_lock:
+            if not self._session_is_valid():
+                if self.cookie is not None:
+                    try:
+                        self._logout()
+                    except errors.NetworkError as e:
+                        logger.debug("Logout of expired session failed: %s",
+                                     e)
+                        object.__setattr__(self, 'cookie', None)
+                self._login()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Log out of the REST API, unless the session is kept open"""
+        if not self._session_ttl:
+            self._logout()
+
     def _ssldo(self, method, path, headers=None, body=None, use_session=True):
         """
         Perform an HTTPS request.
@@ -1350,10 +1432,11 @@ class RestClient(Backend):
         headers = headers or {}
 
         if use_session:
-            if self.cookie is None:
+            cookie = self.cookie
+            if cookie is None:
                 raise errors.RemoteRetrieveError(
                     reason=_("REST API is not logged in."))
-            headers['Cookie'] = self.cookie
+            headers['Cookie'] = cookie
 
         resource = '/ca/rest'
         if self.path is not None:
@@ -1361,15 +1444,36 @@ class RestClient(Backend):
         if path is not None:
             resource = os.path.join(resource, path)
 
+        def request():
+            return dogtag.https_request(
+                self.ca_host, self.override_port or self.env.ca_agent_port,
+                url=resource,
+                cafile=self.ca_cert,
+                client_certfile=self.client_certfile,
+                client_keyfile=self.client_keyfile,
+                method=method, headers=headers, body=body
+            )
+
         # perform main request
-        status, resp_headers, resp_body = dogtag.https_request(
-            self.ca_host, self.override_port or self.env.ca_agent_port,
-            url=resource,
-            cafile=self.ca_cert,
-            client_certfile=self.client_certfile,
-            client_keyfile=self.client_keyfile,
-            method=method, headers=headers, body=body
-        )
+        reuse_session = use_session and self._session_ttl
+        try:
+            status, resp_headers, resp_body = request()
+        except errors.NetworkError as e:
+            # only GET is safe to repeat, the request may have been
+            # processed by the CA
+            if not reuse_session or method != 'GET':
+                raise
+            logger.debug("CA %s failed, logging in again: %s",
+                         self.ca_host, e)
+            headers['Cookie'] = self._relogin(cookie, self.ca_host)
+            status, resp_headers, resp_body = request()
+        else:
+            if reuse_session and status == 401:
+                # the session expired or the CA was restarted
+                logger.debug("CA REST session rejected, logging in again")
+                headers['Cookie'] = self._relogin(cookie)
+                status, resp_headers, resp_body = request()
+
         if status < 200 or status >= 300:
             explanation = self._parse_dogtag_error(resp_body) or ''
             raise errors.HTTPRequestError(
@@ -1616,6 +1720,56 @@ class ra(rabase.rabase, RestClient):
 
         return cmd_result
 
+    def get_certificates(self, serial_numbers, max_workers=1):
+        """
+        Retrieve existing certificates.
+
+        :param serial_numbers: Certificate serial numbers, see
+                               ``get_certificate``.
+        :param max_workers: Maximum number of concurrent requests.
+
+        Return a dict mapping each of the serial numbers to the result of
+        ``get_certificate``. Certificates are retrieved over up to
+        ``max_workers`` connections to the CA at once; if any of the
+        retrievals fails, the first error is raised.
+        """
+        serial_numbers = list(serial_numbers)
+        num_workers = min(max_workers, len(serial_numbers))
+        if num_workers <= 1:
+            return {serial_number: self.get_certificate(serial_number)
+                    for serial_number in serial_numbers}
+
+        # select the CA host before the workers start
+        self.ca_host  # pylint: disable=pointless-statement
+
+        results = {}
+        failures = []
+        pending = queue.Queue()
+        for serial_number in serial_numbers:
+            pending.put(serial_number)
+
+        def worker():
+            while not failures:
+                try:
+                    serial_number = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results[serial_number] = (
+                        self.get_certificate(serial_number))
+                except Exception as e:
+                    failures.append(e)
+
+        workers = [threading.Thread(target=worker)
+                   for _i in range(num_workers)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        if failures:
+            raise failures[0]
+        return results
 
     def request_certificate(
             self, csr, profile_id, ca_id, request_type='pkcs10'):
@@ -1833,7 +1987,40 @@ class ra(rabase.rabase, RestClient):
         """
         Search for certificates
 
-        :param options: dictionary of search options
+        :param options: dictionary of search options; ``start`` and
+                        ``sizelimit`` select a page of the results
+        """
+        return list(self.iter_find(options))
+
+    def iter_find(self, options, page_size=CERT_SEARCH_PAGE_SIZE):
+        """
+        Search for certificates, ``page_size`` at a time
+
+        Certificates are yielded as the pages are parsed, the search stops
+        when the caller stops iterating.
+
+        :param options: dictionary of search options, see find()
+        """
+        payload = self._get_search_request(options)
+        logger.debug('%s.find(): request: %s', type(self).__name__, payload)
+
+        start = options.get('start', 0)
+        limit = options.get('sizelimit')
+        while limit is None or limit > 0:
+            size = page_size if limit is None else min(page_size, limit)
+            results = self._search_page(payload, start, size)
+            for result in results:
+                yield result
+
+            if len(results) < size:
+                break
+            start += len(results)
+            if limit is not None:
+                limit -= len(results)
+
+    def _get_search_request(self, options):
+        """
+        Create the CertSearchRequest XML document for search options
         """
 
         def convert_time(value):
@@ -1843,8 +2030,6 @@ class ra(rabase.rabase, RestClient):
             ts = time.strptime(value, '%Y-%m-%d')
             return int(time.mktime(ts) * 1000)
 
-        logger.debug('%s.find()', type(self).__name__)
-
         # Create the root element
         page = etree.Element('CertSearchRequest')
 
@@ -1918,15 +2103,20 @@ class ra(rabase.rabase, RestClient):
             e = etree.SubElement(page, opt)
             e.text = str(booloptions[opt]).lower()
 
-        payload = etree.tostring(doc, pretty_print=False,
-                                 xml_declaration=True, encoding='UTF-8')
-        logger.debug('%s.find(): request: %s', type(self).__name__, payload)
+        return etree.tostring(doc, pretty_print=False,
+                              xml_declaration=True, encoding='UTF-8')
+
+    def _search_page(self, payload, start, size):
+        """
+        Request one page of certificate search results
 
+        The response is parsed incrementally, without building the whole
+        document tree.
+        """
         # pylint: disable=unused-variable
         status, _, data = dogtag.https_request(
             self.ca_host, 443,
-            url='/ca/rest/certs/search?size=%d' % (
-                 options.get('sizelimit', 0x7fffffff)),
+            url='/ca/rest/certs/search?start=%d&size=%d' % (start, size),
             client_certfile=None,
             client_keyfile=None,
             cafile=self.ca_cert,
@@ -1942,46 +2132,29 @@ class ra(rabase.rabase, RestClient):
                                                    detail=status)
 
         logger.debug('%s.find(): response: %s', type(self).__name__, data)
-        parser = etree.XMLParser()
+
+        results = []
         try:
-            doc = etree.fromstring(data, parser)
+            for _event, cert in etree.iterparse(io.BytesIO(data),
+                                                tag='CertDataInfo'):
+                response_request = {}
+                response_request['serial_number'] = int(cert.get('id'), 16) # parse as hex
+                response_request['serial_number_hex'] = u'0x%X' % response_request['serial_number']
+
+                for child in cert:
+                    name = CERT_DATA_INFO_FIELDS.get(child.tag)
+                    if name is not None:
+                        response_request[name] = unicode(child.text)
+                results.append(response_request)
+
+                # free the parsed certificates
+                cert.clear()
+                while cert.getprevious() is not None:
+                    del cert.getparent()[0]
         except etree.XMLSyntaxError as e:
             self.raise_certificate_operation_error('find',
                                                    detail=e.msg)
 
-        # Grab all the certificates
-        certs = doc.xpath('//CertDataInfo')
-
-        results = []
-
-        for cert in certs:
-            response_request = {}
-            response_request['serial_number'] = int(cert.get('id'), 16) # parse as hex
-            response_request['serial_number_hex'] = u'0x%X' % response_request['serial_number']
-
-            dn = cert.xpath('SubjectDN')
-            if len(dn) == 1:
-                response_request['subject'] = unicode(dn[0].text)
-
-            issuer_dn = cert.xpath('IssuerDN')
-            if len(issuer_dn) == 1:
-                response_request['issuer'] = unicode(issuer_dn[0].text)
-
-            not_valid_before = cert.xpath('NotValidBefore')
-            if len(not_valid_before) == 1:
-                response_request['valid_not_before'] = (
-                    unicode(not_valid_before[0].text))
-
-            not_valid_after = cert.xpath('NotValidAfter')
-            if len(not_valid_after) == 1:
-                response_request['valid_not_after'] = (
-                    unicode(not_valid_after[0].text))
-
-            status = cert.xpath('Status')
-            if len(status) == 1:
-                response_request['status'] = unicode(status[0].text)
-            results.append(response_request)
-
         return results
 
     def updateCRL(self, wait='false'):
@@ -2031,10 +2204,22 @@ class ra(rabase.rabase, RestClient):
 class kra(Backend):
     """
     KRA backend plugin (for Vault)
+
+    In the server, clients logged in to the KRA by get_session() and the
+    transport certificate are kept for ``dogtag_session_ttl`` seconds and
+    reused by subsequent requests of the process. A session which was idle
+    for more than ``dogtag_session_check_interval`` seconds logs in again
+    before it is reused.
     """
 
     def __init__(self, api, kra_port=443):
         self.kra_port = kra_port
+        # idle sessions, (client, account, tempdb, time of login, time of
+        # last use) tuples
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+        # (DER certificate, time of retrieval)
+        self._transport_cert = None
         super(kra, self).__init__(api)
 
     @property
@@ -2058,6 +2243,48 @@ class kra(Backend):
             kra_host = api.env.ca_host
         return kra_host
 
+    @property
+    def _session_ttl(self):
+        """How long a session is kept open, 0 if it is logged out after use
+        """
+        if self.api.env.context not in ('server', 'lite'):
+            return 0
+        return self.api.env.dogtag_session_ttl
+
+    def _check_enabled(self):
+        if not self.api.Command.kra_is_enabled.call_internal()['result']:
+            # TODO: replace this with a more specific exception
+            raise RuntimeError('KRA service is not enabled')
+
+    def _create_client(self):
+        """
+        :returns: tuple of KRA client and its temporary NSS database
+        """
+        tempdb = certdb.NSSDatabase()
+        tempdb.create_db()
+        try:
+            crypto = cryptoutil.NSSCryptoProvider(
+                tempdb.secdir,
+                password_file=tempdb.pwd_file)
+
+            # TODO: obtain KRA host & port from IPA service list or point to KRA load balancer
+            # https://fedorahosted.org/freeipa/ticket/4557
+            connection = PKIConnection(
+                'https',
+                self.kra_host,
+                str(self.kra_port),
+                'kra')
+
+            connection.session.cert = (paths.RA_AGENT_PEM, paths.RA_AGENT_KEY)
+            # uncomment the following when this commit makes it to release
+            # https://git.fedorahosted.org/cgit/pki.git/commit/?id=71ae20c
+            # connection.set_authentication_cert(paths.RA_AGENT_PEM,
+            #                                    paths.RA_AGENT_KEY)
+            return KRAClient(connection, crypto), tempdb
+        except Exception:
+            tempdb.close()
+            raise
+
     @contextlib.contextmanager
     def get_client(self):
         """
@@ -2065,36 +2292,122 @@ class kra(Backend):
 
         Raises a generic exception if KRA is not enabled.
         """
+        self._check_enabled()
 
-        if not self.api.Command.kra_is_enabled()['result']:
-            # TODO: replace this with a more specific exception
-            raise RuntimeError('KRA service is not enabled')
+        client, tempdb = self._create_client()
+        try:
+            yield client
+        finally:
+            tempdb.close()
 
-        tempdb = certdb.NSSDatabase()
-        tempdb.create_db()
-        crypto = cryptoutil.NSSCryptoProvider(
-            tempdb.secdir,
-            password_file=tempdb.pwd_file)
-
-        # TODO: obtain KRA host & port from IPA service list or point to KRA load balancer
-        # https://fedorahosted.org/freeipa/ticket/4557
-        connection = PKIConnection(
-            'https',
-            self.kra_host,
-            str(self.kra_port),
-            'kra')
-
-        connection.session.cert = (paths.RA_AGENT_PEM, paths.RA_AGENT_KEY)
-        # uncomment the following when this commit makes it to release
-        # https://git.fedorahosted.org/cgit/pki.git/commit/?id=71ae20c
-        # connection.set_authentication_cert(paths.RA_AGENT_PEM,
-        #                                    paths.RA_AGENT_KEY)
+    def _open_session(self):
+        client, tempdb = self._create_client()
+        account = pki.account.AccountClient(client.connection)
+        try:
+            account.login()
+        except Exception:
+            tempdb.close()
+            raise
+        now = time.time()
+        return client, account, tempdb, now, now
 
+    def _close_session(self, session):
+        _client, account, tempdb, _login_time, _last_use = session
         try:
-            yield KRAClient(connection, crypto)
+            account.logout()
+        except Exception as e:
+            logger.debug("Failed to log out of KRA: %s", e)
         finally:
             tempdb.close()
 
+    def _acquire_session(self):
+        ttl = self._session_ttl
+        expired = []
+        session = None
+        with self._sessions_lock:
+            while self._sessions:
+                candidate = self._sessions.pop()
+                if time.time() - candidate[3] < ttl:
+                    session = candidate
+                    break
+                expired.append(candidate)
+
+        for candidate in expired:
+            self._close_session(candidate)
+        if session is None:
+            session = self._open_session()
+        elif (time.time() - session[4] >
+                self.api.env.dogtag_session_check_interval):
+            session = self._check_session(session)
+        return session
+
+    def _check_session(self, session):
+        """
+        Log in again with an idle session, the KRA may have been restarted
+        or may have expired the session in the meantime. Returns the session
+        or a new one if the login failed.
+        """
+        try:
+            session[1].login()
+        except Exception as e:
+            logger.debug("Reused KRA session is not valid: %s", e)
+            self._close_session(session)
+            return self._open_session()
+        return session
+
+    def _release_session(self, session):
+        if time.time() - session[3] < self._session_ttl:
+            with self._sessions_lock:
+                self._sessions.append(session[:4] + (time.time(),))
+        else:
+            self._close_session(session)
+
+    @contextlib.contextmanager
+    def get_session(self):
+        """
+        Returns a KRA client logged in to the KRA.
+
+        Unlike get_client(), the client is already logged in. In the server,
+        it stays logged in and is reused by subsequent calls. A client which
+        failed with an error other than a public IPA error is discarded.
+
+        Raises a generic exception if KRA is not enabled.
+        """
+        self._check_enabled()
+
+        session = self._acquire_session()
+        try:
+            yield session[0]
+        except errors.PublicError:
+            # raised by the caller, the session is fine
+            self._release_session(session)
+            raise
+        except BaseException:
+            self._close_session(session)
+            raise
+        else:
+            self._release_session(session)
+
+    def get_transport_cert(self):
+        """
+        :returns: DER encoded KRA transport certificate
+
+        In the server, the certificate is cached for ``dogtag_session_ttl``
+        seconds.
+        """
+        cached = self._transport_cert
+        ttl = self._session_ttl
+        if cached is not None and time.time() - cached[1] < ttl:
+            return cached[0]
+
+        with self.get_client() as kra_client:
+            transport_cert = kra_client.system_certs.get_transport_cert()
+        if ttl:
+            # object is locked, need to use __setattr__()
+            object.__setattr__(
+                self, '_transport_cert', (transport_cert.binary, time.time()))
+        return transport_cert.binary
+
 
 @register()
 class ra_certprofile(RestClient):
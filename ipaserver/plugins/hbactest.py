@@ -146,6 +146,29 @@ EXAMPLES:
       Matched rules: allow_all
 
 
+BULK TESTING
+
+hbactest-bulk evaluates every combination of the given users, hosts and
+services. The HBAC rules are fetched and converted only once and group
+memberships of all users, hosts and services are looked up together, which
+makes it suitable for testing many requests at once. It accepts the same
+rule selection options as hbactest.
+
+EXAMPLES:
+
+    1. Test two users against two hosts using all enabled HBAC rules:
+    $ ipa hbactest-bulk --user=a1a --user=b1b --host=foo --host=bar \\
+          --service=sshd --nodetail
+    -------------------------------------
+    2 of 4 requests granted access
+    -------------------------------------
+      User name: a1a
+      Target host: foo.example.com
+      Service: sshd
+      Access granted: True
+    ...
+
+
 HBACTEST AND TRUSTED DOMAINS
 
 When an external trusted domain is configured in IPA, HBAC rules are also applied
@@ -219,6 +242,9 @@ logger = logging.getLogger(__name__)
 
 register = Registry()
 
+# maximum number of names looked up by a single LDAP search in hbactest-bulk
+_BULK_FILTER_SIZE = 100
+
 def _convert_to_ipa_rule(rule):
     # convert a dict with a rule to an pyhbac rule
     ipa_rule = pyhbac.HbacRule(rule['cn'][0])
@@ -317,11 +343,16 @@ class hbactest(Command):
             return u'%s.%s' % (host, self.env.domain)
         return host
 
-    def execute(self, *args, **options):
+    def _get_rules(self, options):
+        """
+        Fetch the HBAC rules to test and convert them to pyhbac format
+
+        Returns a tuple of the converted rules and a list of names of rules
+        given by --rules which could not be resolved.
+        """
         # First receive all needed information:
         # 1. HBAC rules (whether enabled or disabled)
-        # 2. Required options are (user, target host, service)
-        # 3. Options: rules to test (--rules, --enabled, --disabled), request for detail output
+        # 2. Options: rules to test (--rules, --enabled, --disabled)
         rules = []
 
         # Use all enabled IPA rules by default
@@ -329,7 +360,7 @@ class hbactest(Command):
         all_disabled = False
 
         # We need a local copy of test rules in order find incorrect ones
-        testrules = {}
+        testrules = []
         if 'rules' in options:
             testrules = list(options['rules'])
             # When explicit rules are provided, disable assumptions
@@ -378,6 +409,100 @@ class hbactest(Command):
                 ipa_rule.enabled = True
                 rules.append(ipa_rule)
 
+        return rules, testrules
+
+    def _is_trusted_user(self, user):
+        """
+        Check if the user name or SID refers to a trusted domain user
+        """
+        if _dcerpc_bindings_installed:
+            is_valid_sid = ipaserver.dcerpc.is_sid_valid(user)
+        else:
+            is_valid_sid = False
+        components = util.normalize_name(user)
+        return (is_valid_sid or 'domain' in components or
+                'flatname' in components)
+
+    def _get_trusted_user(self, user):
+        """
+        Resolve a trusted domain user to its SID and IPA groups
+        """
+        if not _dcerpc_bindings_installed:
+            raise errors.NotFound(reason=_(
+                'Cannot perform external member validation without '
+                'Samba 4 support installed. Make sure you have installed '
+                'server-trust-ad sub-package of IPA on the server'))
+        domain_validator = ipaserver.dcerpc.DomainValidator(self.api)
+        if not domain_validator.is_configured():
+            raise errors.NotFound(reason=_(
+                'Cannot search in trusted domains without own domain configured. '
+                'Make sure you have run ipa-adtrust-install on the IPA server first'))
+        user_sid, group_sids = domain_validator.get_trusted_domain_user_and_groups(user)
+
+        # Now search for all external groups that have this user or
+        # any of its groups in its external members. Found entires
+        # memberOf links will be then used to gather all groups where
+        # this group is assigned, including the nested ones
+        filter_sids = "(&(objectclass=ipaexternalgroup)(|(ipaExternalMember=%s)))" \
+                % ")(ipaExternalMember=".join(group_sids + [user_sid])
+
+        ldap = self.api.Backend.ldap2
+        group_container = DN(api.env.container_group, api.env.basedn)
+        try:
+            entries, _truncated = ldap.find_entries(
+                filter_sids, ['memberof'], group_container)
+        except errors.NotFound:
+            return user_sid, []
+
+        groups = []
+        for entry in entries:
+            memberof_dns = entry.get('memberof', [])
+            for memberof_dn in memberof_dns:
+                if memberof_dn.endswith(group_container):
+                    groups.append(memberof_dn[0][0].value)
+        return user_sid, sorted(set(groups))
+
+    def _evaluate(self, request, rules, nodetail):
+        """
+        Evaluate the request against the rules
+
+        Returns a tuple of the access result and lists of matched, not
+        matched and invalid rule names. The lists are empty if nodetail is
+        set.
+        """
+        matched_rules = []
+        notmatched_rules = []
+        error_rules = []
+
+        if not nodetail:
+            # Validate runs rules one-by-one and reports failed ones
+            for ipa_rule in rules:
+                try:
+                    res = request.evaluate([ipa_rule])
+                    if res == pyhbac.HBAC_EVAL_ALLOW:
+                        matched_rules.append(ipa_rule.name)
+                    if res == pyhbac.HBAC_EVAL_DENY:
+                        notmatched_rules.append(ipa_rule.name)
+                except pyhbac.HbacError as e:
+                    code, rule_name = e.args
+                    if code == pyhbac.HBAC_EVAL_ERROR:
+                        error_rules.append(rule_name)
+                        logger.info('Native IPA HBAC rule "%s" parsing error: '
+                                    '%s',
+                                    rule_name, pyhbac.hbac_result_string(code))
+                except (TypeError, IOError) as info:
+                    logger.error('Native IPA HBAC module error: %s', info)
+
+            access_granted = len(matched_rules) > 0
+        else:
+            res = request.evaluate(rules)
+            access_granted = (res == pyhbac.HBAC_EVAL_ALLOW)
+
+        return access_granted, matched_rules, notmatched_rules, error_rules
+
+    def execute(self, *args, **options):
+        rules, testrules = self._get_rules(options)
+
         # Check if there are unresolved rules left
         if len(testrules) > 0:
             # Error, unresolved rules are left in --rules
@@ -390,48 +515,10 @@ class hbactest(Command):
 
         if options['user'] != u'all':
             # check first if this is not a trusted domain user
-            if _dcerpc_bindings_installed:
-                is_valid_sid = ipaserver.dcerpc.is_sid_valid(options['user'])
-            else:
-                is_valid_sid = False
-            components = util.normalize_name(options['user'])
-            if is_valid_sid or 'domain' in components or 'flatname' in components:
+            if self._is_trusted_user(options['user']):
                 # this is a trusted domain user
-                if not _dcerpc_bindings_installed:
-                    raise errors.NotFound(reason=_(
-                        'Cannot perform external member validation without '
-                        'Samba 4 support installed. Make sure you have installed '
-                        'server-trust-ad sub-package of IPA on the server'))
-                domain_validator = ipaserver.dcerpc.DomainValidator(self.api)
-                if not domain_validator.is_configured():
-                    raise errors.NotFound(reason=_(
-                        'Cannot search in trusted domains without own domain configured. '
-                        'Make sure you have run ipa-adtrust-install on the IPA server first'))
-                user_sid, group_sids = domain_validator.get_trusted_domain_user_and_groups(options['user'])
-                request.user.name = user_sid
-
-                # Now search for all external groups that have this user or
-                # any of its groups in its external members. Found entires
-                # memberOf links will be then used to gather all groups where
-                # this group is assigned, including the nested ones
-                filter_sids = "(&(objectclass=ipaexternalgroup)(|(ipaExternalMember=%s)))" \
-                        % ")(ipaExternalMember=".join(group_sids + [user_sid])
-
-                ldap = self.api.Backend.ldap2
-                group_container = DN(api.env.container_group, api.env.basedn)
-                try:
-                    entries, _truncated = ldap.find_entries(
-                        filter_sids, ['memberof'], group_container)
-                except errors.NotFound:
-                    request.user.groups = []
-                else:
-                    groups = []
-                    for entry in entries:
-                        memberof_dns = entry.get('memberof', [])
-                        for memberof_dn in memberof_dns:
-                            if memberof_dn.endswith(group_container):
-                                groups.append(memberof_dn[0][0].value)
-                    request.user.groups = sorted(set(groups))
+                request.user.name, request.user.groups = (
+                    self._get_trusted_user(options['user']))
             else:
                 # try searching for a local user
                 try:
@@ -464,36 +551,11 @@ class hbactest(Command):
             except Exception:
                 pass
 
-        matched_rules = []
-        notmatched_rules = []
-        error_rules = []
+        access_granted, matched_rules, notmatched_rules, error_rules = (
+            self._evaluate(request, rules, options['nodetail']))
         warning_rules = []
 
         result = {'warning':None, 'matched':None, 'notmatched':None, 'error':None}
-        if not options['nodetail']:
-            # Validate runs rules one-by-one and reports failed ones
-            for ipa_rule in rules:
-                try:
-                    res = request.evaluate([ipa_rule])
-                    if res == pyhbac.HBAC_EVAL_ALLOW:
-                        matched_rules.append(ipa_rule.name)
-                    if res == pyhbac.HBAC_EVAL_DENY:
-                        notmatched_rules.append(ipa_rule.name)
-                except pyhbac.HbacError as e:
-                    code, rule_name = e.args
-                    if code == pyhbac.HBAC_EVAL_ERROR:
-                        error_rules.append(rule_name)
-                        logger.info('Native IPA HBAC rule "%s" parsing error: '
-                                    '%s',
-                                    rule_name, pyhbac.hbac_result_string(code))
-                except (TypeError, IOError) as info:
-                    logger.error('Native IPA HBAC module error: %s', info)
-
-            access_granted = len(matched_rules) > 0
-        else:
-            res = request.evaluate(rules)
-            access_granted = (res == pyhbac.HBAC_EVAL_ALLOW)
-
         result['summary'] = _('Access granted: %s') % (access_granted)
 
 
@@ -508,3 +570,163 @@ class hbactest(Command):
 
         result['value'] = access_granted
         return result
+
+
+@register()
+class hbactest_bulk(hbactest):
+    __doc__ = _('Simulate use of Host-based access controls for many requests')
+
+    has_output = (
+        output.summary,
+        output.ListOfEntries('result'),
+        output.Output('error', (list, tuple, type(None)), _('Non-existent or invalid rules')),
+        output.Output('count', int, _('Number of requests tested')),
+    )
+
+    has_output_params = (
+        Str('user', label=_('User name')),
+        Str('targethost', label=_('Target host')),
+        Str('service', label=_('Service')),
+        Flag('value', label=_('Access granted')),
+        Str('matched*', label=_('Matched rules')),
+        Str('notmatched*', label=_('Not matched rules')),
+        Str('error*', label=_('Non-existent or invalid rules')),
+    )
+
+    takes_options = (
+        Str('user+',
+            cli_name='user',
+            label=_('User name'),
+        ),
+        Str('targethost+',
+            cli_name='host',
+            label=_('Target host'),
+        ),
+        Str('service+',
+            cli_name='service',
+            label=_('Service'),
+        ),
+    ) + tuple(
+        option for option in hbactest.takes_options
+        if option.name not in ('user', 'sourcehost', 'targethost', 'service')
+    )
+
+    def _get_member_groups(self, names, container, attr, group_container):
+        """
+        Look up direct and indirect groups of many entries at once
+
+        Returns a dict mapping lower-cased values of attr to sorted lists of
+        names of groups located in group_container. Entries which do not
+        exist are left out.
+        """
+        ldap = self.api.Backend.ldap2
+        base_dn = DN(container, self.api.env.basedn)
+        group_dn = DN(group_container, self.api.env.basedn)
+        names = sorted(set(names))
+
+        groups = {}
+        for i in range(0, len(names), _BULK_FILTER_SIZE):
+            search_filter = ldap.make_filter_from_attr(
+                attr, names[i:i + _BULK_FILTER_SIZE])
+            for entry in ldap.iter_entries(
+                    search_filter, [attr, 'memberof'], base_dn,
+                    scope=ldap.SCOPE_ONELEVEL, time_limit=-1,
+                    size_limit=-1):
+                entry_groups = sorted(set(
+                    memberof_dn[0][0].value
+                    for memberof_dn in entry.get('memberof', [])
+                    if memberof_dn.endswith(group_dn)
+                ))
+                for value in entry.get(attr, []):
+                    groups[value.lower()] = entry_groups
+
+        return groups
+
+    def execute(self, *args, **options):
+        rules, testrules = self._get_rules(options)
+
+        # Check if there are unresolved rules left
+        if len(testrules) > 0:
+            return {'summary': unicode(_(u'Unresolved rules in --rules')),
+                    'result': [], 'error': testrules, 'count': 0}
+
+        # Resolve all requested users, hosts and services up front, each of
+        # them is then used in many requests
+        users = {}
+        local_users = []
+        for user in set(options['user']):
+            if user == u'all':
+                continue
+            if self._is_trusted_user(user):
+                users[user] = self._get_trusted_user(user)
+            else:
+                local_users.append(user)
+        if local_users:
+            user_groups = self._get_member_groups(
+                local_users, self.api.env.container_user, 'uid',
+                self.api.env.container_group)
+            for user in local_users:
+                users[user] = (user, user_groups.get(user.lower()))
+
+        hosts = {}
+        names = [self.canonicalize(h) for h in set(options['targethost'])
+                 if h != u'all']
+        if names:
+            host_groups = self._get_member_groups(
+                names, self.api.env.container_host, 'fqdn',
+                self.api.env.container_hostgroup)
+            for host in set(options['targethost']):
+                if host != u'all':
+                    name = self.canonicalize(host)
+                    hosts[host] = (name, host_groups.get(name.lower()))
+
+        services = {}
+        names = [s for s in set(options['service']) if s != u'all']
+        if names:
+            service_groups = self._get_member_groups(
+                names, self.api.env.container_hbacservice, 'cn',
+                self.api.env.container_hbacservicegroup)
+            for service in names:
+                services[service] = (service,
+                                     service_groups.get(service.lower()))
+
+        result = []
+        granted = 0
+        for user in options['user']:
+            for host in options['targethost']:
+                for service in options['service']:
+                    request = pyhbac.HbacRequest()
+                    for element, name in ((request.user, users.get(user)),
+                                          (request.targethost, hosts.get(host)),
+                                          (request.service, services.get(service))):
+                        if name is None:
+                            # 'all'
+                            continue
+                        element.name, groups = name
+                        if groups:
+                            element.groups = groups
+
+                    access_granted, matched_rules, notmatched_rules, \
+                        error_rules = self._evaluate(
+                            request, rules, options['nodetail'])
+                    if access_granted:
+                        granted += 1
+
+                    entry = {'user': user, 'targethost': host,
+                             'service': service, 'value': access_granted}
+                    if matched_rules:
+                        entry['matched'] = matched_rules
+                    if notmatched_rules:
+                        entry['notmatched'] = notmatched_rules
+                    if error_rules:
+                        entry['error'] = error_rules
+                    result.append(entry)
+
+        return {
+            'summary': unicode(
+                _('%(granted)d of %(count)d requests granted access') % dict(
+                    granted=granted, count=len(result))),
+            'result': result,
+            'error': None,
+            'count': len(result),
+        }
@@ -31,18 +31,21 @@ from __future__ import absolute_import
 
 import logging
 import os
+import threading
+import time
 
 import ldap as _ldap
+from six.moves import queue
 
 from ipalib import krb_utils
 from ipaplatform.paths import paths
 from ipapython.dn import DN
 from ipapython.ipaldap import (LDAPClient, AUTOBIND_AUTO, AUTOBIND_ENABLED,
-                               AUTOBIND_DISABLED)
+                               AUTOBIND_DISABLED, schema_cache)
 
 from ipalib import Registry, errors, _
 from ipalib.crud import CrudBackend
-from ipalib.request import context
+from ipalib.request import context, destroy_context
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +54,224 @@ register = Registry()
 _missing = object()
 
 
+class LDAPConnectionPool:
+    """
+    Per-process pool of bound LDAP connections.
+
+    Connections are keyed by ``(principal, ccache, ldap_uri)`` so that a
+    connection bound with the credentials of one principal is never handed
+    out to a request authenticated as somebody else. Idle connections are
+    dropped after *idle_timeout* seconds, the least recently used
+    connection is evicted when the pool holds *max_size* idle connections,
+    and connections idle for longer than *check_interval* seconds are
+    verified with a Who Am I? extended operation before reuse.
+    """
+
+    def __init__(self, max_size, idle_timeout, check_interval):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        # idle connections, least recently used first: [key, conn, last_used]
+        self._idle = []
+        # id(conn) -> key of connections currently lent to a request
+        self._borrowed = {}
+        self._stats = dict.fromkeys(
+            ('hits', 'misses', 'released', 'evicted', 'expired',
+             'failed_checks'), 0)
+
+    def _expire(self, now):
+        alive = []
+        for item in self._idle:
+            if now - item[2] > self.idle_timeout:
+                self._stats['expired'] += 1
+                self._close(item[1])
+            else:
+                alive.append(item)
+        self._idle = alive
+
+    def _close(self, conn):
+        try:
+            conn.unbind_s()
+        except _ldap.LDAPError:
+            pass
+
+    def _check(self, conn):
+        try:
+            conn.whoami_s()
+        except _ldap.LDAPError as e:
+            logger.debug('Pooled LDAP connection failed check: %s', e)
+            return False
+        return True
+
+    def acquire(self, key):
+        """
+        Borrow an idle connection bound for *key*, or return ``None``.
+        """
+        now = time.time()
+        while True:
+            with self._lock:
+                self._expire(now)
+                for i in range(len(self._idle) - 1, -1, -1):
+                    if self._idle[i][0] == key:
+                        _key, conn, last_used = self._idle.pop(i)
+                        break
+                else:
+                    self._stats['misses'] += 1
+                    return None
+
+            if (now - last_used > self.check_interval and
+                    not self._check(conn)):
+                with self._lock:
+                    self._stats['failed_checks'] += 1
+                self._close(conn)
+                continue
+
+            with self._lock:
+                self._stats['hits'] += 1
+                self._borrowed[id(conn)] = key
+            return conn
+
+    def register(self, key, conn):
+        """
+        Mark a freshly bound connection as lent out for *key*.
+        """
+        with self._lock:
+            self._borrowed[id(conn)] = key
+
+    def release(self, conn):
+        """
+        Return a borrowed connection to the pool.
+
+        Returns ``False`` if *conn* was not borrowed from this pool, in
+        which case the caller remains responsible for unbinding it.
+        """
+        evicted = []
+        with self._lock:
+            key = self._borrowed.pop(id(conn), None)
+            if key is None:
+                return False
+            self._stats['released'] += 1
+            self._idle.append([key, conn, time.time()])
+            while len(self._idle) > self.max_size:
+                evicted.append(self._idle.pop(0)[1])
+                self._stats['evicted'] += 1
+
+        for old_conn in evicted:
+            self._close(old_conn)
+        return True
+
+    def discard(self, conn):
+        """
+        Forget a borrowed connection without returning it to the pool.
+        """
+        with self._lock:
+            self._borrowed.pop(id(conn), None)
+
+    def clear(self):
+        """
+        Unbind and drop all idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for item in idle:
+            self._close(item[1])
+
+    def stats(self):
+        """
+        Return a snapshot of the pool counters.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+            stats['borrowed'] = len(self._borrowed)
+        return stats
+
+
+class LDAPWorkerPool:
+    """
+    Pool of threads processing work items with their own ldap2 connections.
+
+    The threads inherit the request attributes of the calling thread's
+    context and connect the ldap2 backend with its credentials cache.
+    Items put into the pool are passed to process(*item) or, if the thread
+    failed to connect, to fail(error, *item). The first exception raised
+    by these callbacks is re-raised by put() and join(), the remaining
+    items are dropped.
+    """
+    # context attributes propagated to the worker threads
+    context_attrs = ('principal', 'languages', 'ccache_name', 'client_ip')
+
+    def __init__(self, api, num_workers, process, fail, max_pending=0):
+        self._api = api
+        self._process = process
+        self._fail = fail
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._error = None
+        self._state = {
+            name: getattr(context, name)
+            for name in self.context_attrs if hasattr(context, name)
+        }
+        self._ccache = os.environ.get('KRB5CCNAME')
+        self._threads = [threading.Thread(target=self._run)
+                         for _i in range(num_workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self):
+        for name, value in self._state.items():
+            setattr(context, name, value)
+        try:
+            try:
+                self._api.Backend.ldap2.connect(
+                    ccache=self._ccache, size_limit=None, time_limit=None,
+                    pooled=True)
+            except Exception as e:
+                logger.error('LDAP worker failed to connect: %s', e)
+                error = e
+            else:
+                error = None
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                if self._error is not None:
+                    continue
+                try:
+                    if error is not None:
+                        self._fail(error, *item)
+                    else:
+                        self._process(*item)
+                except BaseException as e:
+                    with self._lock:
+                        if self._error is None:
+                            self._error = e
+        finally:
+            destroy_context()
+
+    def _check_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def put(self, *item):
+        """
+        Queue an item, block while *max_pending* items are queued.
+        """
+        self._check_error()
+        self._queue.put(item)
+
+    def join(self):
+        """
+        Wait until all queued items are processed and stop the threads.
+        """
+        for _thread in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._check_error()
+
+
 @register()
 class ldap2(CrudBackend, LDAPClient):
     """
@@ -64,9 +285,29 @@ class ldap2(CrudBackend, LDAPClient):
         LDAPClient.__init__(self, None,
                             force_schema_updates=force_schema_updates)
 
+        if api.env.in_server:
+            # server processes may run as a user without a writable home
+            # directory (ipaapi), keep the schema cache in a directory owned
+            # by the server, one subdirectory per user
+            schema_cache.cache_dir = os.path.join(
+                paths.IPA_LDAP_SCHEMA_CACHE_DIR, str(os.geteuid()))
+
         self._time_limit = float(LDAPClient.time_limit)
         self._size_limit = int(LDAPClient.size_limit)
 
+        if api.env.ldap_pool_size > 0:
+            self._pool = LDAPConnectionPool(
+                api.env.ldap_pool_size,
+                api.env.ldap_pool_idle_timeout,
+                api.env.ldap_pool_check_interval)
+        else:
+            self._pool = None
+
+    @property
+    def pool(self):
+        """Connection pool of this backend, ``None`` if disabled."""
+        return self._pool
+
     @property
     def ldap_uri(self):
         return self.api.env.ldap_uri
@@ -120,7 +361,7 @@ class ldap2(CrudBackend, LDAPClient):
     def create_connection(
             self, ccache=None, bind_dn=None, bind_pw='', cacert=None,
             autobind=AUTOBIND_AUTO, serverctrls=None, clientctrls=None,
-            time_limit=_missing, size_limit=_missing):
+            time_limit=_missing, size_limit=_missing, pooled=False):
         """
         Connect to LDAP server.
 
@@ -138,6 +379,9 @@ class ldap2(CrudBackend, LDAPClient):
                 - None - reads value from ipaconfig
                 - _missing - keeps previously configured settings
                              (unlimited set by default in constructor)
+        pooled -- borrow a GSSAPI bound connection from the connection pool
+            if pooling is enabled, the connection is returned to the pool
+            by destroy_connection()
 
         Extends backend.Connectible.create_connection.
         """
@@ -153,6 +397,24 @@ class ldap2(CrudBackend, LDAPClient):
         if size_limit is not _missing:
             object.__setattr__(self, 'size_limit', size_limit)
 
+        ldapi = self.ldap_uri.startswith('ldapi://')
+
+        pool_key = None
+        if (pooled and self._pool is not None and not bind_pw and
+                not serverctrls and not clientctrls and
+                not (autobind != AUTOBIND_DISABLED and
+                     os.getegid() == 0 and ldapi)):
+            if ccache is None:
+                os.environ.pop('KRB5CCNAME', None)
+            else:
+                os.environ['KRB5CCNAME'] = ccache
+            principal = krb_utils.get_principal(ccache_name=ccache)
+            pool_key = (principal, ccache, self.ldap_uri)
+            conn = self._pool.acquire(pool_key)
+            if conn is not None:
+                setattr(context, 'principal', principal)
+                return conn
+
         client = LDAPClient(self.ldap_uri,
                             force_schema_updates=self._force_schema_updates,
                             cacert=cacert)
@@ -169,8 +431,6 @@ class ldap2(CrudBackend, LDAPClient):
                 if maxssf < minssf:
                     conn.set_option(_ldap.OPT_X_SASL_SSF_MAX, minssf)
 
-        ldapi = self.ldap_uri.startswith('ldapi://')
-
         if bind_pw:
             client.simple_bind(bind_dn, bind_pw,
                                server_controls=serverctrls,
@@ -199,12 +459,19 @@ class ldap2(CrudBackend, LDAPClient):
                                client_controls=clientctrls)
             setattr(context, 'principal', principal)
 
+            if pool_key is not None:
+                self._pool.register(pool_key, conn)
+
         return conn
 
     def destroy_connection(self):
-        """Disconnect from LDAP server."""
+        """Disconnect from LDAP server.
+
+        Pooled connections are returned to the pool instead of unbound.
+        """
         try:
-            if self.conn is not None:
+            if self.conn is not None and (
+                    self._pool is None or not self._pool.release(self.conn)):
                 self.unbind()
         except errors.PublicError:
             # ignore when trying to unbind multiple times
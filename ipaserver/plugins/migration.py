@@ -19,8 +19,13 @@
 
 from __future__ import absolute_import
 
+import errno
+import hashlib
+import io
 import logging
+import os
 import re
+import threading
 from ldap import MOD_ADD
 from ldap import SCOPE_BASE, SCOPE_ONELEVEL, SCOPE_SUBTREE
 
@@ -30,6 +35,7 @@ from ipalib import api, errors, output
 from ipalib import Command, Password, Str, Flag, StrEnum, DNParam, Bool
 from ipalib.cli import to_cli
 from ipalib.plugable import Registry
+from ipaserver.plugins.ldap2 import LDAPWorkerPool
 from ipaserver.plugins.user import NO_UPG_MAGIC
 from ipalib import _
 from ipapython.dn import DN
@@ -120,6 +126,10 @@ EXAMPLES:
        --user-ignore-attribute=radiusgroupname \\
        ldap://ds.example.com:389
 
+ Every migrated object is recorded on the IPA server. If the migration is
+ interrupted, it can be resumed without processing these objects again:
+    ipa migrate-ds --resume ldap://ds.example.com:389
+
 LOGGING
 
 Migration will log warnings and errors to the Apache error log. This
@@ -154,6 +164,15 @@ _supported_schemas = (u'RFC2307bis', u'RFC2307')
 _supported_scopes = {u'base': SCOPE_BASE, u'onelevel': SCOPE_ONELEVEL, u'subtree': SCOPE_SUBTREE}
 _default_scope = u'onelevel'
 
+# Directory of logs of objects migrated by interrupted migrations
+MIGRATION_STATE_DIR = paths.IPA_MIGRATION_STATE_DIR
+
+# Maximum number of entries retrieved from DS waiting to be added to IPA
+_MAX_PENDING_ENTRIES = 1000
+
+# Serializes updates of the default group of migrated users
+_default_group_lock = threading.Lock()
+
 
 def _create_kerberos_principals(ldap, pkey, entry_attrs, failed):
     """
@@ -186,6 +205,7 @@ def _pre_migrate_user(ldap, pkey, dn, entry_attrs, failed, config, ctx, **kwargs
     attr_blacklist = ['krbprincipalkey','memberofindirect','memberindirect']
     attr_blacklist.extend(kwargs.get('attr_blacklist', []))
     ds_ldap = ctx['ds_ldap']
+    remote_entries = ctx['remote_entries']
     search_bases = kwargs.get('search_bases', None)
     valid_gids = kwargs['valid_gids']
     invalid_gids = kwargs['invalid_gids']
@@ -273,9 +293,17 @@ def _pre_migrate_user(ldap, pkey, dn, entry_attrs, failed, config, ctx, **kwargs
                                        'could not be converted to DN: %s',
                                        pkey, value, type(value), attr, e)
                         continue
+                # many users usually refer to the same entries (e.g. the
+                # manager), look each of them up only once
                 try:
-                    remote_entry = ds_ldap.get_entry(value, [api.Object.user.primary_key.name, api.Object.group.primary_key.name])
-                except errors.NotFound:
+                    remote_entry = remote_entries[value]
+                except KeyError:
+                    try:
+                        remote_entry = ds_ldap.get_entry(value, [api.Object.user.primary_key.name, api.Object.group.primary_key.name])
+                    except errors.NotFound:
+                        remote_entry = None
+                    remote_entries[value] = remote_entry
+                if remote_entry is None:
                     logger.warning('%s: attribute %s refers to non-existent '
                                    'entry %s', pkey, attr, value)
                     continue
@@ -321,35 +349,41 @@ def _post_migrate_user(ldap, pkey, dn, entry_attrs, failed, config, ctx):
 
 def _update_default_group(ldap, ctx, force):
     migrate_cnt = ctx['migrate_cnt']
-    group_dn = ctx['def_group_dn']
 
     # Purposely let this fire when migrate_cnt == 0 so on re-running migration
     # it can catch any users migrated but not added to the default group.
     if force or migrate_cnt % 100 == 0:
-        s = datetime.datetime.now()
-        searchfilter = "(&(objectclass=posixAccount)(!(memberof=%s)))" % group_dn
-        try:
-            result, _truncated = ldap.find_entries(
-                searchfilter, [''], DN(api.env.container_user, api.env.basedn),
-                scope=ldap.SCOPE_SUBTREE, time_limit=-1, size_limit=-1)
-        except errors.NotFound:
-            logger.debug('All users have default group set')
-            return
-
-        member_dns = [m.dn for m in result]
-        modlist = [(MOD_ADD, 'member', ldap.encode(member_dns))]
-        try:
-            with ldap.error_handler():
-                ldap.conn.modify_s(str(group_dn), modlist)
-        except errors.DatabaseError as e:
-            logger.error('Adding new members to default group failed: %s \n'
-                         'members: %s', e, ','.join(member_dns))
-
-        e = datetime.datetime.now()
-        d = e - s
-        mode = " (forced)" if force else ""
-        logger.info('Adding %d users to group%s duration %s',
-                    len(member_dns), mode, d)
+        # users are added by several worker threads, adding the same
+        # members concurrently would fail
+        with _default_group_lock:
+            _add_default_group_members(ldap, ctx['def_group_dn'], force)
+
+
+def _add_default_group_members(ldap, group_dn, force):
+    s = datetime.datetime.now()
+    searchfilter = "(&(objectclass=posixAccount)(!(memberof=%s)))" % group_dn
+    member_dns = [
+        m.dn for m in ldap.iter_entries(
+            searchfilter, [''], DN(api.env.container_user, api.env.basedn),
+            scope=ldap.SCOPE_SUBTREE, time_limit=-1, size_limit=-1)
+    ]
+    if not member_dns:
+        logger.debug('All users have default group set')
+        return
+
+    modlist = [(MOD_ADD, 'member', ldap.encode(member_dns))]
+    try:
+        with ldap.error_handler():
+            ldap.conn.modify_s(str(group_dn), modlist)
+    except errors.DatabaseError as e:
+        logger.error('Adding new members to default group failed: %s \n'
+                     'members: %s', e, ','.join(member_dns))
+
+    e = datetime.datetime.now()
+    d = e - s
+    mode = " (forced)" if force else ""
+    logger.info('Adding %d users to group%s duration %s',
+                len(member_dns), mode, d)
 
 # GROUP MIGRATION CALLBACKS AND VARS
 
@@ -464,6 +498,80 @@ def _group_exc_callback(ldap, dn, entry_attrs, exc, options):
 
     raise exc
 
+class MigrationCheckpoint:
+    """
+    Log of objects already migrated from a DS
+
+    Each migrated object is appended to a state file as soon as it is added
+    to IPA, so that an interrupted migration can be resumed without
+    processing these objects again. If the state file cannot be used, the
+    migration runs without it and cannot be resumed.
+    """
+    def __init__(self, ldapuri, ds_base_dn, resume=False):
+        key = u'{}\n{}'.format(ldapuri, ds_base_dn).encode('utf-8')
+        self.filename = os.path.join(
+            MIGRATION_STATE_DIR, hashlib.sha256(key).hexdigest())
+        self._done = set()
+        self._lock = threading.Lock()
+        self._file = None
+
+        try:
+            if resume:
+                self._read()
+
+            try:
+                os.makedirs(MIGRATION_STATE_DIR)
+            except EnvironmentError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            self._file = io.open(
+                self.filename, 'a' if resume else 'w', encoding='utf-8')
+        except EnvironmentError as e:
+            logger.warning(
+                'Cannot store migration state in %s, an interrupted '
+                'migration will not be resumable: %s', self.filename, e)
+
+    def _read(self):
+        try:
+            with io.open(self.filename, 'rb') as f:
+                data = f.read()
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return
+
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            # drop a record the interrupted migration did not finish writing
+            with io.open(self.filename, 'r+b') as f:
+                f.truncate(end)
+
+        for line in data[:end].decode('utf-8').splitlines():
+            ldap_obj_name, _sep, pkey = line.partition(u'\t')
+            if pkey:
+                self._done.add((ldap_obj_name, pkey))
+
+    def __contains__(self, item):
+        return item in self._done
+
+    def __len__(self):
+        return len(self._done)
+
+    def add(self, ldap_obj_name, pkey):
+        if self._file is None:
+            return
+        with self._lock:
+            self._file.write(u'{}\t{}\n'.format(ldap_obj_name, pkey))
+            self._file.flush()
+
+    def close(self, remove=False):
+        if self._file is None:
+            return
+        self._file.close()
+        if remove:
+            os.unlink(self.filename)
+
+
 # DS MIGRATION PLUGIN
 
 def construct_filter(template, oc_list):
@@ -619,6 +727,12 @@ class migrate_ds(Command):
             doc=_('Continuous operation mode. Errors are reported but the process continues'),
             default=False,
         ),
+        Flag('resume?',
+            label=_('Resume'),
+            doc=_('Resume an interrupted migration. Objects migrated by the '
+                  'previous run are skipped and not reported again'),
+            default=False,
+        ),
         DNParam('basedn?',
             cli_name='base_dn',
             label=_('Base DN'),
@@ -732,15 +846,24 @@ migration process might be incomplete\n''')
             search_bases[ldap_obj_name] = search_base
         return search_bases
 
-    def migrate(self, ldap, config, ds_ldap, ds_base_dn, options):
+    def migrate(self, ldap, config, ds_ldap, ds_base_dn, options,
+                checkpoint=None):
         """
         Migrate objects from DS to LDAP.
+
+        Entries are read from DS with a paged search and added to IPA by
+        a pool of worker threads. Objects found in checkpoint are skipped,
+        migrated objects are recorded in it.
         """
         assert isinstance(ds_base_dn, DN)
         migrated = {} # {'OBJ': ['PKEY1', 'PKEY2', ...], ...}
         failed = {} # {'OBJ': {'PKEY1': 'Failed 'cos blabla', ...}, ...}
         search_bases = self._get_search_bases(options, ds_base_dn, self.migrate_order)
         migration_start = datetime.datetime.now()
+        lock = threading.Lock()
+        # remote entries referred to by migrated entries, shared by all
+        # object types
+        remote_entries = {}
 
         scope = _supported_scopes[options.get('scope')]
 
@@ -752,36 +875,11 @@ migration process might be incomplete\n''')
             search_filter = construct_filter(template, oc_list)
 
             exclude = options['exclude_%ss' % to_cli(ldap_obj_name)]
-            context = dict(ds_ldap = ds_ldap)
+            ctx = dict(ds_ldap=ds_ldap, remote_entries=remote_entries)
 
             migrated[ldap_obj_name] = []
             failed[ldap_obj_name] = {}
 
-            try:
-                entries, truncated = ds_ldap.find_entries(
-                    search_filter, ['*'], search_bases[ldap_obj_name],
-                    scope,
-                    time_limit=0, size_limit=-1
-                )
-            except errors.NotFound:
-                if not options.get('continue',False):
-                    raise errors.NotFound(
-                        reason=_('%(container)s LDAP search did not return any result '
-                                 '(search base: %(search_base)s, '
-                                 'objectclass: %(objectclass)s)')
-                                 % {'container': ldap_obj_name,
-                                    'search_base': search_bases[ldap_obj_name],
-                                    'objectclass': ', '.join(oc_list)}
-                    )
-                else:
-                    truncated = False
-                    entries = []
-            if truncated:
-                logger.error(
-                    '%s: %s',
-                    ldap_obj.name, self.truncated_err_msg
-                )
-
             blacklists = {}
             for blacklist in ('oc_blacklist', 'attr_blacklist'):
                 blacklist_option = self.migrate_objects[ldap_obj_name][blacklist+'_option']
@@ -791,65 +889,26 @@ migration process might be incomplete\n''')
                     blacklists[blacklist] = tuple()
 
             # get default primary group for new users
-            if 'def_group_dn' not in context and options.get('use_def_group'):
+            if 'def_group_dn' not in ctx and options.get('use_def_group'):
                 def_group = config.get('ipadefaultprimarygroup')
-                context['def_group_dn'] = api.Object.group.get_dn(def_group)
+                ctx['def_group_dn'] = api.Object.group.get_dn(def_group)
                 try:
-                    ldap.get_entry(context['def_group_dn'], ['gidnumber', 'cn'])
+                    ldap.get_entry(ctx['def_group_dn'], ['gidnumber', 'cn'])
                 except errors.NotFound:
                     error_msg = _('Default group for new users not found')
                     raise errors.NotFound(reason=error_msg)
 
-            context['has_upg'] = ldap.has_upg()
+            ctx['has_upg'] = ldap.has_upg()
 
             valid_gids = set()
             invalid_gids = set()
-            migrate_cnt = 0
-            context['migrate_cnt'] = 0
-            for entry_attrs in entries:
-                context['migrate_cnt'] = migrate_cnt
-                s = datetime.datetime.now()
-
-                ava = entry_attrs.dn[0][0]
-                if ava.attr == ldap_obj.primary_key.name:
-                    # In case if pkey attribute is in the migrated object DN
-                    # and the original LDAP is multivalued, make sure that
-                    # we pick the correct value (the unique one stored in DN)
-                    pkey = ava.value.lower()
-                else:
-                    pkey = entry_attrs[ldap_obj.primary_key.name][0].lower()
-
-                if pkey in exclude:
-                    continue
-
-                entry_attrs.dn = ldap_obj.get_dn(pkey)
-                entry_attrs['objectclass'] = list(
-                    set(
-                        config.get(
-                            ldap_obj.object_class_config, ldap_obj.object_class
-                        ) + [o.lower() for o in entry_attrs['objectclass']]
-                    )
-                )
-                entry_attrs[ldap_obj.primary_key.name][0] = entry_attrs[ldap_obj.primary_key.name][0].lower()
-
-                callback = self.migrate_objects[ldap_obj_name]['pre_callback']
-                if callable(callback):
-                    try:
-                        entry_attrs.dn = callback(
-                            ldap, pkey, entry_attrs.dn, entry_attrs,
-                            failed[ldap_obj_name], config, context,
-                            schema=options['schema'],
-                            search_bases=search_bases,
-                            valid_gids=valid_gids,
-                            invalid_gids=invalid_gids,
-                            **blacklists
-                        )
-                        if not entry_attrs.dn:
-                            continue
-                    except errors.NotFound as e:
-                        failed[ldap_obj_name][pkey] = unicode(e.reason)
-                        continue
+            ctx['migrate_cnt'] = 0
 
+            # entries of an object type are all added before the loop
+            # proceeds to the next one
+            # pylint: disable=cell-var-from-loop
+            def add_entry(ldap, pkey, entry_attrs):
+                s = datetime.datetime.now()
                 try:
                     ldap.add_entry(entry_attrs)
                 except errors.ExecutionError as e:
@@ -860,18 +919,23 @@ migration process might be incomplete\n''')
                                 ldap, entry_attrs.dn, entry_attrs, e, options)
                         except errors.ExecutionError as e2:
                             failed[ldap_obj_name][pkey] = unicode(e2)
-                            continue
+                            return
                     else:
                         failed[ldap_obj_name][pkey] = unicode(e)
-                        continue
+                        return
 
-                migrated[ldap_obj_name].append(pkey)
+                with lock:
+                    migrate_cnt = len(migrated[ldap_obj_name])
+                    migrated[ldap_obj_name].append(pkey)
+                if checkpoint is not None:
+                    checkpoint.add(ldap_obj_name, pkey)
 
                 callback = self.migrate_objects[ldap_obj_name]['post_callback']
                 if callable(callback):
                     callback(
                         ldap, pkey, entry_attrs.dn, entry_attrs,
-                        failed[ldap_obj_name], config, context)
+                        failed[ldap_obj_name], config,
+                        dict(ctx, migrate_cnt=migrate_cnt))
                 e = datetime.datetime.now()
                 d = e - s
                 total_dur = e - migration_start
@@ -882,8 +946,106 @@ migration process might be incomplete\n''')
                 logger.debug("%d %ss migrated, duration: %s (total %s)",
                              migrate_cnt, ldap_obj_name, d, total_dur)
 
-        if 'def_group_dn' in context:
-            _update_default_group(ldap, context, True)
+            def add_failed(error, pkey, entry_attrs):
+                failed[ldap_obj_name][pkey] = unicode(error)
+
+            def process(pkey, entry_attrs):
+                try:
+                    add_entry(self.api.Backend.ldap2, pkey, entry_attrs)
+                except errors.ExecutionError as e:
+                    logger.exception('migrate-ds: failed to add entry %s',
+                                     pkey)
+                    add_failed(e, pkey, entry_attrs)
+            # pylint: enable=cell-var-from-loop
+
+            workers = None
+            if self.api.env.migrate_max_workers > 1:
+                workers = LDAPWorkerPool(
+                    self.api, self.api.env.migrate_max_workers,
+                    process, add_failed, max_pending=_MAX_PENDING_ENTRIES)
+
+            entries = ds_ldap.iter_entries(
+                search_filter, ['*'], search_bases[ldap_obj_name],
+                scope,
+                time_limit=0, size_limit=-1
+            )
+            found = False
+            try:
+                for entry_attrs in entries:
+                    found = True
+
+                    ava = entry_attrs.dn[0][0]
+                    if ava.attr == ldap_obj.primary_key.name:
+                        # In case if pkey attribute is in the migrated object DN
+                        # and the original LDAP is multivalued, make sure that
+                        # we pick the correct value (the unique one stored in DN)
+                        pkey = ava.value.lower()
+                    else:
+                        pkey = entry_attrs[ldap_obj.primary_key.name][0].lower()
+
+                    if pkey in exclude:
+                        continue
+                    if checkpoint is not None and \
+                       (ldap_obj_name, pkey) in checkpoint:
+                        continue
+
+                    entry_attrs.dn = ldap_obj.get_dn(pkey)
+                    entry_attrs['objectclass'] = list(
+                        set(
+                            config.get(
+                                ldap_obj.object_class_config, ldap_obj.object_class
+                            ) + [o.lower() for o in entry_attrs['objectclass']]
+                        )
+                    )
+                    entry_attrs[ldap_obj.primary_key.name][0] = entry_attrs[ldap_obj.primary_key.name][0].lower()
+
+                    callback = self.migrate_objects[ldap_obj_name]['pre_callback']
+                    if callable(callback):
+                        try:
+                            entry_attrs.dn = callback(
+                                ldap, pkey, entry_attrs.dn, entry_attrs,
+                                failed[ldap_obj_name], config, ctx,
+                                schema=options['schema'],
+                                search_bases=search_bases,
+                                valid_gids=valid_gids,
+                                invalid_gids=invalid_gids,
+                                **blacklists
+                            )
+                            if not entry_attrs.dn:
+                                continue
+                        except errors.NotFound as e:
+                            failed[ldap_obj_name][pkey] = unicode(e.reason)
+                            continue
+
+                    if workers is not None:
+                        workers.put(pkey, entry_attrs)
+                    else:
+                        add_entry(ldap, pkey, entry_attrs)
+            except errors.LimitsExceeded:
+                logger.error(
+                    '%s: %s',
+                    ldap_obj.name, self.truncated_err_msg
+                )
+            except errors.NotFound:
+                if found:
+                    raise
+                # the search base does not exist
+            finally:
+                if workers is not None:
+                    workers.join()
+
+            if not found and not options.get('continue',False):
+                raise errors.NotFound(
+                    reason=_('%(container)s LDAP search did not return any result '
+                             '(search base: %(search_base)s, '
+                             'objectclass: %(objectclass)s)')
+                             % {'container': ldap_obj_name,
+                                'search_base': search_bases[ldap_obj_name],
+                                'objectclass': ', '.join(oc_list)}
+                )
+
+        if 'def_group_dn' in ctx:
+            _update_default_group(ldap, ctx, True)
 
         return (migrated, failed)
 
@@ -939,9 +1101,20 @@ migration process might be incomplete\n''')
                 except (IndexError, KeyError) as e:
                     raise Exception(str(e))
 
+        checkpoint = MigrationCheckpoint(
+            ldapuri, ds_base_dn, resume=options.get('resume', False))
+        if len(checkpoint):
+            logger.info('Resuming migration, skipping %d migrated objects',
+                        len(checkpoint))
+
         # migrate!
-        (migrated, failed) = self.migrate(
-            ldap, config, ds_ldap, ds_base_dn, options
-        )
+        try:
+            (migrated, failed) = self.migrate(
+                ldap, config, ds_ldap, ds_base_dn, options, checkpoint
+            )
+        except Exception:
+            checkpoint.close()
+            raise
+        checkpoint.close(remove=True)
 
         return dict(result=migrated, failed=failed, enabled=True, compat=True)
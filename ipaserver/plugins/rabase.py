@@ -25,6 +25,7 @@ certificates via the following methods:
 
     * `ra.check_request_status()` - check certificate request status.
     * `ra.get_certificate()` - retrieve an existing certificate.
+    * `ra.get_certificates()` - retrieve several existing certificates.
     * `ra.request_certificate()` - request a new certificate.
     * `ra.revoke_certificate()` - revoke a certificate.
     * `ra.take_certificate_off_hold()` - take a certificate off hold.
@@ -69,6 +70,19 @@ class rabase(Backend):
         """
         raise errors.NotImplementedError(name='%s.get_certificate' % self.name)
 
+    def get_certificates(self, serial_numbers, max_workers=1):
+        """
+        Retrieve existing certificates.
+
+        :param serial_numbers: certificate serial numbers
+        :param max_workers: maximum number of concurrent requests
+
+        Return a dict mapping each serial number to the result of
+        `get_certificate()`.
+        """
+        return {serial_number: self.get_certificate(serial_number)
+                for serial_number in serial_numbers}
+
     def request_certificate(
             self, csr, profile_id, ca_id, request_type='pkcs10'):
         """
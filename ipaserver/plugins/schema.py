@@ -2,9 +2,14 @@
 # Copyright (C) 2016  FreeIPA Contributors see COPYING for license
 #
 
+import gzip
 import importlib
 import itertools
+import json
+import logging
+import os
 import sys
+import tempfile
 
 import six
 import hashlib
@@ -18,7 +23,8 @@ from ipalib.parameters import Bool, Dict, Flag, Str
 from ipalib.plugable import Registry
 from ipalib.request import context
 from ipalib.text import _
-from ipapython.version import API_VERSION
+from ipaplatform.paths import paths
+from ipapython.version import API_VERSION, VERSION
 
 # Schema TTL sent to clients in response to schema call.
 # Number of seconds before client should check for schema update.
@@ -27,6 +33,12 @@ from ipapython.version import API_VERSION
 # it was updated
 SCHEMA_TTL = 3600  # default: 1 hour
 
+# Directory of generated schemas shared by all processes of the same user
+SCHEMA_CACHE_DIR = os.path.join(
+    paths.IPA_API_SCHEMA_CACHE_DIR, str(os.geteuid()))
+
+logger = logging.getLogger(__name__)
+
 __doc__ = _("""
 API Schema
 """) + _("""
@@ -835,20 +847,105 @@ class schema(Command):
 
         return schema
 
-    def execute(self, *args, **kwargs):
-        langs = "".join(getattr(context, "languages", []))
+    def _get_cache_path(self, langs):
+        """
+        Return the path of the stored schema for the given languages.
 
+        The file name depends on the IPA version and on the commands with
+        their topics, parameters and outputs and on the classes with their
+        parameters, so a schema stored before an upgrade or before a plugin
+        was added or changed is never used.
+        """
+        key = hashlib.sha1()
+        for value in (VERSION, API_VERSION, langs):
+            key.update(value.encode('utf-8'))
+        for command in sorted(self.api.Command(), key=lambda c: c.full_name):
+            key.update(command.full_name.encode('utf-8'))
+            key.update(repr(command.topic).encode('utf-8'))
+            for item in itertools.chain(
+                    command.args(), command.options(), command.output()):
+                key.update(repr(item).encode('utf-8'))
+        for obj in sorted(self.api.Object(), key=lambda o: o.full_name):
+            key.update(obj.full_name.encode('utf-8'))
+            for param in obj.params():
+                key.update(repr(param).encode('utf-8'))
+        return os.path.join(
+            SCHEMA_CACHE_DIR, '{}.json.gz'.format(key.hexdigest()))
+
+    def _read_schema(self, path):
+        try:
+            with gzip.open(path, 'rb') as f:
+                return json.loads(f.read().decode('utf-8'))
+        except EnvironmentError as e:
+            if not os.path.exists(path):
+                return None
+            logger.debug('Failed to read schema from %s: %s', path, e)
+        except ValueError as e:
+            logger.debug('Failed to load schema from %s: %s', path, e)
+        return None
+
+    def _write_schema(self, path, schema):
+        try:
+            data = json.dumps(schema).encode('utf-8')
+        except (TypeError, ValueError) as e:
+            logger.error('Failed to serialize schema: %s', e)
+            return
+        try:
+            os.makedirs(SCHEMA_CACHE_DIR, mode=0o700, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                    'wb', dir=SCHEMA_CACHE_DIR, delete=False) as f:
+                try:
+                    with gzip.GzipFile(fileobj=f, mode='wb') as gz:
+                        gz.write(data)
+                    f.close()
+                except Exception:
+                    os.unlink(f.name)
+                    raise
+                else:
+                    os.rename(f.name, path)
+        except EnvironmentError as e:
+            logger.warning('Failed to store schema in %s: %s', path, e)
+
+    def get_schema(self, langs, **kwargs):
+        """
+        Return the schema for the given languages.
+
+        The schema is generated only once per user and set of plugins, then
+        it is stored gzip compressed in SCHEMA_CACHE_DIR and loaded from there
+        by other processes.
+        """
         if getattr(self.api, "_schema", None) is None:
             setattr(self.api, "_schema", {})
 
         schema = self.api._schema.get(langs)
         if schema is None:
-            schema = self._generate_schema(**kwargs)
+            path = self._get_cache_path(langs)
+            schema = self._read_schema(path)
+            if schema is None:
+                schema = self._generate_schema(**kwargs)
+                self._write_schema(path, schema)
             self.api._schema[langs] = schema
 
+        return schema
+
+    def execute(self, *args, **kwargs):
+        langs = "".join(getattr(context, "languages", []))
+
+        schema = self.get_schema(langs, **kwargs)
+
         schema['ttl'] = SCHEMA_TTL
 
-        if schema['fingerprint'] in kwargs.get('known_fingerprints', []):
+        # if called directly over HTTP, let the transport return the
+        # fingerprint as ETag and answer conditional requests with 304 Not
+        # Modified
+        if_none_match = getattr(context, 'if_none_match', None)
+        if if_none_match is not None:
+            context.etag = schema['fingerprint']
+            if schema['fingerprint'] in if_none_match:
+                context.not_modified = True
+
+        if (schema['fingerprint'] in kwargs.get('known_fingerprints', []) or
+                getattr(context, 'not_modified', False)):
             raise errors.SchemaUpToDate(
                 fingerprint=schema['fingerprint'],
                 ttl=schema['ttl'],
@@ -28,6 +28,7 @@ from ipaplatform import services
 from ipapython.dn import DN
 from ipapython.dnsutil import DNSName
 from ipaserver import topology
+from ipaserver.masters import invalidate_masters_view
 from ipaserver.servroles import ENABLED, HIDDEN
 from ipaserver.install import bindinstance, dnskeysyncinstance
 from ipaserver.install.service import hide_services, enable_services
@@ -158,7 +159,7 @@ class server(LDAPObject):
     )
 
     def _get_suffixes(self):
-        suffixes = self.api.Command.topologysuffix_find(
+        suffixes = self.api.Command.topologysuffix_find.call_internal(
             all=True, raw=True,
         )['result']
         suffixes = [(s['iparepltopoconfroot'][0], s['dn']) for s in suffixes]
@@ -206,7 +207,7 @@ class server(LDAPObject):
         if options.get('raw', False):
             return
 
-        enabled_roles = self.api.Command.server_role_find(
+        enabled_roles = self.api.Command.server_role_find.call_internal(
             server_server=entry_attrs['cn'][0],
             status=ENABLED,
             include_master=True,
@@ -879,6 +880,8 @@ class server_del(LDAPDelete):
                 new_errors[suffix_name])
 
     def post_callback(self, ldap, dn, *keys, **options):
+        invalidate_masters_view()
+
         # there is no point in checking deleted segment on local host
         # we should do this only when removing other masters
         if self.api.env.host != keys[-1]:
@@ -37,7 +37,6 @@ from ipapython.dn import DN
 from ipaserver.masters import is_service_enabled
 
 if api.env.in_server:
-    import pki.account
     import pki.key
     # pylint: disable=no-member
     try:
@@ -182,6 +181,11 @@ EXAMPLES:
    ipa vault-retrieve <name>
        [--user <user>|--service <service>|--shared]
        --out <output file> --private-key-file private.pem
+""") + _("""
+ Retrieve data from multiple standard vaults:
+   ipa vault-retrieve-bulk <name> <name> ...
+       [--user <user>|--service <service>|--shared]
+       --out-dir <output directory>
 """) + _("""
  Add vault owners:
    ipa vault-add-owner <name>
@@ -207,6 +211,27 @@ EXAMPLES:
 
 register = Registry()
 
+
+def retrieve_vault_key(kra_client, client_key_id, wrapped_session_key):
+    """
+    Retrieves the active archived data of a vault, wrapped with the session
+    key.
+    """
+    # find vault record in KRA
+    response = kra_client.keys.list_keys(
+        client_key_id,
+        pki.key.KeyClient.KEY_STATUS_ACTIVE)
+
+    if not len(response.key_infos):
+        raise errors.NotFound(reason=_('No archived data.'))
+
+    key_info = response.key_infos[0]
+
+    # retrieve encrypted data from KRA
+    return kra_client.keys.retrieve_key(
+        key_info.get_key_id(),
+        wrapped_session_key)
+
 vault_options = (
     Principal(
         'service?',
@@ -404,7 +429,7 @@ class vaultcontainer_show(LDAPRetrieve):
     def pre_callback(self, ldap, dn, attrs_list, *keys, **options):
         assert isinstance(dn, DN)
 
-        if not self.api.Command.kra_is_enabled()['result']:
+        if not self.api.Command.kra_is_enabled.call_internal()['result']:
             raise errors.InvocationError(
                 format=_('KRA service is not enabled'))
 
@@ -428,7 +453,7 @@ class vaultcontainer_del(LDAPDelete):
     def pre_callback(self, ldap, dn, *keys, **options):
         assert isinstance(dn, DN)
 
-        if not self.api.Command.kra_is_enabled()['result']:
+        if not self.api.Command.kra_is_enabled.call_internal()['result']:
             raise errors.InvocationError(
                 format=_('KRA service is not enabled'))
 
@@ -755,6 +780,19 @@ class vault(LDAPObject):
 
         return 'ipa:' + id
 
+    def get_vault_entry(self, *keys, **options):
+        """
+        Reads the vault entry, with the access rights of the caller.
+
+        Lighter than vault_show for internal commands which only need the DN
+        and the type of the vault.
+        """
+        dn = self.get_dn(*keys, **options)
+        try:
+            return self.backend.get_entry(dn, ['ipavaulttype'])
+        except errors.NotFound:
+            self.handle_not_found(*keys)
+
     def get_container_attribute(self, entry, options):
         if options.get('raw', False):
             return
@@ -781,7 +819,7 @@ class vault_add_internal(LDAPCreate):
                      **options):
         assert isinstance(dn, DN)
 
-        if not self.api.Command.kra_is_enabled()['result']:
+        if not self.api.Command.kra_is_enabled.call_internal()['result']:
             raise errors.InvocationError(
                 format=_('KRA service is not enabled'))
 
@@ -819,7 +857,7 @@ class vault_del(LDAPDelete):
     def pre_callback(self, ldap, dn, *keys, **options):
         assert isinstance(dn, DN)
 
-        if not self.api.Command.kra_is_enabled()['result']:
+        if not self.api.Command.kra_is_enabled.call_internal()['result']:
             raise errors.InvocationError(
                 format=_('KRA service is not enabled'))
 
@@ -828,10 +866,7 @@ class vault_del(LDAPDelete):
     def post_callback(self, ldap, dn, *args, **options):
         assert isinstance(dn, DN)
 
-        with self.api.Backend.kra.get_client() as kra_client:
-            kra_account = pki.account.AccountClient(kra_client.connection)
-            kra_account.login()
-
+        with self.api.Backend.kra.get_session() as kra_client:
             client_key_id = self.obj.get_key_id(dn)
 
             # deactivate vault record in KRA
@@ -843,8 +878,6 @@ class vault_del(LDAPDelete):
                     key_info.get_key_id(),
                     pki.key.KeyClient.KEY_STATUS_INACTIVE)
 
-            kra_account.logout()
-
         return True
 
 
@@ -875,7 +908,7 @@ class vault_find(LDAPSearch):
                      **options):
         assert isinstance(base_dn, DN)
 
-        if not self.api.Command.kra_is_enabled()['result']:
+        if not self.api.Command.kra_is_enabled.call_internal()['result']:
             raise errors.InvocationError(
                 format=_('KRA service is not enabled'))
 
@@ -931,7 +964,7 @@ class vault_mod_internal(LDAPUpdate):
 
         assert isinstance(dn, DN)
 
-        if not self.api.Command.kra_is_enabled()['result']:
+        if not self.api.Command.kra_is_enabled.call_internal()['result']:
             raise errors.InvocationError(
                 format=_('KRA service is not enabled'))
 
@@ -953,7 +986,7 @@ class vault_show(LDAPRetrieve):
     def pre_callback(self, ldap, dn, attrs_list, *keys, **options):
         assert isinstance(dn, DN)
 
-        if not self.api.Command.kra_is_enabled()['result']:
+        if not self.api.Command.kra_is_enabled.call_internal()['result']:
             raise errors.InvocationError(
                 format=_('KRA service is not enabled'))
 
@@ -995,13 +1028,13 @@ class vaultconfig_show(Retrieve):
 
     def execute(self, *args, **options):
 
-        if not self.api.Command.kra_is_enabled()['result']:
+        if not self.api.Command.kra_is_enabled.call_internal()['result']:
             raise errors.InvocationError(
                 format=_('KRA service is not enabled'))
 
-        with self.api.Backend.kra.get_client() as kra_client:
-            transport_cert = kra_client.system_certs.get_transport_cert()
-            config = {'transport_cert': transport_cert.binary}
+        config = {
+            'transport_cert': self.api.Backend.kra.get_transport_cert(),
+        }
 
         self.api.Object.config.show_servroles_attributes(
             config, "KRA server", **options)
@@ -1039,7 +1072,7 @@ class vault_archive_internal(PKQuery):
 
     def execute(self, *args, **options):
 
-        if not self.api.Command.kra_is_enabled()['result']:
+        if not self.api.Command.kra_is_enabled.call_internal()['result']:
             raise errors.InvocationError(
                 format=_('KRA service is not enabled'))
 
@@ -1048,14 +1081,11 @@ class vault_archive_internal(PKQuery):
         wrapped_session_key = options.pop('session_key')
 
         # retrieve vault info
-        vault = self.api.Command.vault_show(*args, **options)['result']
+        vault = self.obj.get_vault_entry(*args, **options)
 
         # connect to KRA
-        with self.api.Backend.kra.get_client() as kra_client:
-            kra_account = pki.account.AccountClient(kra_client.connection)
-            kra_account.login()
-
-            client_key_id = self.obj.get_key_id(vault['dn'])
+        with self.api.Backend.kra.get_session() as kra_client:
+            client_key_id = self.obj.get_key_id(vault.dn)
 
             # deactivate existing vault record in KRA
             response = kra_client.keys.list_keys(
@@ -1077,8 +1107,6 @@ class vault_archive_internal(PKQuery):
                 nonce_iv=nonce,
             )
 
-            kra_account.logout()
-
         response = {
             'value': args[-1],
             'result': {},
@@ -1108,39 +1136,21 @@ class vault_retrieve_internal(PKQuery):
 
     def execute(self, *args, **options):
 
-        if not self.api.Command.kra_is_enabled()['result']:
+        if not self.api.Command.kra_is_enabled.call_internal()['result']:
             raise errors.InvocationError(
                 format=_('KRA service is not enabled'))
 
         wrapped_session_key = options.pop('session_key')
 
         # retrieve vault info
-        vault = self.api.Command.vault_show(*args, **options)['result']
+        vault = self.obj.get_vault_entry(*args, **options)
 
         # connect to KRA
-        with self.api.Backend.kra.get_client() as kra_client:
-            kra_account = pki.account.AccountClient(kra_client.connection)
-            kra_account.login()
-
-            client_key_id = self.obj.get_key_id(vault['dn'])
-
-            # find vault record in KRA
-            response = kra_client.keys.list_keys(
-                client_key_id,
-                pki.key.KeyClient.KEY_STATUS_ACTIVE)
-
-            if not len(response.key_infos):
-                raise errors.NotFound(reason=_('No archived data.'))
-
-            key_info = response.key_infos[0]
-
-            # retrieve encrypted data from KRA
-            key = kra_client.keys.retrieve_key(
-                key_info.get_key_id(),
+        with self.api.Backend.kra.get_session() as kra_client:
+            key = retrieve_vault_key(
+                kra_client, self.obj.get_key_id(vault.dn),
                 wrapped_session_key)
 
-            kra_account.logout()
-
         response = {
             'value': args[-1],
             'result': {
@@ -1154,6 +1164,96 @@ class vault_retrieve_internal(PKQuery):
         return response
 
 
+@register()
+class vault_retrieve_bulk_internal(Command):
+    __doc__ = _('Retrieve data from multiple vaults.')
+
+    NO_CLI = True
+
+    takes_args = (
+        Str(
+            'cn+',
+            cli_name='name',
+            label=_('Vault name'),
+        ),
+    )
+
+    takes_options = vault_options + (
+        Bytes(
+            'session_key',
+            doc=_('Session key wrapped with transport certificate'),
+        ),
+    )
+
+    has_output = (
+        output.summary,
+        output.ListOfEntries('result'),
+        output.Output(
+            'failed',
+            type=dict,
+            doc=_('Vaults that could not be retrieved'),
+        ),
+    )
+
+    msg_summary = ngettext(
+        'Retrieved data from %(count)d vault',
+        'Retrieved data from %(count)d vaults', 0
+    )
+
+    def execute(self, *args, **options):
+
+        if not self.api.Command.kra_is_enabled.call_internal()['result']:
+            raise errors.InvocationError(
+                format=_('KRA service is not enabled'))
+
+        names = args[0]
+        wrapped_session_key = options.pop('session_key')
+        vault_obj = self.api.Object.vault
+
+        # all vaults are in the same container, read them at once
+        ldap = self.api.Backend.ldap2
+        container_dn = vault_obj.get_dn(names[0], **options)[1:]
+        try:
+            entries = ldap.get_entries(
+                DN(*container_dn), ldap.SCOPE_ONELEVEL,
+                ldap.make_filter_from_attr('cn', names, ldap.MATCH_ANY),
+                ['cn', 'ipavaulttype'], size_limit=-1, time_limit=-1)
+        except errors.NotFound:
+            entries = []
+        vaults = {entry.single_value['cn'].lower(): entry
+                  for entry in entries}
+
+        result = []
+        failed = {}
+        with self.api.Backend.kra.get_session() as kra_client:
+            for name in names:
+                vault = vaults.get(name.lower())
+                if vault is None:
+                    failed[name] = unicode(_('vault not found'))
+                    continue
+
+                try:
+                    key = retrieve_vault_key(
+                        kra_client, vault_obj.get_key_id(vault.dn),
+                        wrapped_session_key)
+                except errors.NotFound as e:
+                    failed[name] = unicode(e)
+                    continue
+
+                result.append({
+                    'cn': name,
+                    'ipavaulttype': vault.single_value['ipavaulttype'],
+                    'vault_data': key.encrypted_data,
+                    'nonce': key.nonce_data,
+                })
+
+        return {
+            'result': result,
+            'failed': failed,
+            'summary': self.msg_summary % {'count': len(result)},
+        }
+
+
 @register()
 class vault_add_owner(VaultModMember, LDAPAddMember):
     __doc__ = _('Add owners to a vault.')
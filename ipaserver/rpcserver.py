@@ -25,9 +25,11 @@ Also see the `ipalib.rpc` module.
 
 from __future__ import absolute_import
 
+import json
 import logging
 from xml.sax.saxutils import escape
 import os
+import threading
 import traceback
 from io import BytesIO
 from urllib.parse import parse_qs
@@ -49,7 +51,8 @@ from ipalib.backend import Executioner
 from ipalib.errors import (PublicError, InternalError, JSONError,
     CCacheError, RefererError, InvalidSessionPassword, NotFound, ACIError,
     ExecutionError, PasswordExpired, KrbPrincipalExpired, UserLocked)
-from ipalib.request import context, destroy_context
+from ipalib.request import (
+    context, destroy_context, RequestTimings, timing_phase)
 from ipalib.rpc import (xml_dumps, xml_loads,
     json_encode_binary, json_decode_binary)
 from ipapython.dn import DN
@@ -72,6 +75,7 @@ if six.PY3:
 logger = logging.getLogger(__name__)
 
 HTTP_STATUS_SUCCESS = '200 Success'
+HTTP_STATUS_NOT_MODIFIED = '304 Not Modified'
 HTTP_STATUS_SERVER_ERROR = '500 Internal Server Error'
 
 _not_found_template = """<html>
@@ -219,6 +223,72 @@ def nicify_query(query, encoding='utf-8'):
             yield (key, tuple(v.decode(encoding) for v in value))
 
 
+def parse_etags(value):
+    """
+    Parse the value of an If-None-Match header into a list of entity tags.
+    """
+    etags = []
+    for etag in value.split(','):
+        etag = etag.strip()
+        if not etag:
+            continue
+        if etag.startswith('W/'):
+            etag = etag[2:]
+        etags.append(etag.strip('"'))
+    return etags
+
+
+class TimingStatistics:
+    """
+    Aggregated request timings of the server process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.requests = 0
+            self.duration = 0.0
+            self.phases = {}
+            self.ldap_operations = {}
+
+    @staticmethod
+    def _add(stats, name, count, duration):
+        old_count, old_duration, old_max = stats.get(name, (0, 0.0, 0.0))
+        stats[name] = (old_count + count, old_duration + duration,
+                       max(old_max, duration))
+
+    def add(self, timings):
+        with self._lock:
+            self.requests += 1
+            self.duration += timings.duration or 0.0
+            for name, duration in timings.phases:
+                self._add(self.phases, name, 1, duration)
+            for name, (count, duration) in timings.ldap_operations.items():
+                self._add(self.ldap_operations, name, count, duration)
+
+    def as_dict(self):
+        def items(stats):
+            return {
+                name: dict(count=count, total=total, max=max_duration)
+                for name, (count, total, max_duration) in stats.items()
+            }
+
+        with self._lock:
+            return dict(
+                pid=os.getpid(),
+                requests=self.requests,
+                duration=self.duration,
+                phases=items(self.phases),
+                ldap_operations=items(self.ldap_operations),
+            )
+
+
+timing_statistics = TimingStatistics()
+
+
 def extract_query(environ):
     """
     Return the query as a ``dict``, or ``None`` if no query is presest.
@@ -262,10 +332,19 @@ class wsgi_dispatch(Executioner, HTTP_Status):
 
     def __call__(self, environ, start_response):
         logger.debug('WSGI wsgi_dispatch.__call__:')
+        timings = None
+        if self.api.env.request_timing:
+            timings = context.timings = RequestTimings()
         try:
             return self.route(environ, start_response)
         finally:
             destroy_context()
+            if timings is not None:
+                timings.finish()
+                logger.info('[timing] %s: %s',
+                            timings.name or environ.get('PATH_INFO'),
+                            timings)
+                timing_statistics.add(timings)
 
     def _on_finalize(self):
         self.url = self.env['mount_ipa']
@@ -352,20 +431,35 @@ class WSGIExecutioner(Executioner):
                 lang = lang_reg.split('-')[0]
                 setattr(context, "languages", [lang])
 
-            if (
-                environ.get('CONTENT_TYPE', '').startswith(self.content_type)
-                and environ['REQUEST_METHOD'] == 'POST'
-            ):
-                data = read_input(environ)
-                (name, args, options, _id) = self.unmarshal(data)
-            else:
-                (name, args, options, _id) = self.simple_unmarshal(environ)
-
-            if name in self._system_commands:
-                result = self._system_commands[name](self, *args, **options)
-            else:
-                command = self._get_command(name)
-                result = command(*args, **options)
+            with timing_phase('unmarshal'):
+                if (
+                    environ.get('CONTENT_TYPE', '').startswith(
+                        self.content_type)
+                    and environ['REQUEST_METHOD'] == 'POST'
+                ):
+                    data = read_input(environ)
+                    (name, args, options, _id) = self.unmarshal(data)
+                else:
+                    (name, args, options, _id) = self.simple_unmarshal(
+                        environ)
+
+            # only a top-level schema call answers conditional requests,
+            # the response of e.g. batch must not be replaced by 304
+            if name == 'schema':
+                setattr(context, "if_none_match", parse_etags(
+                    environ.get('HTTP_IF_NONE_MATCH', '')))
+
+            timings = getattr(context, 'timings', None)
+            if timings is not None:
+                timings.name = name
+
+            with timing_phase('execute'):
+                if name in self._system_commands:
+                    result = self._system_commands[name](
+                        self, *args, **options)
+                else:
+                    command = self._get_command(name)
+                    result = command(*args, **options)
         except PublicError as e:
             if self.api.env.debug:
                 logger.debug('WSGI wsgi_execute PublicError: %s',
@@ -410,7 +504,8 @@ class WSGIExecutioner(Executioner):
                         type(error).__name__)
 
         version = options.get('version', VERSION_WITHOUT_CAPABILITIES)
-        return self.marshal(result, error, _id, version)
+        with timing_phase('marshal'):
+            return self.marshal(result, error, _id, version)
 
     def simple_unmarshal(self, environ):
         name = environ['PATH_INFO'].strip('/')
@@ -441,6 +536,14 @@ class WSGIExecutioner(Executioner):
         if logout_cookie is not None:
             headers.append(('IPASESSION', logout_cookie))
 
+        etag = getattr(context, 'etag', None)
+        if etag is not None:
+            headers = headers + [('ETag', '"%s"' % etag)]
+            if (status == HTTP_STATUS_SUCCESS and
+                    getattr(context, 'not_modified', False)):
+                status = HTTP_STATUS_NOT_MODIFIED
+                response = b''
+
         start_response(status, headers)
         return [response]
 
@@ -687,7 +790,8 @@ class KerberosWSGIExecutioner(WSGIExecutioner, KerberosSession):
             return self.marshal(None, CCacheError())
 
         try:
-            self.create_context(ccache=user_ccache)
+            with timing_phase('connect'):
+                self.create_context(ccache=user_ccache, pooled=True)
             response = super(KerberosWSGIExecutioner, self).__call__(
                 environ, start_response)
         except PublicError as e:
@@ -846,7 +950,8 @@ class jsonserver_session(jsonserver, KerberosSession):
         logger.debug('WSGI jsonserver_session.__call__:')
 
         # Redirect to login if no Kerberos credentials
-        ccache_name = self.get_environ_creds(environ)
+        with timing_phase('credentials'):
+            ccache_name = self.get_environ_creds(environ)
         if ccache_name is None:
             return self.need_login(start_response)
 
@@ -855,7 +960,8 @@ class jsonserver_session(jsonserver, KerberosSession):
 
         # This may fail if a ticket from wrong realm was handled via browser
         try:
-            self.create_context(ccache=ccache_name)
+            with timing_phase('connect'):
+                self.create_context(ccache=ccache_name, pooled=True)
         except ACIError as e:
             return self.unauthorized(environ, start_response, str(e), 'denied')
 
@@ -1297,3 +1403,59 @@ class xmlserver_session(xmlserver, KerberosSession):
             destroy_context()
 
         return response
+
+
+class metrics(Backend, KerberosSession):
+    """
+    Request timing statistics of the server process in JSON.
+
+    Available only if request_timing is enabled and only to principals
+    allowed to modify the IPA configuration, i.e. administrators.
+    Statistics are kept per process, each request may be served by a
+    different one.
+    """
+    content_type = 'application/json'
+    key = '/metrics'
+
+    def _on_finalize(self):
+        super(metrics, self)._on_finalize()
+        self.api.Backend.wsgi_dispatch.mount(self, self.key)
+
+    def forbidden(self, start_response):
+        status = '403 Forbidden'
+        headers = []
+        response = b'Insufficient access to request timing statistics'
+
+        logger.info('metrics: %s', status)
+        start_response(status, headers)
+        return [response]
+
+    def _is_allowed(self, ccache_name):
+        conn = ldap2(self.api)
+        try:
+            conn.connect(ccache=ccache_name)
+            return conn.can_write(self.api.Object.config.get_dn(),
+                                  'ipaconfigstring')
+        except Exception as e:
+            logger.error('metrics: cannot check access rights: %s', e)
+            return False
+        finally:
+            if conn.isconnected():
+                conn.disconnect()
+
+    def __call__(self, environ, start_response):
+        if not self.api.env.request_timing:
+            url = environ['SCRIPT_NAME'] + environ['PATH_INFO']
+            return self.not_found(environ, start_response, url,
+                                  'request timing is disabled')
+
+        ccache_name = self.get_environ_creds(environ)
+        if ccache_name is None:
+            return self.need_login(start_response)
+        if not self._is_allowed(ccache_name):
+            return self.forbidden(start_response)
+
+        output = json.dumps(timing_statistics.as_dict(), sort_keys=True)
+        start_response(HTTP_STATUS_SUCCESS,
+                       [('Content-Type', self.content_type)])
+        return [output.encode('utf-8')]
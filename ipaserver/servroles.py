@@ -74,12 +74,13 @@ The available role/attribute instances are stored in
 import abc
 from collections import namedtuple, defaultdict
 
-from ldap import SCOPE_ONELEVEL
 import six
 
 from ipalib import _, errors
 from ipapython.dn import DN
-from ipaserver.masters import ENABLED_SERVICE, HIDDEN_SERVICE
+from ipaserver.masters import (
+    ENABLED_SERVICE, HIDDEN_SERVICE, get_masters_view, invalidate_masters_view
+)
 
 if six.PY3:
     unicode = str
@@ -157,26 +158,17 @@ class BaseServerRole(LDAPBasedProperty):
                   method
         """
 
-    def _fill_in_absent_masters(self, ldap2, api_instance, result):
+    def _fill_in_absent_masters(self, api_instance, result):
         """
         get all masters on which the role is absent
 
-        :param ldap2: LDAP connection
         :param api_instance: API instance
         :param result: output of `get_result_from_entries` method
 
         :returns: list of masters on which the role is absent
         """
-        search_base = DN(api_instance.env.container_masters,
-                         api_instance.env.basedn)
-        search_filter = '(objectclass=ipaConfigObject)'
-        attrs_list = ['cn']
-
-        all_masters = ldap2.get_entries(
-            search_base,
-            filter=search_filter,
-            scope=SCOPE_ONELEVEL,
-            attrs_list=attrs_list)
+        all_masters = get_masters_view(api=api_instance).get_masters(
+            objectclass='ipaConfigObject')
 
         all_master_cns = set(m['cn'][0] for m in all_masters)
         enabled_configured_masters = set(r[u'server_server'] for r in result)
@@ -186,6 +178,27 @@ class BaseServerRole(LDAPBasedProperty):
         return [self.create_role_status_dict(m, ABSENT) for m in
                 absent_masters]
 
+    def get_entries(self, api_instance, server=None, attrs_list=("*",)):
+        """
+        get entries the role status is computed from
+
+        :param api_instance: API instance
+        :param server: server FQDN. If given, only entries of this server
+                       are returned
+        :returns: list of entries for `get_result_from_entries()`
+        """
+        ldap2 = api_instance.Backend.ldap2
+        search_base, search_filter = self.create_search_params(
+            ldap2, api_instance, server=server)
+
+        try:
+            return ldap2.get_entries(
+                search_base,
+                filter=search_filter,
+                attrs_list=attrs_list)
+        except errors.EmptyResult:
+            return []
+
     def status(self, api_instance, server=None, attrs_list=("*",)):
         """
         probe and return status of the role either on single server or on the
@@ -200,17 +213,8 @@ class BaseServerRole(LDAPBasedProperty):
                   * 'hidden' if the role is not advertised
                   * 'absent' otherwise
         """
-        ldap2 = api_instance.Backend.ldap2
-        search_base, search_filter = self.create_search_params(
-            ldap2, api_instance, server=server)
-
-        try:
-            entries = ldap2.get_entries(
-                search_base,
-                filter=search_filter,
-                attrs_list=attrs_list)
-        except errors.EmptyResult:
-            entries = []
+        entries = self.get_entries(
+            api_instance, server=server, attrs_list=attrs_list)
 
         if not entries and server is not None:
             return [self.create_role_status_dict(server, ABSENT)]
@@ -218,8 +222,7 @@ class BaseServerRole(LDAPBasedProperty):
         result = self.get_result_from_entries(entries)
 
         if server is None:
-            result.extend(
-                self._fill_in_absent_masters(ldap2, api_instance, result))
+            result.extend(self._fill_in_absent_masters(api_instance, result))
 
         return sorted(result, key=lambda x: x[u'server_server'])
 
@@ -255,34 +258,16 @@ class ServerAttribute(LDAPBasedProperty):
         raise NotImplementedError(
             "{}: no valid associated role found".format(self.attr_name))
 
-    def create_search_filter(self, ldap):
-        """
-        Create search filter which matches LDAP data corresponding to the
-        attribute
-        """
-        svc_filter = ldap.make_filter_from_attr(
-            'cn', self.associated_service_name)
-
-        configstring_filter = ldap.make_filter_from_attr(
-            'ipaConfigString', self.ipa_config_string_value)
-        return ldap.combine_filters(
-            [svc_filter, configstring_filter], rules=ldap.MATCH_ALL)
-
     def get(self, api_instance):
         """
         get the master which has the attribute set
         :param api_instance: API instance
         :returns: master FQDN
         """
-        ldap2 = api_instance.Backend.ldap2
-        search_base = DN(api_instance.env.container_masters,
-                         api_instance.env.basedn)
-
-        search_filter = self.create_search_filter(ldap2)
-
-        try:
-            entries = ldap2.get_entries(search_base, filter=search_filter)
-        except errors.EmptyResult:
+        entries = get_masters_view(api=api_instance).get_services(
+            self.associated_service_name,
+            config_strings=self.ipa_config_string_value)
+        if not entries:
             return []
 
         master_cns = {e.dn[1]['cn'] for e in entries}
@@ -370,6 +355,7 @@ class ServerAttribute(LDAPBasedProperty):
 
         for service_entry in service_entries:
             self._remove_attribute_from_svc_entry(ldap, service_entry)
+        invalidate_masters_view()
 
     def _add(self, api_instance, masters):
         """
@@ -387,6 +373,7 @@ class ServerAttribute(LDAPBasedProperty):
         service_entries = self._get_masters_service_entries(ldap, master_dns)
         for service_entry in service_entries:
             self._add_attribute_to_svc_entry(ldap, service_entry)
+        invalidate_masters_view()
 
     def _check_receiving_masters_having_associated_role(self, api_instance,
                                                       masters):
@@ -558,9 +545,9 @@ class ServiceBasedRole(BaseServerRole):
 
         return search_base, search_filter
 
-    def status(self, api_instance, server=None):
-        return super(ServiceBasedRole, self).status(
-            api_instance, server=server, attrs_list=('ipaConfigString', 'cn'))
+    def get_entries(self, api_instance, server=None, attrs_list=None):
+        return get_masters_view(api=api_instance).get_services(
+            self.component_services, server=server)
 
 
 class ADtrustBasedRole(BaseServerRole):
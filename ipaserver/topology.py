@@ -6,8 +6,6 @@
 set of functions and classes useful for management of domain level 1 topology
 """
 
-from copy import deepcopy
-
 from ipalib import _
 from ipapython.graph import Graph
 
@@ -51,20 +49,21 @@ def create_topology_graph(masters, segments):
     return graph
 
 
-def get_topology_connection_errors(graph):
+def get_topology_connection_errors(graph, removed=()):
     """
-    Traverse graph from each master and find out which masters are not
-    reachable.
+    Find out which masters are not reachable from each master.
 
     :param graph: topology graph where vertices are masters
+    :param removed: masters which are ignored, as if they were removed
     :returns: list of errors, error is: (master, visited, not_visited)
     """
     connect_errors = []
-    master_cns = list(graph.vertices)
-    master_cns.sort()
+    reachable = graph.reachability(removed)
+    vertices = frozenset(reachable)
+    master_cns = sorted(vertices)
     for m in master_cns:
-        visited = graph.bfs(m)
-        not_visited = graph.vertices - visited
+        visited = reachable[m]
+        not_visited = vertices - visited
         if not_visited:
             connect_errors.append((m, list(visited), list(not_visited)))
     return connect_errors
@@ -149,24 +148,34 @@ class TopologyConnectivity:
         return errors_by_suffix
 
     def errors_after_master_removal(self, master_cn):
-        graphs_before = deepcopy(self.graphs)
+        errors_by_suffix = {}
+        for suffix in self.graphs:
+            errors_by_suffix[suffix] = get_topology_connection_errors(
+                self.graphs[suffix], removed=(master_cn,)
+            )
 
-        for s in self.graphs:
-            try:
-                self.graphs[s].remove_vertex(master_cn)
-            except ValueError:
-                pass
+        return errors_by_suffix
 
-        errors_after_removal = self.errors
+    def errors_after_each_master_removal(self):
+        """
+        Evaluate removal of each master in a single call
 
-        self.graphs = graphs_before
+        :returns: dict mapping master to errors by suffix after its removal
+        """
+        master_cns = set()
+        for graph in self.graphs.values():
+            master_cns.update(graph.vertices)
 
-        return errors_after_removal
+        return {
+            master_cn: self.errors_after_master_removal(master_cn)
+            for master_cn in sorted(master_cns)
+        }
 
     def check_current_state(self):
         err_msg = ""
-        for suffix in self.errors:
-            errors = self.errors[suffix]
+        errors_by_suffix = self.errors
+        for suffix in errors_by_suffix:
+            errors = errors_by_suffix[suffix]
             if errors:
                 err_msg = "\n".join([
                     err_msg,
@@ -0,0 +1,66 @@
+#
+# Copyright (C) 2020  FreeIPA Contributors see COPYING for license
+#
+
+import json
+import zipfile
+
+import pytest
+
+import ipatests.util
+ipatests.util.check_ipaclient_unittests()  # noqa: E402
+
+from ipaclient.remote_plugins import schema as remote_schema
+
+FINGERPRINT = 'fingerprint'
+
+PING = {
+    'name': 'ping',
+    'full_name': 'ping/1',
+    'doc': 'Ping a remote server.',
+    'topic_topic': 'ping/1',
+    'params': [],
+    'output': [],
+}
+
+PING_TOPIC = {
+    'name': 'ping',
+    'full_name': 'ping/1',
+    'doc': 'Ping the remote IPA server.',
+}
+
+HELP = {
+    'commands': {'ping/1': {'name': 'ping', 'topic_topic': 'ping/1'}},
+    'topics': {'ping/1': {'name': 'ping'}},
+}
+
+
+@pytest.fixture
+def schema_dir(tmpdir, monkeypatch):
+    monkeypatch.setattr(remote_schema.Schema, '_DIR', str(tmpdir))
+    with zipfile.ZipFile(str(tmpdir.join(FINGERPRINT)), 'w') as f:
+        f.writestr('commands/ping/1', json.dumps(PING))
+        f.writestr('topics/ping/1', json.dumps(PING_TOPIC))
+        f.writestr('_help', json.dumps(HELP))
+    return tmpdir
+
+
+@pytest.mark.tier0
+class TestSchema:
+    def test_lazy_members(self, schema_dir):
+        schema = remote_schema.Schema(None, FINGERPRINT)
+        assert list(schema['commands']) == ['ping/1']
+        assert schema._dict['commands']['ping/1'] is None
+        assert schema._help is None
+
+        assert schema['commands']['ping/1'] == PING
+        assert schema['commands'].get_help('ping/1') == HELP['commands'][
+            'ping/1']
+        assert schema._dict['topics']['ping/1'] is None
+
+    def test_topic_module(self, schema_dir):
+        schema = remote_schema.Schema(None, FINGERPRINT)
+        module = remote_schema._SchemaTopicModule(
+            'test_topic', schema['topics'], 'ping/1')
+        assert schema._dict['topics']['ping/1'] is None
+        assert module.__doc__ == PING_TOPIC['doc']
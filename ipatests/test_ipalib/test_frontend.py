@@ -685,6 +685,45 @@ class test_Command(ClassChecker):
             assert o.run.__func__ is self.cls.run
         assert {'name': 'forward', 'messages': expected} == o.run(*args, **kw)
 
+    def test_call_internal(self):
+        """
+        Test the `ipalib.frontend.Command.call_internal` method.
+        """
+        class my_cmd(self.cls):
+            takes_args = (
+                parameters.Str('one'),
+            )
+            takes_options = (
+                parameters.Int('two?', minvalue=1),
+                parameters.Str('three*', pattern='^[a-z]+$',
+                               normalizer=lambda value: value.lower()),
+                parameters.Flag('four'),
+            )
+
+            def execute(self, *args, **kw):
+                return ('execute', args, kw)
+
+        api, _home = create_test_api(in_server=True)
+        api.finalize()
+        o = my_cmd(api)
+        o.finalize()
+
+        # values of the right type are passed as they are
+        assert o.call_internal(u'one', two=0, three=(u'X',)) == (
+            'execute', (u'one',),
+            dict(two=0, three=(u'X',), four=False, version=API_VERSION))
+
+        # other values are normalized, converted and validated
+        assert o.call_internal(u'one', two=u'2', three=[u'X']) == (
+            'execute', (u'one',),
+            dict(two=2, three=(u'x',), four=False, version=API_VERSION))
+        with pytest.raises(errors.ValidationError):
+            o.call_internal(u'one', two=u'0')
+        with pytest.raises(errors.ValidationError):
+            o.call_internal(u'one', three=[u'1'])
+        with pytest.raises(errors.RequirementError):
+            o.call_internal(two=2)
+
     def test_validate_output_basic(self):
         """
         Test the `ipalib.frontend.Command.validate_output` method.
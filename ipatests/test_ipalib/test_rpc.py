@@ -23,6 +23,7 @@ Test the `ipalib.rpc` module.
 from __future__ import print_function
 
 from xmlrpc.client import Binary, Fault, dumps, loads
+import datetime
 import urllib
 
 import pytest
@@ -34,6 +35,9 @@ from ipatests.data import binary_bytes, utf8_bytes, unicode_str
 from ipalib.frontend import Command
 from ipalib.request import context, Connection
 from ipalib import rpc, errors, api, request as ipa_request
+from ipapython.dn import DN
+from ipapython.dnsutil import DNSName
+from ipapython.ipautil import CIDict
 from ipapython.version import API_VERSION
 
 if six.PY3:
@@ -196,6 +200,73 @@ def test_xml_loads():
         assert type(e.faultString) is unicode
 
 
+@pytest.mark.parametrize('backend', rpc.get_json_backends())
+def test_json_backends(backend):
+    """
+    Test the JSON backends of `ipalib.rpc.json_encode_binary`.
+    """
+    value = dict(
+        dn=DN(('uid', 'admin'), ('dc', 'ipa'), ('dc', 'example')),
+        name=DNSName(u'ipa.example.'),
+        data=binary_bytes,
+        text=unicode_str,
+        when=datetime.datetime(2020, 1, 2, 3, 4, 5),
+        serial=2 ** 100,
+        values=[1, 2.5, None, True, (u'a', [u'b'])],
+    )
+    expected = rpc.json_decode_binary(
+        rpc._StdlibJSONBackend().dumps(value, API_VERSION))
+    rpc.set_json_backend(backend)
+    try:
+        data = rpc.json_encode_binary(value, API_VERSION)
+    finally:
+        rpc.set_json_backend()
+    assert rpc.json_decode_binary(data) == expected
+    assert expected['serial'] == 2 ** 100
+    assert expected['data'] == binary_bytes
+
+
+class _Text(six.text_type):
+    pass
+
+
+class _Number(int):
+    pass
+
+
+class _Mapping(dict):
+    pass
+
+
+@pytest.mark.parametrize('backend', rpc.get_json_backends())
+def test_json_backends_subclasses(backend):
+    """
+    Test that all JSON backends serialize subclasses of the native types
+    like the json module.
+    """
+    value = dict(
+        entry=CIDict({u'MixedCase': [_Text(u'value')], u'cn': u'name'}),
+        mapping=_Mapping(key=_Mapping(nested=_Number(42))),
+        text=_Text(u'text'),
+        number=_Number(7),
+    )
+    expected = rpc.json_decode_binary(
+        rpc._StdlibJSONBackend().dumps(value, API_VERSION))
+    rpc.set_json_backend(backend)
+    try:
+        data = rpc.json_encode_binary(value, API_VERSION)
+    finally:
+        rpc.set_json_backend()
+    assert rpc.json_decode_binary(data) == expected
+    assert expected['entry'] == {u'MixedCase': [u'value'], u'cn': u'name'}
+    assert expected['mapping'] == {u'key': {u'nested': 42}}
+
+
+def test_json_backend_unavailable():
+    with pytest.raises(ValueError):
+        rpc.set_json_backend('nonexistent')
+
+
 class test_xmlclient(PluginTester):
     """
     Test the `ipalib.rpc.xmlclient` plugin.
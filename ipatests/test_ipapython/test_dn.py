@@ -1,11 +1,17 @@
 
 import contextlib
+import os
+import pickle
+import subprocess
+import sys
+
 import pytest
 
 from cryptography import x509
 import six
 
-from ipapython.dn import DN, RDN, AVA, str2dn, dn2str, DECODING_ERROR
+from ipapython.dn import (
+    DN, RDN, AVA, str2dn, dn2str, DECODING_ERROR, intern_dn)
 from ipapython import dn_ctypes
 
 
@@ -1444,3 +1450,103 @@ def test_dn2str_special():
     assert dn2str(dn) == dnstring2
     assert dn_ctypes.str2dn(dnstring) == dn
     assert dn_ctypes.dn2str(dn) == dnstring2
+
+
+class TestInternDN:
+    def test_parse_cache(self):
+        dn1 = DN('cn=Bob,cn=users,cn=accounts,dc=example,dc=com')
+        dn2 = DN('cn=Bob,cn=users,cn=accounts,dc=example,dc=com')
+        assert dn1 == dn2
+        assert dn1.rdns is dn2.rdns
+
+    def test_intern_dn(self):
+        basedn = intern_dn('dc=Intern,dc=Example')
+        assert basedn == DN(('dc', 'intern'), ('dc', 'example'))
+
+        dn = DN('uid=bob,cn=users,dc=Intern,dc=Example')
+        assert dn.endswith(basedn)
+        assert dn.rdns[-1] is basedn.rdns[-1]
+        assert dn.rdns[-2] is basedn.rdns[-2]
+
+        # RDNs which differ in case are not shared, str() keeps the case
+        dn = DN('uid=bob,cn=users,DC=intern,DC=example')
+        assert dn.endswith(basedn)
+        assert dn.rdns[-1] is not basedn.rdns[-1]
+        assert str(dn) == 'uid=bob,cn=users,DC=intern,DC=example'
+
+    def test_slice(self):
+        dn = DN('uid=bob,cn=users,cn=accounts,dc=example,dc=com')
+        container = DN('CN=Users,cn=Accounts,dc=example,dc=com')
+        assert dn[1:] == container
+        assert hash(dn[1:]) == hash(container)
+        assert dn[1:] in {container}
+        assert container in dn
+        assert dn.find(DN('cn=accounts')) == 2
+
+    def test_immutable(self):
+        dn = DN('cn=bob')
+        with pytest.raises(AttributeError):
+            dn.attr = 'cn'  # pylint: disable=attribute-defined-outside-init
+        with pytest.raises(AttributeError):
+            dn[0].attr = 'cn'
+        with pytest.raises(AttributeError):
+            dn[0][0].value = 'alice'
+
+
+class TestPickle:
+    def test_pickle(self):
+        dn = DN('cn=Bob,cn=users,dc=example,dc=com')
+        hash(dn)
+        for obj in (dn, dn[0], dn[0][0]):
+            for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+                copy = pickle.loads(pickle.dumps(obj, protocol))
+                assert type(copy) is type(obj)
+                assert copy == obj
+                assert hash(copy) == hash(obj)
+
+    def test_pickle_other_process(self):
+        # the hash of a DN depends on the hash seed of the process, so it
+        # must not be pickled
+        dn = DN('cn=Bob,cn=users,dc=example,dc=com')
+        data = pickle.dumps({dn: 'bob'}, pickle.HIGHEST_PROTOCOL)
+        script = (
+            "import pickle, sys\n"
+            "from ipapython.dn import DN\n"
+            "d = pickle.loads(sys.stdin.buffer.read())\n"
+            "assert d[DN('CN=bob,cn=users,dc=example,dc=com')] == 'bob'\n"
+        )
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        for seed in ('1', '2'):
+            env['PYTHONHASHSEED'] = seed
+            subprocess.run(
+                [sys.executable, '-c', script], input=data, env=env,
+                check=True)
+
+    def test_unpickle_legacy(self):
+        # pickled by the implementation without __slots__
+        data = (
+            b'\x80\x02cipapython.dn\nDN\nq\x00)\x81q\x01}q\x02X\x04\x00'
+            b'\x00\x00rdnsq\x03]q\x04(]q\x05X\x02\x00\x00\x00cnq\x06X'
+            b'\x04\x00\x00\x00Testq\x07K\x01\x87q\x08a]q\tX\x02\x00\x00'
+            b'\x00dcq\nX\x07\x00\x00\x00exampleq\x0bK\x01\x87q\x0ca]q\r'
+            b'X\x02\x00\x00\x00dcq\x0eX\x04\x00\x00\x00testq\x0fK\x01'
+            b'\x87q\x10aesb.'
+        )
+        dn = pickle.loads(data)
+        assert dn == DN('cn=test,dc=example,dc=test')
+        assert str(dn) == 'cn=Test,dc=example,dc=test'
+        assert dn in {DN('cn=test,dc=example,dc=test')}
+
+        data = (
+            b'\x80\x02cipapython.dn\nRDN\nq\x00)\x81q\x01}q\x02X\x05\x00'
+            b'\x00\x00_avasq\x03]q\x04X\x02\x00\x00\x00cnq\x05X\x04\x00'
+            b'\x00\x00Testq\x06K\x01\x87q\x07asb.'
+        )
+        assert pickle.loads(data) == RDN('cn=test')
+
+        data = (
+            b'\x80\x02cipapython.dn\nAVA\nq\x00)\x81q\x01}q\x02X\x04\x00'
+            b'\x00\x00_avaq\x03]q\x04(X\x02\x00\x00\x00cnq\x05X\x04\x00'
+            b'\x00\x00Testq\x06K\x00esb.'
+        )
+        assert pickle.loads(data) == AVA('cn', 'test')
@@ -0,0 +1,153 @@
+#
+# Copyright (C) 2020  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the keep-alive connection pool of the `ipapython.dogtag` module.
+"""
+from __future__ import absolute_import
+
+import socket
+
+import pytest
+
+from ipalib.errors import NetworkError
+from ipapython import dogtag
+
+KEY = ('ca.example.test', 8443, '/etc/ipa/ca.crt', 'ra.crt', 'ra.key')
+
+
+class FakeResponse:
+    status = 200
+    msg = {}
+    will_close = False
+
+    def read(self):
+        return b'body'
+
+    def getheader(self, name):
+        return None
+
+
+class FakeConnection:
+    def __init__(self, host, port, fail=False, response_error=None):
+        self.fail = fail
+        self.response_error = response_error
+        self.closed = False
+        self.requests = 0
+
+    def request(self, method, path, body=None, headers=None):
+        if self.fail:
+            raise ConnectionResetError('connection reset')
+        self.requests += 1
+
+    def getresponse(self):
+        if self.response_error is not None:
+            raise self.response_error
+        return FakeResponse()
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = dogtag.ConnectionPool()
+    monkeypatch.setattr(dogtag, 'connection_pool', pool)
+    return pool
+
+
+def request(factory, pool_key=KEY, method='POST'):
+    return dogtag._httplib_request(
+        'https', KEY[0], KEY[1], '/ca/rest/certs', factory, '',
+        method=method, pool_key=pool_key, pool_max_requests=2,
+        pool_idle_timeout=15)
+
+
+@pytest.mark.tier0
+class TestConnectionPool:
+    def test_idle_timeout(self):
+        pool = dogtag.ConnectionPool()
+        conn = FakeConnection(*KEY[:2])
+        pool.put(KEY, conn, 1, 100)
+        assert pool.get(KEY, -1) == (None, 0)
+        assert conn.closed
+
+    def test_reuse(self, pool):
+        connections = []
+
+        def factory(host, port):
+            connections.append(FakeConnection(host, port))
+            return connections[-1]
+
+        for _i in range(3):
+            assert request(factory)[0] == 200
+        # the first connection is closed after the maximum of 2 requests
+        assert len(connections) == 2
+        assert connections[0].requests == 2
+        assert connections[0].closed
+        assert not connections[1].closed
+
+    def test_reconnect(self, pool):
+        stale = FakeConnection(*KEY[:2], fail=True)
+        pool.put(KEY, stale, 1, 100)
+        fresh = []
+
+        def factory(host, port):
+            fresh.append(FakeConnection(host, port))
+            return fresh[-1]
+
+        assert request(factory)[0] == 200
+        assert stale.closed
+        assert len(fresh) == 1
+        assert fresh[0].requests == 1
+
+    def test_no_pool_key(self, pool):
+        conn = FakeConnection(*KEY[:2])
+        assert request(lambda host, port: conn, pool_key=None)[0] == 200
+        assert conn.closed
+
+    def test_reconnect_closed_before_response(self, pool):
+        stale = FakeConnection(
+            *KEY[:2], response_error=dogtag.RemoteDisconnected('closed'))
+        pool.put(KEY, stale, 1, 100)
+        fresh = []
+
+        def factory(host, port):
+            fresh.append(FakeConnection(host, port))
+            return fresh[-1]
+
+        assert request(factory)[0] == 200
+        assert stale.closed
+        assert len(fresh) == 1
+
+    @pytest.mark.parametrize('error', [
+        ConnectionResetError('connection reset'),
+        socket.timeout('timed out'),
+    ])
+    def test_no_resend_after_request_sent(self, pool, error):
+        stale = FakeConnection(*KEY[:2], response_error=error)
+        pool.put(KEY, stale, 1, 100)
+        fresh = []
+
+        def factory(host, port):
+            fresh.append(FakeConnection(host, port))
+            return fresh[-1]
+
+        # the server may have processed the POST request already
+        with pytest.raises(NetworkError):
+            request(factory)
+        assert stale.closed
+        assert not fresh
+
+    def test_resend_get(self, pool):
+        stale = FakeConnection(
+            *KEY[:2], response_error=ConnectionResetError('reset'))
+        pool.put(KEY, stale, 1, 100)
+        fresh = []
+
+        def factory(host, port):
+            fresh.append(FakeConnection(host, port))
+            return fresh[-1]
+
+        assert request(factory, method='GET')[0] == 200
+        assert len(fresh) == 1
@@ -0,0 +1,81 @@
+#
+# Copyright (C) 2020  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the `ipapython.graph` module.
+"""
+import random
+
+import pytest
+
+from ipapython.graph import Graph
+
+pytestmark = pytest.mark.tier0
+
+
+def make_graph(vertices, edges):
+    graph = Graph()
+    for v in vertices:
+        graph.add_vertex(v)
+    for tail, head in edges:
+        graph.add_edge(tail, head)
+    return graph
+
+
+def test_heads_tails():
+    graph = make_graph('abc', [('a', 'b'), ('a', 'c'), ('c', 'b')])
+    assert sorted(graph.get_heads('a')) == ['b', 'c']
+    assert sorted(graph.get_tails('b')) == ['a', 'c']
+
+    graph.remove_vertex('c')
+    assert graph.get_heads('a') == ['b']
+    assert graph.get_tails('b') == ['a']
+    assert graph.edges == [('a', 'b')]
+
+    graph.remove_edge('a', 'b')
+    assert graph.get_heads('a') == []
+    assert graph.get_tails('b') == []
+    with pytest.raises(ValueError):
+        graph.remove_edge('a', 'b')
+
+
+def test_strongly_connected_components():
+    graph = make_graph('abcde', [
+        ('a', 'b'), ('b', 'a'), ('b', 'c'), ('c', 'd'), ('d', 'c'),
+        ('e', 'e'),
+    ])
+    components = graph.strongly_connected_components()
+    assert sorted(sorted(c) for c in components) == [
+        ['a', 'b'], ['c', 'd'], ['e']]
+    # {c, d} is reachable from {a, b}, so it is listed first
+    assert components.index({'c', 'd'}) < components.index({'a', 'b'})
+
+    components = graph.strongly_connected_components(removed=['b'])
+    assert sorted(sorted(c) for c in components) == [
+        ['a'], ['c', 'd'], ['e']]
+
+
+def test_reachability():
+    graph = make_graph('abcd', [
+        ('a', 'b'), ('b', 'a'), ('b', 'c'), ('c', 'd'), ('d', 'c'),
+    ])
+    reachable = graph.reachability()
+    assert reachable['a'] == {'a', 'b', 'c', 'd'}
+    assert reachable['c'] == {'c', 'd'}
+
+    reachable = graph.reachability(removed=['b'])
+    assert 'b' not in reachable
+    assert reachable['a'] == {'a'}
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_reachability_bfs(seed):
+    rnd = random.Random(seed)
+    vertices = list(range(1, 31))
+    edges = [
+        (rnd.choice(vertices), rnd.choice(vertices)) for _i in range(45)
+    ]
+    graph = make_graph(vertices, edges)
+    reachable = graph.reachability()
+    for v in vertices:
+        assert reachable[v] == graph.bfs(v)
@@ -0,0 +1,65 @@
+#
+# Copyright (C) 2020  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the `ipapython.ipaldap` module.
+"""
+from __future__ import absolute_import
+
+import ldap
+import pytest
+
+from ipapython.ipaldap import SchemaCache
+
+URL = 'ldap://ipa.example.test'
+
+SCHEMA_ENTRY = {
+    'attributeTypes': [
+        b"( 2.5.4.3 NAME 'cn' "
+        b"SYNTAX 1.3.6.1.4.1.1466.115.121.1.15 )",
+    ],
+    'objectClasses': [
+        b"( 2.5.6.0 NAME 'top' ABSTRACT MUST objectClass )",
+    ],
+}
+
+
+class FakeConnection:
+    def __init__(self, csn):
+        self.csn = csn
+        self.searches = []
+
+    def search_s(self, base, scope, attrlist):
+        self.searches.append(attrlist)
+        entry = {'nsSchemaCSN': [self.csn]}
+        if 'attributetypes' in attrlist:
+            entry.update(SCHEMA_ENTRY)
+        return [(base, entry)]
+
+
+@pytest.mark.tier0
+class test_SchemaCache:
+    def test_persisted_schema(self, tmpdir):
+        conn = FakeConnection(b'1')
+        SchemaCache(str(tmpdir)).get_schema(URL, conn)
+        assert 'attributetypes' in conn.searches[-1]
+
+        conn = FakeConnection(b'1')
+        schema = SchemaCache(str(tmpdir)).get_schema(URL, conn)
+        assert conn.searches == [SchemaCache._VERSION_ATTRS]
+        assert schema.get_obj(ldap.schema.AttributeType, 'cn') is not None
+
+    def test_schema_change(self, tmpdir):
+        SchemaCache(str(tmpdir)).get_schema(URL, FakeConnection(b'1'))
+
+        conn = FakeConnection(b'2')
+        SchemaCache(str(tmpdir)).get_schema(URL, conn)
+        assert 'attributetypes' in conn.searches[-1]
+
+    def test_force_update(self, tmpdir):
+        SchemaCache(str(tmpdir)).get_schema(URL, FakeConnection(b'1'))
+
+        conn = FakeConnection(b'1')
+        SchemaCache(str(tmpdir)).get_schema(URL, conn, force_update=True)
+        assert len(conn.searches) == 1
+        assert 'attributetypes' in conn.searches[0]
@@ -0,0 +1,182 @@
+#
+# Copyright (C) 2020  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the `ipaserver.dns_data_management` module.
+"""
+from __future__ import absolute_import
+
+import dns.rdatatype
+import pytest
+
+from ipalib import errors
+from ipalib.dns import get_record_rrtype
+from ipapython.dn import DN
+from ipapython.dnsutil import DNSName
+from ipaserver.dns_data_management import IPASystemRecords
+
+ZONE_DN = DN(('idnsname', 'ipa.test.'), ('cn', 'dns'), ('dc', 'ipa'),
+             ('dc', 'test'))
+
+
+class FakeEntry(dict):
+    def __init__(self, dn, **kwargs):
+        super(FakeEntry, self).__init__(**kwargs)
+        self.dn = dn
+
+    @property
+    def single_value(self):
+        return {k: v[0] for k, v in self.items()}
+
+
+class FakeLDAP:
+    MATCH_ANY = '|'
+    SCOPE_ONELEVEL = 1
+
+    def __init__(self):
+        self.entries = {}
+        self.searches = 0
+        self.writes = []
+
+    def make_filter_from_attr(self, attr, value, rules):
+        return set(value)
+
+    def iter_entries(self, filter, attrs_list, base_dn, scope, size_limit,
+                     time_limit):
+        # the number of records grows with the number of locations
+        assert size_limit == -1 and time_limit == -1
+        self.searches += 1
+        for entry in self.entries.values():
+            if entry['idnsname'][0].ToASCII() in filter:
+                yield entry
+
+    def make_entry(self, dn, **kwargs):
+        return FakeEntry(dn, **kwargs)
+
+    def add_entry(self, entry):
+        self.writes.append(entry.dn)
+        self.entries[entry.dn] = entry
+
+    def update_entry(self, entry):
+        self.writes.append(entry.dn)
+
+
+def is_rrattr(name):
+    return get_record_rrtype(name) is not None and ';' not in name
+
+
+class FakeDNSRecord:
+    def __init__(self):
+        self.waited = []
+
+    def updated_rrattrs(self, old_entry, entry_attrs):
+        rrattrs = {k: v for k, v in (old_entry or {}).items()
+                   if is_rrattr(k)}
+        rrattrs.update((k, v) for k, v in entry_attrs.items()
+                       if is_rrattr(k))
+        return rrattrs
+
+    def wait_for_modified_entries(self, entries):
+        for keys, entry_attrs in entries.items():
+            # like dnsrecord._entry2rrsets()
+            for attr in entry_attrs:
+                rrtype = get_record_rrtype(attr)
+                if rrtype:
+                    dns.rdatatype.from_text(rrtype)
+            self.waited.append((keys[1].ToASCII(), sorted(entry_attrs)))
+
+    def check_record_type_collisions(self, keys, rrattrs):
+        if rrattrs.get('cnamerecord') and len(rrattrs) > 1:
+            raise errors.ValidationError(name='cnamerecord', error='collision')
+
+
+class FakeNamespace:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+@pytest.fixture
+def api():
+    def server_find(**kwargs):
+        return {'result': [
+            {'cn': ['a.ipa.test'],
+             'enabled_role_servrole': ['IPA master'],
+             'ipalocation_location': [DNSName('prague')]},
+            {'cn': ['b.ipa.test'],
+             'enabled_role_servrole': ['IPA master', 'NTP server']},
+        ]}
+
+    def location_find():
+        return {'result': [{'idnsname': [DNSName('prague')]}]}
+
+    return FakeNamespace(
+        env=FakeNamespace(domain='ipa.test', realm='IPA.TEST',
+                          wait_for_dns=False),
+        Backend=FakeNamespace(ldap2=FakeLDAP()),
+        Object=FakeNamespace(
+            dnszone=FakeNamespace(get_dn=lambda zone: ZONE_DN),
+            dnsrecord=FakeDNSRecord()),
+        Command=FakeNamespace(server_find=server_find,
+                              location_find=location_find),
+    )
+
+
+@pytest.mark.tier0
+class test_IPASystemRecords:
+    def test_update_only_changed(self, api):
+        ldap = api.Backend.ldap2
+        system_records = IPASystemRecords(api)
+
+        (base, failed_base), (loc, failed_loc) = (
+            system_records.update_dns_records())
+        assert not failed_base and not failed_loc
+        assert ldap.searches == 1
+        assert len(ldap.writes) == len(base) + len(loc)
+
+        ldap_dn = DN(('idnsname', '_ldap._tcp'), ZONE_DN)
+        entry = ldap.entries[ldap_dn]
+        assert sorted(entry['srvrecord']) == [
+            '0 100 389 a.ipa.test.', '0 100 389 b.ipa.test.']
+        assert 'idnsTemplateObject' in entry['objectclass']
+
+        del ldap.writes[:]
+        assert system_records.get_records_diff() == []
+        system_records.update_dns_records()
+        assert ldap.writes == []
+
+        # relative names are equal to absolute ones
+        entry['srvrecord'] = ['0 100 389 a', '0 100 389 old.ipa.test.']
+        assert system_records.get_records_diff() == [
+            '- _ldap._tcp.ipa.test. SRV 0 100 389 old.ipa.test.',
+            '+ _ldap._tcp.ipa.test. SRV 0 100 389 b.ipa.test.',
+        ]
+        system_records.update_dns_records()
+        assert ldap.writes == [ldap_dn]
+
+    def test_update_collision(self, api):
+        ldap = api.Backend.ldap2
+        system_records = IPASystemRecords(api)
+        system_records.update_dns_records()
+
+        ldap_dn = DN(('idnsname', '_ldap._tcp'), ZONE_DN)
+        ldap.entries[ldap_dn]['srvrecord'] = ['0 100 389 old.ipa.test.']
+        ldap.entries[ldap_dn]['cnamerecord'] = ['other.ipa.test.']
+        (_base, failed_base), (_loc, failed_loc) = (
+            system_records.update_dns_records())
+        assert [name.ToASCII() for name, _node, _e in failed_base] == [
+            '_ldap._tcp.ipa.test.']
+        assert not failed_loc
+
+    def test_update_wait_for_dns(self, api):
+        api.env.wait_for_dns = True
+        system_records = IPASystemRecords(api)
+
+        (_base, failed_base), (_loc, failed_loc) = (
+            system_records.update_dns_records())
+        assert not failed_base and not failed_loc
+        waited = dict(api.Object.dnsrecord.waited)
+        # neither objectclass nor the CNAME template attribute
+        assert waited['_ldap._tcp'] == ['srvrecord']
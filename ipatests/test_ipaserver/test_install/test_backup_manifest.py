@@ -0,0 +1,127 @@
+#
+# Copyright (C) 2020  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the `ipaserver.install.backup_manifest` module.
+"""
+from __future__ import absolute_import
+
+import os
+import tarfile
+
+import pytest
+
+from ipaserver.install import backup_manifest
+
+pytestmark = pytest.mark.tier0
+
+VERSION = b'version: 1\n'
+
+
+def entry(dn, value):
+    return 'dn: {}\nobjectClass: top\ndescription: {}\n'.format(
+        dn, value).encode('utf-8')
+
+
+def write_ldif(filename, *entries):
+    with open(filename, 'wb') as f:
+        f.write(VERSION + b'\n')
+        for e in entries:
+            f.write(e + b'\n')
+
+
+def read_ldif(filename):
+    with open(filename, 'rb') as f:
+        return [record for _key, record in backup_manifest.iter_ldif_records(f)]
+
+
+def test_manifest_roundtrip(tmpdir):
+    manifest = backup_manifest.new_manifest('ipa-full-2020-01-01-00-00-00')
+    manifest['deleted_files'] = ['/etc/ipa/removed']
+    backup_manifest.write_manifest(str(tmpdir), manifest)
+    assert backup_manifest.read_manifest(str(tmpdir)) == manifest
+
+
+def test_manifest_missing(tmpdir):
+    assert backup_manifest.read_manifest(str(tmpdir)) is None
+
+
+def test_changed_files(tmpdir):
+    top = tmpdir.mkdir('top')
+    top.join('same').write('same')
+    top.join('modified').write('old')
+    top.join('removed').write('removed')
+    top.mkdir('excluded').join('file').write('excluded')
+
+    exclude = (str(top.join('excluded')),)
+    previous = backup_manifest.scan_files([str(top)], exclude)
+    assert str(top.join('excluded')) not in previous
+
+    top.join('modified').write('new content')
+    top.join('removed').remove()
+    top.join('added').write('added')
+    states = backup_manifest.scan_files([str(top)], exclude)
+
+    changed, deleted = backup_manifest.changed_files(states, previous)
+    # the directory changed as entries were added and removed
+    assert str(top.join('same')) not in changed
+    assert str(top.join('modified')) in changed
+    assert str(top.join('added')) in changed
+    assert deleted == [str(top.join('removed'))]
+
+
+def test_hash_archive(tmpdir):
+    tmpdir.join('data').write('data')
+    archive = str(tmpdir.join('files.tar'))
+    with tarfile.open(archive, 'w') as tar:
+        tar.add(str(tmpdir.join('data')))
+    hashes = backup_manifest.hash_archive(archive)
+    assert list(hashes) == [str(tmpdir.join('data'))]
+
+
+def test_reduce_and_merge_ldif(tmpdir):
+    full = str(tmpdir.join('full.ldif'))
+    write_ldif(full,
+               entry('dc=example', 'root'),
+               entry('cn=a,dc=example', 'a'),
+               entry('cn=b,dc=example', 'b'),
+               entry('cn=c,dc=example', 'c'))
+    hashes = backup_manifest.ldif_entry_hashes(full)
+    assert sorted(hashes) == [
+        'cn=a,dc=example', 'cn=b,dc=example', 'cn=c,dc=example',
+        'dc=example',
+    ]
+
+    incr1 = str(tmpdir.join('incr1.ldif'))
+    write_ldif(incr1,
+               entry('dc=example', 'root'),
+               entry('cn=a,dc=example', 'a modified'),
+               entry('cn=c,dc=example', 'c'),
+               entry('cn=d,dc=example', 'd'))
+    hashes1, deleted1 = backup_manifest.reduce_ldif(incr1, hashes)
+    assert deleted1 == ['cn=b,dc=example']
+    assert read_ldif(incr1) == [
+        VERSION,
+        entry('cn=a,dc=example', 'a modified'),
+        entry('cn=d,dc=example', 'd'),
+    ]
+
+    incr2 = str(tmpdir.join('incr2.ldif'))
+    write_ldif(incr2,
+               entry('dc=example', 'root'),
+               entry('cn=a,dc=example', 'a modified'),
+               entry('cn=b,dc=example', 'b is back'),
+               entry('cn=d,dc=example', 'd'))
+    _hashes2, deleted2 = backup_manifest.reduce_ldif(incr2, hashes1)
+    assert deleted2 == ['cn=c,dc=example']
+
+    merged = str(tmpdir.join('merged.ldif'))
+    backup_manifest.merge_ldif(
+        full, [(incr1, deleted1), (incr2, deleted2)], merged)
+    assert read_ldif(merged) == [
+        VERSION,
+        entry('dc=example', 'root'),
+        entry('cn=a,dc=example', 'a modified'),
+        entry('cn=b,dc=example', 'b is back'),
+        entry('cn=d,dc=example', 'd'),
+    ]
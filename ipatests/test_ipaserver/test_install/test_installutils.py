@@ -12,7 +12,7 @@ import textwrap
 import pytest
 
 from ipaplatform.paths import paths
-from ipapython import ipautil
+from ipapython import admintool, ipautil
 from ipaserver.install import installutils
 from ipaserver.install import ipa_backup
 from ipaserver.install import ipa_restore
@@ -140,3 +140,39 @@ def test_gpg_asymmetric(tempdir, gpgkey):
     assert os.path.isfile(src)
     with open(src) as f:
         assert f.read() == payload
+
+
+def test_backup_pipeline(tempdir, gpgkey):
+    src = os.path.join(tempdir, "pipeline")
+    os.makedirs(src)
+    payload = 'Dummy text\n' * 1000
+    with open(os.path.join(src, "data.txt"), 'w') as f:
+        f.write(payload)
+
+    archive = os.path.join(tempdir, "archive.tar.gpg")
+    ipa_backup.run_pipeline([
+        ['tar', '-C', src, '-cf', '-', '.'],
+        ipa_backup.compress_command('gzip', level=1),
+        ipa_backup.encrypt_command(),
+    ], archive)
+    assert os.path.isfile(archive)
+
+    decrypted = ipa_restore.decrypt_file(tempdir, archive)
+    out = os.path.join(tempdir, "out")
+    os.makedirs(out)
+    subprocess.check_call([
+        'tar', '-C', out, ipa_backup.tar_compression_option('gzip'),
+        '-xf', decrypted,
+    ])
+    with open(os.path.join(out, "data.txt")) as f:
+        assert f.read() == payload
+
+
+def test_backup_pipeline_failure(tempdir):
+    archive = os.path.join(tempdir, "archive.tar")
+    with pytest.raises(admintool.ScriptError):
+        ipa_backup.run_pipeline([
+            ['tar', '-cf', '-', os.path.join(tempdir, "missing")],
+            ipa_backup.compress_command('gzip'),
+        ], archive)
+    assert not os.path.exists(archive)
@@ -30,6 +30,7 @@ from __future__ import absolute_import
 import os
 import sys
 
+import ldap
 import pytest
 import six
 
@@ -140,6 +141,33 @@ class test_ldap:
         cert = entry_attrs.get('usercertificate')[0]
         assert cert.serial_number is not None
 
+    def test_iter_entries(self):
+        """
+        Test that iter_entries returns the same entries as find_entries
+        """
+        self.conn = ldap2(api)
+        self.conn.connect(autobind=AUTOBIND_DISABLED)
+        base_dn = DN(api.env.container_masters, api.env.basedn)
+        entries, _truncated = self.conn.find_entries(
+            None, ['cn'], base_dn, size_limit=-1)
+        iterated = list(self.conn.iter_entries(
+            None, ['cn'], base_dn, size_limit=-1, page_size=2))
+        assert sorted(e.dn for e in iterated) == sorted(e.dn for e in entries)
+
+    def test_iter_entries_close(self):
+        """
+        Test that a partially consumed iter_entries can be abandoned
+        """
+        self.conn = ldap2(api)
+        self.conn.connect(autobind=AUTOBIND_DISABLED)
+        base_dn = DN(api.env.container_masters, api.env.basedn)
+        entries = self.conn.iter_entries(
+            None, ['cn'], base_dn, size_limit=-1, page_size=2)
+        first = next(entries)
+        entries.close()
+        entry = self.conn.get_entry(first.dn, ['cn'])
+        assert entry.dn == first.dn
+
 
 @pytest.mark.tier0
 @pytest.mark.needs_ipaapi
@@ -321,6 +349,33 @@ class test_LDAPEntry:
         e.raw['test'].append(b'second')
         assert e['test'] == ['not list', u'second']
 
+    def test_modlist_shared_values(self):
+        """
+        Test values of an entry read from LDAP are tracked without copies
+        """
+        e = self.conn.make_entry(self.dn1)
+        # pylint: disable=protected-access
+        e._load_raw({'cn': [b'test1'], 'member': [b'cn=a', b'cn=b']})
+        assert e._orig_raw['member'] is e._raw['member']
+        # pylint: enable=protected-access
+        assert e['cn'] == [u'test1']
+        assert e.generate_modlist() == []
+
+        e.raw['member'].remove(b'cn=a')
+        e['cn'].append(u'test2')
+        assert sorted(e.generate_modlist()) == [
+            (ldap.MOD_ADD, 'cn', [b'test2']),
+            (ldap.MOD_DELETE, 'member', [b'cn=a']),
+        ]
+
+        copy = e.copy()
+        copy.raw['member'].append(b'cn=c')
+        assert sorted(copy.generate_modlist()) == [
+            (ldap.MOD_ADD, 'cn', [b'test2']),
+            (ldap.MOD_ADD, 'member', [b'cn=c']),
+            (ldap.MOD_DELETE, 'member', [b'cn=a']),
+        ]
+
     def test_modlist_with_varying_encodings(self):
         """
         Test modlist is correct when only encoding of new value differs
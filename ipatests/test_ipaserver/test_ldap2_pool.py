@@ -0,0 +1,152 @@
+#
+# Copyright (C) 2020  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the LDAP connection pool of the ldap2 backend
+"""
+
+import threading
+
+import ldap
+import pytest
+
+from ipalib.request import context
+from ipaserver.plugins.ldap2 import LDAPConnectionPool, LDAPWorkerPool
+
+
+class FakeConnection:
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.unbound = False
+
+    def whoami_s(self):
+        if not self.alive:
+            raise ldap.SERVER_DOWN({'desc': 'down'})
+        return 'dn:uid=admin'
+
+    def unbind_s(self):
+        self.unbound = True
+
+
+KEY = ('admin@EXAMPLE.TEST', 'FILE:/tmp/krbcc', 'ldapi://')
+OTHER_KEY = ('user@EXAMPLE.TEST', 'FILE:/tmp/krbcc2', 'ldapi://')
+
+
+@pytest.mark.tier0
+class TestLDAPConnectionPool:
+    def test_reuse(self):
+        pool = LDAPConnectionPool(4, 300, 30)
+        conn = FakeConnection()
+        assert pool.acquire(KEY) is None
+        pool.register(KEY, conn)
+        assert pool.release(conn)
+        assert pool.acquire(KEY) is conn
+        assert pool.stats()['hits'] == 1
+        assert pool.stats()['misses'] == 1
+
+    def test_key_isolation(self):
+        pool = LDAPConnectionPool(4, 300, 30)
+        conn = FakeConnection()
+        pool.register(KEY, conn)
+        pool.release(conn)
+        assert pool.acquire(OTHER_KEY) is None
+        assert pool.acquire(KEY) is conn
+
+    def test_release_unknown(self):
+        pool = LDAPConnectionPool(4, 300, 30)
+        assert not pool.release(FakeConnection())
+
+    def test_max_size(self):
+        pool = LDAPConnectionPool(1, 300, 30)
+        first, second = FakeConnection(), FakeConnection()
+        pool.register(KEY, first)
+        pool.register(KEY, second)
+        pool.release(first)
+        pool.release(second)
+        assert first.unbound
+        assert pool.stats()['evicted'] == 1
+        assert pool.acquire(KEY) is second
+
+    def test_idle_timeout(self):
+        pool = LDAPConnectionPool(4, -1, 30)
+        conn = FakeConnection()
+        pool.register(KEY, conn)
+        pool.release(conn)
+        assert pool.acquire(KEY) is None
+        assert conn.unbound
+
+    def test_failed_check(self):
+        pool = LDAPConnectionPool(4, 300, -1)
+        conn = FakeConnection(alive=False)
+        pool.register(KEY, conn)
+        pool.release(conn)
+        assert pool.acquire(KEY) is None
+        assert pool.stats()['failed_checks'] == 1
+
+
+class FakeLDAP2:
+    def __init__(self, error=None):
+        self.error = error
+        self.principals = []
+        self.lock = threading.Lock()
+
+    def connect(self, **kwargs):
+        with self.lock:
+            self.principals.append(context.principal)
+        if self.error is not None:
+            raise self.error
+
+
+class FakeAPI:
+    def __init__(self, ldap2):
+        self.Backend = type('Backend', (), dict(ldap2=ldap2))
+
+
+@pytest.fixture
+def principal():
+    context.principal = 'admin@EXAMPLE.TEST'
+    yield context.principal
+    del context.principal
+
+
+@pytest.mark.tier0
+class TestLDAPWorkerPool:
+    def test_process(self, principal):
+        ldap2 = FakeLDAP2()
+        results = {}
+
+        def process(index, value):
+            results[index] = (value, context.principal)
+
+        pool = LDAPWorkerPool(FakeAPI(ldap2), 3, process, None,
+                              max_pending=2)
+        for i in range(10):
+            pool.put(i, i * i)
+        pool.join()
+        assert results == {i: (i * i, principal) for i in range(10)}
+        assert ldap2.principals == [principal] * 3
+
+    def test_connect_failed(self, principal):
+        error = ldap.SERVER_DOWN({'desc': 'down'})
+        failed = {}
+
+        def fail(e, index):
+            failed[index] = e
+
+        pool = LDAPWorkerPool(FakeAPI(FakeLDAP2(error)), 2, None, fail)
+        for i in range(4):
+            pool.put(i)
+        pool.join()
+        assert failed == {i: error for i in range(4)}
+
+    def test_error(self, principal):
+        def process(index):
+            if index == 3:
+                raise ValueError(index)
+
+        pool = LDAPWorkerPool(FakeAPI(FakeLDAP2()), 2, process, None)
+        for i in range(6):
+            pool.put(i)
+        with pytest.raises(ValueError):
+            pool.join()
@@ -0,0 +1,154 @@
+#
+# Copyright (C) 2020  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the `ipaserver.masters` module.
+"""
+from __future__ import absolute_import
+
+import pytest
+
+from ipalib import errors
+from ipalib.request import context, destroy_context
+from ipapython.dn import DN
+from ipaserver import masters
+
+BASEDN = DN(('dc', 'ipa'), ('dc', 'test'))
+CONTAINER_MASTERS = DN(('cn', 'masters'), ('cn', 'ipa'), ('cn', 'etc'))
+MASTERS_DN = DN(CONTAINER_MASTERS, BASEDN)
+
+
+class FakeEntry(dict):
+    def __init__(self, dn, **kwargs):
+        super(FakeEntry, self).__init__(**kwargs)
+        self.dn = dn
+
+
+class FakeLDAP:
+    SCOPE_SUBTREE = 2
+
+    def __init__(self):
+        self.searches = 0
+        self.entries = [FakeEntry(MASTERS_DN, cn=['masters'])]
+        for server, services in (
+                ('a.ipa.test', {'CA': 'enabledService',
+                                'KRA': 'hiddenService',
+                                'DNS': 'configuredService'}),
+                ('b.ipa.test', {'CA': 'enabledService'})):
+            master_dn = DN(('cn', server), MASTERS_DN)
+            self.entries.append(FakeEntry(
+                master_dn, cn=[server],
+                objectClass=['top', 'nsContainer', 'ipaConfigObject']))
+            for name, state in services.items():
+                self.entries.append(FakeEntry(
+                    DN(('cn', name), master_dn), cn=[name],
+                    objectClass=['nsContainer', 'ipaConfigObject'],
+                    ipaConfigString=[state]))
+
+    def get_entries(self, base_dn, scope, filter, attrs_list, **kwargs):
+        self.searches += 1
+        assert kwargs == dict(size_limit=-1, time_limit=-1)
+        if getattr(context, 'principal', None) == 'anonymous':
+            # without the Read Status of Services permission only
+            # enabledService values are readable
+            return [
+                FakeEntry(e.dn, **{
+                    k: [v for v in vals if k != 'ipaConfigString' or
+                        v == masters.ENABLED_SERVICE]
+                    for k, vals in e.items()})
+                for e in self.entries
+            ]
+        return list(self.entries)
+
+
+class FakeEnv(dict):
+    __getattr__ = dict.__getitem__
+
+
+class FakeAPI:
+    def __init__(self, context):
+        self.env = FakeEnv(context=context, basedn=BASEDN,
+                           container_masters=CONTAINER_MASTERS,
+                           masters_cache_ttl=10)
+        self.Backend = FakeEnv(ldap2=FakeLDAP())
+
+
+@pytest.fixture
+def server_api():
+    masters.invalidate_masters_view()
+    yield FakeAPI('server')
+    masters.invalidate_masters_view()
+    destroy_context()
+
+
+@pytest.mark.tier0
+class test_MastersView:
+    def test_get_services(self):
+        view = masters.MastersView(FakeLDAP(), FakeAPI('installer'))
+        assert [e['cn'][0] for e in view.get_masters()] == [
+            'a.ipa.test', 'b.ipa.test']
+        assert sorted(e.dn[1]['cn'] for e in view.get_services(
+            'ca', config_strings=[masters.ENABLED_SERVICE])) == [
+                'a.ipa.test', 'b.ipa.test']
+        assert [e['cn'][0] for e in view.get_services(
+            server='A.ipa.test', config_strings='hiddenservice')] == ['KRA']
+        assert not view.get_services('KDC')
+
+    def test_find_providing_servers(self, server_api):
+        servers = masters.find_providing_servers(
+            'CA', preferred_hosts=['b.ipa.test'], api=server_api)
+        assert servers[0] == 'b.ipa.test'
+        assert sorted(servers) == ['a.ipa.test', 'b.ipa.test']
+        assert masters.find_providing_servers('KRA', api=server_api) == []
+        assert masters.is_service_enabled('KRA', api=server_api)
+        assert not masters.is_service_enabled('KDC', api=server_api)
+        assert server_api.Backend.ldap2.searches == 1
+
+    def test_cache_invalidation(self, server_api):
+        ldap = server_api.Backend.ldap2
+        assert masters.is_service_enabled('DNS', api=server_api)
+
+        # shared by subsequent requests
+        destroy_context()
+        del ldap.entries[3:]
+        assert masters.is_service_enabled('DNS', api=server_api)
+        assert ldap.searches == 1
+
+        masters.invalidate_masters_view()
+        assert not masters.is_service_enabled('DNS', api=server_api)
+        assert ldap.searches == 2
+
+    def test_no_cache_outside_server(self):
+        api = FakeAPI('installer')
+        masters.get_masters(api=api)
+        masters.get_masters(api=api)
+        assert api.Backend.ldap2.searches == 2
+
+        del api.Backend.ldap2.entries[:]
+        with pytest.raises(errors.EmptyResult):
+            masters.get_masters(api=api)
+
+    def test_cache_per_principal(self, server_api):
+        ldap = server_api.Backend.ldap2
+
+        def hidden_services():
+            view = masters.get_masters_view(api=server_api)
+            return [e['cn'][0] for e in view.get_services(
+                config_strings=masters.HIDDEN_SERVICE)]
+
+        context.principal = 'admin@IPA.TEST'
+        assert hidden_services() == ['KRA']
+
+        destroy_context()
+        context.principal = 'anonymous'
+        assert hidden_services() == []
+        assert ldap.searches == 2
+
+        # each principal reuses its own view
+        destroy_context()
+        context.principal = 'admin@IPA.TEST'
+        assert hidden_services() == ['KRA']
+        destroy_context()
+        context.principal = 'anonymous'
+        assert hidden_services() == []
+        assert ldap.searches == 2
@@ -0,0 +1,80 @@
+#
+# Copyright (C) 2020  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the migration checkpoint of the `ipaserver/plugins/migration.py` module
+"""
+
+import pytest
+
+from ipaserver.plugins import migration
+
+LDAPURI = u'ldap://ds.example.test'
+BASE_DN = u'dc=example,dc=test'
+
+
+@pytest.fixture
+def state_dir(tmpdir, monkeypatch):
+    monkeypatch.setattr(migration, 'MIGRATION_STATE_DIR', str(tmpdir))
+    return tmpdir
+
+
+@pytest.mark.tier0
+class TestMigrationCheckpoint:
+    def test_resume(self, state_dir):
+        checkpoint = migration.MigrationCheckpoint(LDAPURI, BASE_DN)
+        checkpoint.add(u'user', u'jdoe')
+        checkpoint.add(u'group', u'group with spaces')
+        checkpoint.close()
+
+        checkpoint = migration.MigrationCheckpoint(
+            LDAPURI, BASE_DN, resume=True)
+        assert len(checkpoint) == 2
+        assert (u'user', u'jdoe') in checkpoint
+        assert (u'group', u'group with spaces') in checkpoint
+        assert (u'group', u'jdoe') not in checkpoint
+        checkpoint.close(remove=True)
+        assert not state_dir.listdir()
+
+    def test_no_resume(self, state_dir):
+        checkpoint = migration.MigrationCheckpoint(LDAPURI, BASE_DN)
+        checkpoint.add(u'user', u'jdoe')
+        checkpoint.close()
+
+        checkpoint = migration.MigrationCheckpoint(LDAPURI, BASE_DN)
+        assert len(checkpoint) == 0
+        checkpoint.close()
+        checkpoint = migration.MigrationCheckpoint(
+            LDAPURI, BASE_DN, resume=True)
+        assert len(checkpoint) == 0
+
+    def test_partial_record(self, state_dir):
+        checkpoint = migration.MigrationCheckpoint(LDAPURI, BASE_DN)
+        checkpoint.add(u'user', u'jdoe')
+        checkpoint.close()
+        with open(checkpoint.filename, 'a') as f:
+            f.write(u'user\tjsm')
+
+        checkpoint = migration.MigrationCheckpoint(
+            LDAPURI, BASE_DN, resume=True)
+        assert (u'user', u'jsm') not in checkpoint
+        checkpoint.add(u'user', u'jsmith')
+        checkpoint.close()
+
+        checkpoint = migration.MigrationCheckpoint(
+            LDAPURI, BASE_DN, resume=True)
+        assert len(checkpoint) == 2
+        assert (u'user', u'jsmith') in checkpoint
+
+    def test_unwritable_state_dir(self, tmpdir, monkeypatch):
+        # a regular file in place of a directory fails even for root
+        tmpdir.join('file').write('')
+        monkeypatch.setattr(
+            migration, 'MIGRATION_STATE_DIR', str(tmpdir.join('file', 'dir')))
+
+        checkpoint = migration.MigrationCheckpoint(
+            LDAPURI, BASE_DN, resume=True)
+        checkpoint.add(u'user', u'jdoe')
+        assert len(checkpoint) == 0
+        checkpoint.close(remove=True)
@@ -28,6 +28,7 @@ import six
 
 from ipatests.util import assert_equal, raises, PluginTester
 from ipalib import errors
+from ipalib.request import context, destroy_context, RequestTimings
 from ipaserver import rpcserver
 
 if six.PY3:
@@ -136,6 +137,80 @@ def test_params_2_args_options():
     assert f([args, options]) == (args, options)
 
 
+def test_parse_etags():
+    """
+    Test the `ipaserver.rpcserver.parse_etags` function.
+    """
+    f = rpcserver.parse_etags
+    assert f('"abcd1234"') == ['abcd1234']
+    assert f('W/"abcd1234", "ef56"') == ['abcd1234', 'ef56']
+    assert f('*') == ['*']
+    assert f('') == []
+
+
+class ETagExecutioner(rpcserver.WSGIExecutioner):
+    """
+    Executioner answering conditional requests like the schema command
+    """
+    content_type = 'application/json'
+
+    def wsgi_execute(self, environ):
+        context.etag = u'abcd1234'
+        etags = rpcserver.parse_etags(environ.get('HTTP_IF_NONE_MATCH', ''))
+        if context.etag in etags:
+            context.not_modified = True
+        return b'{"result": {}}'
+
+
+@pytest.mark.parametrize('if_none_match, status, body', [
+    (None, '200 Success', b'{"result": {}}'),
+    ('"0000"', '200 Success', b'{"result": {}}'),
+    ('"0000", W/"abcd1234"', '304 Not Modified', b''),
+])
+def test_etag(if_none_match, status, body):
+    """
+    Test the ETag and 304 Not Modified responses of
+    `ipaserver.rpcserver.WSGIExecutioner`.
+    """
+    environ = {}
+    if if_none_match is not None:
+        environ['HTTP_IF_NONE_MATCH'] = if_none_match
+    s = StartResponse()
+    try:
+        response = ETagExecutioner('the api instance')(environ, s)
+    finally:
+        destroy_context()
+    assert response == [body]
+    assert s.status == status
+    assert ('ETag', '"abcd1234"') in s.headers
+
+
+def test_timing_statistics():
+    """
+    Test the `ipaserver.rpcserver.TimingStatistics` class.
+    """
+    timings = RequestTimings()
+    timings.add_phase('execute', 0.5)
+    timings.add_ldap_operation('result4', 0.125)
+    timings.add_ldap_operation('result4', 0.25)
+    timings.finish()
+
+    stats = rpcserver.TimingStatistics()
+    stats.add(timings)
+    stats.add(timings)
+    d = stats.as_dict()
+    assert d['requests'] == 2
+    assert d['phases'] == {
+        'execute': dict(count=2, total=1.0, max=0.5),
+    }
+    assert d['ldap_operations'] == {
+        'result4': dict(count=4, total=0.75, max=0.375),
+    }
+
+    stats.clear()
+    assert stats.as_dict()['requests'] == 0
+
+
 class test_session:
     klass = rpcserver.wsgi_dispatch
 
@@ -0,0 +1,124 @@
+#
+# Copyright (C) 2020  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the stored API schema of the `ipaserver/plugins/schema.py` module
+"""
+
+import gzip
+import logging
+import types
+
+import pytest
+
+from ipalib import errors
+from ipalib.request import context, destroy_context
+from ipaserver.plugins import schema
+
+pytestmark = pytest.mark.tier0
+
+SCHEMA = {
+    u'version': u'2.251',
+    u'commands': [{u'name': u'user_add', u'doc': u'Add a new user.'}],
+    u'fingerprint': u'abcd1234',
+}
+
+
+@pytest.fixture
+def cache_dir(tmpdir, monkeypatch):
+    monkeypatch.setattr(schema, 'SCHEMA_CACHE_DIR', str(tmpdir))
+    return tmpdir
+
+
+@pytest.fixture
+def command(cache_dir, monkeypatch):
+    generated = []
+
+    def generate_schema(self, **kwargs):
+        generated.append(kwargs)
+        return dict(SCHEMA)
+
+    def get_cache_path(self, langs):
+        return str(cache_dir.join('{}.json.gz'.format(langs or 'default')))
+
+    monkeypatch.setattr(schema.schema, '_generate_schema', generate_schema)
+    monkeypatch.setattr(schema.schema, '_get_cache_path', get_cache_path)
+    cmd = schema.schema(types.SimpleNamespace())
+    cmd.generated = generated
+    yield cmd
+    destroy_context()
+
+
+def test_write_read(cache_dir):
+    cmd = schema.schema('the api instance')
+    path = str(cache_dir.join('schema.json.gz'))
+    cmd._write_schema(path, SCHEMA)
+    assert cache_dir.listdir() == [cache_dir.join('schema.json.gz')]
+    assert cmd._read_schema(path) == SCHEMA
+
+
+def test_read_missing(cache_dir):
+    cmd = schema.schema('the api instance')
+    assert cmd._read_schema(str(cache_dir.join('missing.json.gz'))) is None
+
+
+def test_read_corrupted(cache_dir):
+    cmd = schema.schema('the api instance')
+    path = cache_dir.join('corrupted.json.gz')
+    with gzip.open(str(path), 'wb') as f:
+        f.write(b'{"version": ')
+    assert cmd._read_schema(str(path)) is None
+
+
+def test_write_failed(tmpdir, monkeypatch, caplog):
+    # the cache directory cannot be created under a regular file
+    not_a_dir = tmpdir.join('file')
+    not_a_dir.write('')
+    monkeypatch.setattr(schema, 'SCHEMA_CACHE_DIR', str(not_a_dir.join('x')))
+    cmd = schema.schema('the api instance')
+    with caplog.at_level(logging.WARNING, logger=schema.__name__):
+        cmd._write_schema(str(not_a_dir.join('x', 'schema.json.gz')), SCHEMA)
+    assert 'Failed to store schema' in caplog.text
+
+
+def test_serialize_failed(cache_dir, caplog):
+    cmd = schema.schema('the api instance')
+    with caplog.at_level(logging.ERROR, logger=schema.__name__):
+        cmd._write_schema(str(cache_dir.join('schema.json.gz')),
+                          dict(SCHEMA, version=object()))
+    assert 'Failed to serialize schema' in caplog.text
+    assert cache_dir.listdir() == []
+
+
+def test_get_schema(command, cache_dir):
+    assert command.get_schema('en') == SCHEMA
+    assert command.get_schema('en') == SCHEMA
+    assert len(command.generated) == 1
+
+    # another process loads the stored schema
+    other = schema.schema(types.SimpleNamespace())
+    assert other.get_schema('en') == SCHEMA
+    assert len(command.generated) == 1
+    assert cache_dir.join('en.json.gz').check()
+
+
+def test_execute_etag(command):
+    context.if_none_match = [u'0000']
+    result = command.execute()
+    assert result['result']['fingerprint'] == SCHEMA[u'fingerprint']
+    assert context.etag == SCHEMA[u'fingerprint']
+    assert not getattr(context, 'not_modified', False)
+
+
+def test_execute_not_modified(command):
+    context.if_none_match = [SCHEMA[u'fingerprint']]
+    with pytest.raises(errors.SchemaUpToDate):
+        command.execute()
+    assert context.etag == SCHEMA[u'fingerprint']
+    assert context.not_modified
+
+
+def test_execute_without_if_none_match(command):
+    command.execute()
+    assert getattr(context, 'etag', None) is None
@@ -27,6 +27,7 @@ from ipapython.dn import DN
 from ipapython import ipaldap
 from ipalib import errors
 from ipalib.frontend import Command
+from ipalib.request import context, RequestTimings
 from ipaserver.plugins import baseldap
 from ipatests.util import assert_deepequal
 import pytest
@@ -122,6 +123,39 @@ def test_callback_registration():
             ('Subclass registered callback', 42)]
 
 
+@pytest.mark.tier0
+def test_timed_callbacks():
+    class callbacktest_timed(Command):
+        callback_types = Command.callback_types + ('test',)
+
+        def test_callback(self, param):
+            return ('test_callback', param)
+
+    def registered_callback(self, param):
+        return ('registered_callback', param)
+    callbacktest_timed.register_callback('test', registered_callback)
+
+    instance = callbacktest_timed('the api instance')
+
+    # callbacks are not wrapped unless timing is enabled for the request
+    assert list(instance.get_callbacks('test')) == [
+        callbacktest_timed.test_callback, registered_callback]
+
+    context.timings = RequestTimings()
+    try:
+        results = [callback(instance, 42)
+                   for callback in instance.get_callbacks('test')]
+        phases = [name for name, _duration in context.timings.phases]
+    finally:
+        del context.timings
+    assert results == [
+        ('test_callback', 42),
+        ('registered_callback', 42)]
+    assert phases == [
+        'callback.test.test_callback',
+        'callback.test.registered_callback']
+
+
 @pytest.mark.tier0
 def test_exc_callback_registration():
     messages = []
@@ -223,3 +257,83 @@ def test_entry_to_dict():
     assert_deepequal(
         baseldap.entry_to_dict(entry, all=True, raw=True),
         the_dict)
+
+
+@pytest.mark.tier0
+def test_membership_graph():
+    """Test the indirect membership resolution of baseldap.MembershipGraph"""
+    class FakeEntry:
+        def __init__(self, dn, **raw):
+            self.dn = DN(dn)
+            self.raw = raw
+
+    class FakeLDAPClient:
+        MATCH_ANY = ipaldap.LDAPClient.MATCH_ANY
+        combine_filters = ipaldap.LDAPClient.combine_filters
+
+        def iter_entries(self, filter, attrs_list, base_dn, **kwargs):
+            return iter([
+                FakeEntry('cn=top', member=[b'cn=middle', b'uid=u1']),
+                FakeEntry('cn=middle', member=[b'cn=bottom', b'uid=u2']),
+                FakeEntry('cn=bottom', member=[b'uid=u3', b'uid=u1']),
+                FakeEntry('cn=rule', memberuser=[b'cn=bottom']),
+            ])
+
+    graph = baseldap.MembershipGraph(FakeLDAPClient(), DN('dc=test'))
+
+    assert sorted(graph.get_memberindirect(DN('cn=top'))) == [
+        b'cn=bottom', b'uid=u2', b'uid=u3']
+    assert sorted(graph.get_memberindirect(DN('cn=middle'))) == [
+        b'uid=u1', b'uid=u3']
+    assert graph.get_memberindirect(DN('cn=bottom')) == []
+
+    assert graph.get_direct_memberof(DN('uid=u1')) == {
+        DN('cn=top'), DN('cn=bottom')}
+    assert graph.get_direct_memberof(DN('cn=bottom')) == {
+        DN('cn=middle'), DN('cn=rule')}
+    assert graph.get_direct_memberof(DN('uid=nobody')) == set()
+
+
+@pytest.mark.tier0
+def test_membership_graph_entries():
+    """Test MembershipGraph limited to groups related to given entries"""
+    class FakeEntry:
+        def __init__(self, dn, **raw):
+            self.dn = DN(dn)
+            self.raw = raw
+
+    class FakeLDAPClient(ipaldap.LDAPClient):
+        def __init__(self):  # pylint: disable=super-init-not-called
+            self.filters = []
+
+        def iter_entries(self, filter, attrs_list, base_dn, **kwargs):
+            self.filters.append(filter)
+            if '(memberof=cn=Top)' in filter:
+                return iter([
+                    FakeEntry('cn=middle', member=[b'CN=Bottom', b'uid=u2'],
+                              memberof=[b'cn=top']),
+                    FakeEntry('cn=bottom', member=[b'uid=u3', b'uid=u1'],
+                              memberof=[b'cn=middle', b'cn=top']),
+                ])
+            if '(member=uid=u1)' in filter:
+                return iter([
+                    FakeEntry('cn=top', member=[b'cn=middle', b'UID=U1']),
+                    FakeEntry('cn=bottom', member=[b'uid=u3', b'uid=u1']),
+                ])
+            return iter([])
+
+    conn = FakeLDAPClient()
+    entries = [
+        FakeEntry('cn=Top', member=[b'cn=middle', b'uid=u1']),
+        FakeEntry('uid=u1', memberof=[b'cn=top', b'cn=middle', b'cn=bottom']),
+        FakeEntry('uid=u4'),
+    ]
+    graph = baseldap.MembershipGraph(conn, DN('dc=test'), entries)
+
+    # one search for nested groups and one for parents of members
+    assert len(conn.filters) == 2
+    assert sorted(graph.get_memberindirect(DN('cn=top'))) == [
+        b'CN=Bottom', b'uid=u2', b'uid=u3']
+    assert graph.get_direct_memberof(DN('uid=u1')) == {
+        DN('cn=top'), DN('cn=bottom')}
+    assert graph.get_direct_memberof(DN('uid=u4')) == set()
@@ -181,6 +181,56 @@ class test_batch(Declarative):
             ),
         ),
 
+        dict(
+            desc='Show the group in parallel around a barrier',
+            command=('batch', [
+                dict(method=u'group_show', params=([group1], dict())),
+                dict(method=u'group_show', params=([u'notfound'], dict())),
+                dict(method=u'ping', params=([], dict())),
+                dict(method=u'group_show', params=([group1], dict())),
+            ], dict(parallel=True)),
+            expected=dict(
+                count=4,
+                results=deepequal_list(
+                    dict(
+                        value=group1,
+                        summary=None,
+                        result=dict(
+                            cn=[group1],
+                            description=[u'Test desc 1'],
+                            gidnumber=[fuzzy_digits],
+                            dn=DN(('cn', 'testgroup1'),
+                                  ('cn', 'groups'),
+                                  ('cn', 'accounts'),
+                                  api.env.basedn),
+                            ),
+                        error=None),
+                    dict(
+                        error=u'notfound: group not found',
+                        error_name=u'NotFound',
+                        error_code=4001,
+                        error_kw=dict(
+                            reason=u'notfound: group not found',
+                        ),
+                    ),
+                    dict(summary=Fuzzy('IPA server version .*'), error=None),
+                    dict(
+                        value=group1,
+                        summary=None,
+                        result=dict(
+                            cn=[group1],
+                            description=[u'Test desc 1'],
+                            gidnumber=[fuzzy_digits],
+                            dn=DN(('cn', 'testgroup1'),
+                                  ('cn', 'groups'),
+                                  ('cn', 'accounts'),
+                                  api.env.basedn),
+                            ),
+                        error=None),
+                ),
+            ),
+        ),
+
         dict(
             desc='Try bad command invocations',
             command=('batch', [
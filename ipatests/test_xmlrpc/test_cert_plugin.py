@@ -447,6 +447,50 @@ class test_cert_find(XMLRPC_test):
         with pytest.raises(errors.ConversionError):
             api.Command['cert_find'](issuedon_from=u'xyz')
 
+    def test_0032_find_all_repeated(self):
+        """
+        Search for all certificates with all attributes twice, the second
+        time using the cached certificates
+        """
+        res = api.Command['cert_find'](all=True, sizelimit=10)
+        assert res['count'] == 10
+        for obj in res['result']:
+            assert 'certificate' in obj
+            assert 'sha256_fingerprint' in obj
+
+        res2 = api.Command['cert_find'](all=True, sizelimit=10)
+        assert res2['result'] == res['result']
+
+    def test_0033_find_paged(self):
+        """
+        Search for all certificates page by page
+        """
+        expected = [
+            (obj.get('issuer'), obj['serial_number'])
+            for obj in api.Command['cert_find'](sizelimit=0)['result']
+        ]
+
+        found = []
+        cookie = None
+        while True:
+            res = api.Command['cert_find'](pagesize=5, cookie=cookie)
+            found.extend(
+                (obj.get('issuer'), obj['serial_number'])
+                for obj in res['result'])
+            cookie = res['cookie']
+            if cookie is None:
+                break
+
+        assert len(found) == len(expected)
+        assert set(found) == set(expected)
+
+    def test_0034_find_paged_invalid_cookie(self):
+        """
+        Search with an invalid continuation token
+        """
+        with pytest.raises(errors.ValidationError):
+            api.Command['cert_find'](pagesize=5, cookie=u'xyz')
+
 
 @pytest.mark.tier1
 class test_cert_revocation(BaseCert):
@@ -200,6 +200,43 @@ class test_hbactest(XMLRPC_test):
                 nodetail=True
             )
 
+    def test_f_hbactest_bulk(self):
+        """
+        Test 'ipa hbactest-bulk' with a matrix of users
+        """
+        ret = api.Command['hbactest_bulk'](
+            user=[self.test_user, u'hbacrule_test_nonexistent'],
+            targethost=[self.test_host],
+            service=[self.test_service],
+            rules=self.rule_names,
+        )
+        assert ret['count'] == 2
+        assert ret['error'] is None
+        granted, denied = ret['result']
+        assert granted['user'] == self.test_user
+        assert granted['value'] == True
+        for i in [0,1,2,3]:
+            assert self.rule_names[i] in granted['matched']
+        assert denied['user'] == u'hbacrule_test_nonexistent'
+        assert denied['value'] == False
+        assert 'matched' not in denied
+
+    def test_f_hbactest_bulk_non_existing_rule(self):
+        """
+        Test running 'ipa hbactest-bulk' with non-existing rule in --rules
+        """
+        ret = api.Command['hbactest_bulk'](
+            user=[self.test_user],
+            targethost=[self.test_host],
+            service=[self.test_service],
+            rules=[u'%s_1x1' % (rule) for rule in self.rule_names],
+            nodetail=True
+        )
+        assert ret['count'] == 0
+        assert ret['result'] == []
+        for rule in self.rule_names:
+            assert u'%s_1x1' % (rule) in ret['error']
+
     def test_g_hbactest_clear_testing_data(self):
         """
         Clear data for HBAC test plugin testing.
@@ -664,6 +664,27 @@ class test_vault_plugin(Declarative):
             },
         },
 
+        {
+            'desc': 'Retrieve secrets from multiple standard vaults',
+            'command': (
+                'vault_retrieve_bulk',
+                [(standard_vault_name, u'nonexistent_vault')],
+                {},
+            ),
+            'expected': {
+                'summary': 'Retrieved data from 1 vault',
+                'result': [
+                    {
+                        'cn': standard_vault_name,
+                        'data': secret,
+                    },
+                ],
+                'failed': {
+                    u'nonexistent_vault': u'vault not found',
+                },
+            },
+        },
+
         {
             'desc': 'Change standard vault to symmetric vault',
             'command': (